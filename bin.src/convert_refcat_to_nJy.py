@@ -29,6 +29,14 @@ updated values. Also replaces `_fluxSigma` with `_fluxErr` in the schema,
 per RFC-333. If all flux fields in the refcat schema have units of `'nJy'`,
 the files are not modified.
 
+Each file is converted by rescaling its flux columns in bulk, writing a
+temporary file and renaming it over the original, so an interrupted run never
+leaves a partially written file. Files that were already converted are
+recognized from their header alone, and skipped, so an interrupted run may
+simply be restarted; `master_schema.fits` is converted last, and `config.py`
+updated only once every file is converted, for this reason. Progress is
+reported in files/s and MB/s.
+
 Many of our old reference catalogs have no units for their fluxes: we assume
 (as the algorithmic code did) that these are all in Jy units.
 
@@ -37,17 +45,23 @@ write the output.
 
 If you are processing a large number of files (e.g. ps1_pv3), we recommend
 capturing stdout to a log file, and using the -n8 option to parallelize it.
+
+With `--columnar`, or if the catalog already has columnar shards, a columnar
+copy of each shard (see `lsst.meas.algorithms.columnarShard`) is also written
+next to it, and `shard_format='columnar'` is set in the config; this may be
+done for a catalog that already has nJy fluxes, too.
 """
 import os.path
 import glob
+import time
 
 import concurrent.futures
-import itertools
 
 import lsst.afw.table
 from lsst.meas.algorithms import DatasetConfig
-from lsst.meas.algorithms.loadReferenceObjects import convertToNanojansky, hasNanojanskyFluxUnits
-from lsst.meas.algorithms.ingestIndexReferenceTask import addRefCatMetadata
+from lsst.meas.algorithms.loadReferenceObjects import hasNanojanskyFluxUnits
+from lsst.meas.algorithms.ingestIndexReferenceTask import convertRefCatFileToNanojansky
+from lsst.meas.algorithms.columnarShard import getColumnarPath, writeColumnarShard
 import lsst.log
 
 
@@ -57,7 +71,13 @@ def is_old_schema(config, filename):
     return (config.format_version == 0) and (not hasNanojanskyFluxUnits(catalog.schema))
 
 
-def process_one(filename, write=False, quiet=False):
+def is_shard(filename):
+    """Check whether this file is a shard, rather than the master schema or
+    another special dataset."""
+    return os.path.splitext(os.path.basename(filename))[0].isdigit()
+
+
+def process_one(filename, write=False, quiet=False, convert=True, columnar=False):
     """Convert one file in-place from Jy (or no units) to nJy fluxes.
 
     Parameters
@@ -68,20 +88,46 @@ def process_one(filename, write=False, quiet=False):
         Write the converted catalog out, overwriting the read in catalog?
     quiet : `bool`, optional
         Do not print messages about files read/written or fields found?
+    convert : `bool`, optional
+        Convert the fluxes? If not, the file is not modified.
+    columnar : `bool`, optional
+        Write a columnar copy of the catalog, if it is a shard?
+
+    Returns
+    -------
+    converted : `bool`
+        Whether the file has (or, if not ``write``, had) old-style fluxes.
+    nBytes : `int`
+        Size of the file before it was processed.
     """
     log = lsst.log.Log()
     if quiet:
         log.setLevel(lsst.log.WARN)
 
-    log.info(f"Reading: {filename}")
-    catalog = lsst.afw.table.SimpleCatalog.readFits(filename)
+    nBytes = os.path.getsize(filename)
+    converted = False
+    if convert:
+        log.info(f"Reading: {filename}")
+        converted = bool(convertRefCatFileToNanojansky(filename, log, doConvert=write))
+        if converted and write:
+            log.info(f"Wrote: {filename}")
+
+    if columnar and is_shard(filename):
+        columnarPath = getColumnarPath(filename)
+        if write:
+            writeColumnarShard(lsst.afw.table.SimpleCatalog.readFits(filename), columnarPath)
+            log.info(f"Wrote: {columnarPath}")
+        else:
+            log.info(f"Would write: {columnarPath}")
+    return converted, nBytes
 
-    output = convertToNanojansky(catalog, log, doConvert=write)
 
-    if write:
-        addRefCatMetadata(output)
-        output.writeFits(filename)
-        log.info(f"Wrote: {filename}")
+def report_progress(nFiles, nConverted, nBytes, startTime, nTotal=None):
+    """Print the number of files processed and the rate of processing."""
+    elapsed = max(time.monotonic() - startTime, 1e-9)
+    total = f"/{nTotal}" if nTotal is not None else ""
+    print(f"Processed {nFiles}{total} files ({nConverted} with old-style fluxes, {nBytes/2**20:.1f} MB)"
+          f" in {elapsed:.1f} s: {nFiles/elapsed:.2f} files/s, {nBytes/2**20/elapsed:.2f} MB/s")
 
 
 def main():
@@ -104,6 +150,11 @@ def main():
                         help="Write the corrected files (default just prints what would have changed).")
     parser.add_argument('--quiet', action="store_true",
                         help="Be less verbose about what files and fields are being converted.")
+    parser.add_argument('--progress', default=100, type=int,
+                        help="Report progress after every this many files.")
+    parser.add_argument('--columnar', action="store_true",
+                        help="Also write a columnar copy of each shard, which the loader reads instead."
+                        " Implied if the catalog already has columnar shards.")
     args = parser.parse_args()
 
     schema_file = os.path.join(args.path, "master_schema.fits")
@@ -113,18 +164,42 @@ def main():
     configPath = os.path.join(args.path, 'config.py')
     config = DatasetConfig()
     config.load(configPath)
-    if not is_old_schema(config, schema_file):
+    convert = is_old_schema(config, schema_file)
+    # existing columnar copies must be rewritten with the converted fluxes
+    columnar = args.columnar or config.shard_format == 'columnar'
+    if not convert and not args.columnar:
         print("Catalog does not contain old-style fluxes; nothing to convert.")
         sys.exit(0)
 
-    files = glob.glob(os.path.join(args.path, "*.fits"))
+    files = sorted(glob.glob(os.path.join(args.path, "*.fits")))
+    # convert the master schema last, so that a restarted run still finds
+    # old-style fluxes in it if any other file is left to convert
+    files.remove(schema_file)
+    startTime = time.monotonic()
+    nFiles = 0
+    nConverted = 0
+    nBytes = 0
     with concurrent.futures.ProcessPoolExecutor(max_workers=args.nprocesses) as executor:
-        futures = executor.map(process_one, files, itertools.repeat(args.write), itertools.repeat(args.quiet))
-        # we have to at least loop over the futures, otherwise exceptions will be lost
-        for future in futures:
-            pass
+        futures = [executor.submit(process_one, filename, args.write, args.quiet, convert, columnar)
+                   for filename in files]
+        # get the result of every future, otherwise exceptions will be lost
+        for future in concurrent.futures.as_completed(futures):
+            converted, size = future.result()
+            nFiles += 1
+            nConverted += converted
+            nBytes += size
+            if args.progress > 0 and nFiles % args.progress == 0:
+                report_progress(nFiles, nConverted, nBytes, startTime, len(files) + 1)
+    converted, size = process_one(schema_file, args.write, args.quiet, convert, columnar)
+    report_progress(nFiles + 1, nConverted + converted, nBytes + size, startTime)
+
+    if args.write and columnar and config.shard_format != 'columnar':
+        config.shard_format = 'columnar'
+        config.save(configPath)
+        if not args.quiet:
+            print("Added `shard_format='columnar'` to config.py")
 
-    if args.write:
+    if args.write and convert:
         config.format_version = 1
         # update the docstring to annotate the file.
         msg = "\nUpdated refcat from version 0->1 to have nJy flux units via convert_refcat_to_nJy.py"
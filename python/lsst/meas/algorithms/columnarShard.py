@@ -0,0 +1,212 @@
+# This file is part of meas_algorithms.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""A memory-mappable columnar file format for reference catalog shards.
+
+A columnar shard file starts with the 8 bytes ``REFCOLS1``, followed by the
+length of a JSON header as a little-endian unsigned 64-bit integer, and the
+header itself. The header holds the number of rows, the scalar metadata of
+the shard, and the name, afw type, numpy dtype, shape and byte offset of
+each column; offsets are relative to the end of the header, rounded up to a
+multiple of 8 bytes. Each column follows as a contiguous little-endian
+array, aligned to 8 bytes, so that it can be memory-mapped and copied into a
+catalog without any decoding.
+"""
+
+__all__ = ["getColumnarPath", "writeColumnarShard", "readColumnarShard"]
+
+import json
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+import lsst.afw.table as afwTable
+from lsst.daf.base import PropertyList
+
+_MAGIC = b"REFCOLS1"
+_ALIGNMENT = 8
+
+
+def getColumnarPath(fitsPath):
+    """Return the path of the columnar copy of a FITS shard file.
+
+    Parameters
+    ----------
+    fitsPath : `str`
+        Path of the FITS shard file.
+
+    Returns
+    -------
+    path : `str`
+        Path of the columnar shard file, next to the FITS file.
+    """
+    return os.path.splitext(fitsPath)[0] + ".cols"
+
+
+def _align(offset):
+    """Round an offset up to the alignment of the columns.
+    """
+    return -(-offset//_ALIGNMENT)*_ALIGNMENT
+
+
+def writeColumnarShard(catalog, path):
+    """Write a reference catalog shard in the columnar format.
+
+    The file is written under a temporary name and renamed, so that readers
+    never see a partial file.
+
+    Parameters
+    ----------
+    catalog : `lsst.afw.table.SimpleCatalog`
+        The shard to write.
+    path : `str`
+        Path of the file to write.
+    """
+    if not catalog.isContiguous():
+        catalog = catalog.copy(deep=True)
+    columns = []
+    arrays = []
+    for item in catalog.schema:
+        field = item.field
+        typeName = field.getTypeString()
+        if typeName == "String":
+            values = np.array([record.get(item.key).encode() for record in catalog],
+                              dtype="S%d" % (max(field.getSize(), 1),))
+        else:
+            values = np.asarray(catalog[item.key])
+            if values.dtype.kind in "iuf":
+                values = values.astype(values.dtype.newbyteorder("<"), copy=False)
+        arrays.append(np.ascontiguousarray(values))
+        columns.append(dict(name=field.getName(), type=typeName, dtype=values.dtype.str,
+                            shape=list(values.shape)))
+    metadata = {}
+    md = catalog.getMetadata()
+    if md is not None:
+        for name in md.names():
+            value = md.getScalar(name)
+            if isinstance(value, (bool, int, float, str)):
+                metadata[name] = value
+
+    # column offsets are relative to the end of the header, aligned
+    offset = 0
+    for column, values in zip(columns, arrays):
+        column["offset"] = offset
+        offset = _align(offset + values.nbytes)
+    headerBytes = json.dumps(dict(n_rows=len(catalog), metadata=metadata, columns=columns)).encode()
+    dataStart = _align(len(_MAGIC) + 8 + len(headerBytes))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmpPath = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".cols")
+    try:
+        with os.fdopen(fd, "wb") as stream:
+            stream.write(_MAGIC)
+            stream.write(struct.pack("<Q", len(headerBytes)))
+            stream.write(headerBytes)
+            for column, values in zip(columns, arrays):
+                stream.write(b"\0"*(dataStart + column["offset"] - stream.tell()))
+                stream.write(values.tobytes())
+        os.replace(tmpPath, path)
+    except BaseException:
+        try:
+            os.unlink(tmpPath)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def _readHeader(path):
+    """Read the header of a columnar shard file.
+
+    Returns
+    -------
+    header : `dict`
+        The header.
+    dataStart : `int`
+        Offset of the first column in the file; the offsets of the columns
+        in the header are relative to it.
+
+    Raises
+    ------
+    RuntimeError
+        Raised if the file is not a columnar shard file.
+    """
+    with open(path, "rb") as stream:
+        if stream.read(len(_MAGIC)) != _MAGIC:
+            raise RuntimeError("%s is not a columnar reference catalog shard" % (path,))
+        length, = struct.unpack("<Q", stream.read(8))
+        header = json.loads(stream.read(length).decode())
+    return header, _align(len(_MAGIC) + 8 + length)
+
+
+def readColumnarShard(path, schema):
+    """Read a reference catalog shard written by `writeColumnarShard`.
+
+    The columns are memory-mapped and copied into a new catalog, so reading
+    a shard costs little more than copying its records.
+
+    Parameters
+    ----------
+    path : `str`
+        Path of the file to read.
+    schema : `lsst.afw.table.Schema`
+        Schema of the shard, e.g. that of the master schema catalog; its
+        fields must match the columns of the file.
+
+    Returns
+    -------
+    catalog : `lsst.afw.table.SimpleCatalog`
+        The shard; it is contiguous.
+
+    Raises
+    ------
+    RuntimeError
+        Raised if the file is not a columnar shard file, or if its columns
+        do not match ``schema``.
+    """
+    header, dataStart = _readHeader(path)
+    columns = header["columns"]
+    fileFields = [(column["name"], column["type"]) for column in columns]
+    schemaFields = [(item.field.getName(), item.field.getTypeString()) for item in schema]
+    if sorted(fileFields) != sorted(schemaFields):
+        raise RuntimeError("Columns of %s do not match the schema of the reference catalog" % (path,))
+    catalog = afwTable.SimpleCatalog(schema)
+    nRows = header["n_rows"]
+    catalog.resize(nRows)
+    if nRows > 0:
+        for column in columns:
+            values = np.memmap(path, dtype=np.dtype(column["dtype"]), mode="r",
+                               offset=dataStart + column["offset"],
+                               shape=tuple(column["shape"]))
+            key = schema[column["name"]].asKey()
+            if column["type"] != "String":
+                catalog[key] = values
+                continue
+            # String columns cannot be set through column views; new records
+            # hold empty strings, so only the others need to be set
+            for i in np.flatnonzero(values != b""):
+                catalog[int(i)].set(key, values[i].decode())
+    md = PropertyList()
+    for name, value in header["metadata"].items():
+        md.set(name, value)
+    catalog.setMetadata(md)
+    return catalog
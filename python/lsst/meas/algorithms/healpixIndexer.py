@@ -0,0 +1,120 @@
+# This file is part of meas_algorithms.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["HealpixIndexer"]
+
+import numpy as np
+
+
+class HealpixIndexer:
+    """Manage a spatial index of HEALPix shards, in the nested numbering
+    scheme.
+
+    This requires ``healpy``, which is imported when the indexer is
+    constructed.
+
+    Parameters
+    ----------
+    order : `int`
+        HEALPix order of the shards; there are ``12*4**order`` shards.
+    """
+    def __init__(self, order=7):
+        import healpy
+        self.healpy = healpy
+        self.order = order
+        self.nside = 2**order
+        # no point of a pixel is farther than this from its center (rad)
+        self._maxPixRad = healpy.max_pixrad(self.nside)
+
+    def getShardIds(self, ctrCoord, radius):
+        """Get the IDs of all shards that touch a circular aperture.
+
+        Parameters
+        ----------
+        ctrCoord : `lsst.geom.SpherePoint`
+            ICRS center of search region.
+        radius : `lsst.geom.Angle`
+            Radius of search region.
+
+        Returns
+        -------
+        results : `tuple`
+            A tuple containing:
+
+            - shardIdList : `list` of `int`
+                List of shard IDs
+            - isOnBoundary : `list` of `bool`
+                For each shard in ``shardIdList`` is the shard on the
+                boundary (not fully enclosed by the search region)?
+        """
+        vector = ctrCoord.getVector()
+        center = np.array([vector.x(), vector.y(), vector.z()])
+        shardIdList = self.healpy.query_disc(self.nside, center, radius.asRadians(),
+                                             inclusive=True, nest=True)
+        # a pixel whose center lies within the circle shrunk by the largest
+        # pixel radius is entirely within the circle
+        innerRadius = radius.asRadians() - self._maxPixRad
+        if innerRadius > 0:
+            coveredShardIdList = self.healpy.query_disc(self.nside, center, innerRadius,
+                                                        inclusive=False, nest=True)
+        else:
+            coveredShardIdList = []
+        isOnBoundary = np.logical_not(np.isin(shardIdList, coveredShardIdList))
+        return shardIdList.tolist(), isOnBoundary.tolist()
+
+    def indexPoints(self, raList, decList):
+        """Generate shard IDs for sky positions.
+
+        Parameters
+        ----------
+        raList : `list` of `float`
+            List of right ascensions, in degrees.
+        decList : `list` of `float`
+            List of declinations, in degrees.
+
+        Returns
+        -------
+        shardIds : `numpy.ndarray` of `int`
+            List of shard IDs
+        """
+        return self.healpy.ang2pix(self.nside, np.asarray(raList, dtype=float),
+                                   np.asarray(decList, dtype=float), nest=True, lonlat=True)
+
+    @staticmethod
+    def makeDataId(shardId, datasetName):
+        """Make a data id from a shard ID.
+
+        Parameters
+        ----------
+        shardId : `int`
+            ID of shard in question.
+        datasetName : `str`
+            Name of dataset to use.
+
+        Returns
+        -------
+        dataId : `dict`
+            Data ID for shard.
+        """
+        if shardId is None:
+            # NoneType doesn't format, so make dummy pixel
+            shardId = 0
+        return {'pixel_id': shardId, 'name': datasetName}
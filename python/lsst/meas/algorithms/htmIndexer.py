@@ -20,7 +20,13 @@
 # the GNU General Public License along with this program.  If not,
 # see <https://www.lsstcorp.org/LegalNotices/>.
 #
+from collections import OrderedDict
+import math
+
 import esutil
+import numpy as np
+
+from lsst import sphgeom
 
 
 class HtmIndexer:
@@ -31,13 +37,31 @@ class HtmIndexer:
     ----------
     depth : `int`
         Depth of the HTM hierarchy to construct.
+    cacheSize : `int`, optional
+        Number of recent `getShardIds` queries to remember.
     """
-    def __init__(self, depth=8):
+    # Quantum (radians) of the center and radius of the queries remembered
+    # by getShardIds.
+    _QUERY_QUANTUM = 1e-8
+
+    def __init__(self, depth=8, cacheSize=32):
         self.htm = esutil.htm.HTM(depth)
+        self.depth = depth
+        self._pixelization = sphgeom.HtmPixelization(depth)
+        self._cacheSize = cacheSize
+        self._queryCache = OrderedDict()
 
     def getShardIds(self, ctrCoord, radius):
         """Get the IDs of all shards that touch a circular aperture.
 
+        Repeated queries for nearly the same circle (e.g. for the CCDs of
+        one visit) are answered from a small cache. The center and radius
+        are quantized to ``_QUERY_QUANTUM`` radians, and each answer is
+        computed for a circle padded so that it is conservative for every
+        query with the same quantized center and radius: no touching shard
+        is omitted, and no shard that crosses the boundary of the circle is
+        reported as enclosed.
+
         Parameters
         ----------
         ctrCoord : `lsst.geom.SpherePoint`
@@ -56,14 +80,66 @@ class HtmIndexer:
                 For each shard in ``shardIdList`` is the shard on the
                 boundary (not fully enclosed by the search region)?
         """
-        shardIdList = self.htm.intersect(ctrCoord.getLongitude().asDegrees(),
-                                         ctrCoord.getLatitude().asDegrees(),
-                                         radius.asDegrees(), inclusive=True)
-        coveredShardIdList = self.htm.intersect(ctrCoord.getLongitude().asDegrees(),
-                                                ctrCoord.getLatitude().asDegrees(),
-                                                radius.asDegrees(), inclusive=False)
-        isOnBoundary = (shardId not in coveredShardIdList for shardId in shardIdList)
-        return shardIdList, isOnBoundary
+        quantum = self._QUERY_QUANTUM
+        key = (round(ctrCoord.getLongitude().asRadians()/quantum),
+               round(ctrCoord.getLatitude().asRadians()/quantum),
+               round(radius.asRadians()/quantum))
+        result = self._queryCache.get(key)
+        if result is None:
+            # a query with this key is within half a quantum of the
+            # quantized center in each coordinate, and of the quantized
+            # radius, so padding by two quanta covers it
+            result = self._classifyShards(key[0]*quantum, key[1]*quantum, key[2]*quantum, 2*quantum)
+            self._queryCache[key] = result
+            while len(self._queryCache) > self._cacheSize:
+                self._queryCache.popitem(last=False)
+        else:
+            self._queryCache.move_to_end(key)
+        shardIdList, isOnBoundary = result
+        return list(shardIdList), list(isOnBoundary)
+
+    def _classifyShards(self, ra, dec, radius, padding):
+        """Find the shards that touch a circle, and which of them lie
+        entirely within it, in a single intersection query.
+
+        Parameters
+        ----------
+        ra, dec : `float`
+            ICRS center of the circle (rad).
+        radius : `float`
+            Radius of the circle (rad).
+        padding : `float`
+            Amount (rad) by which to grow the circle when finding the shards
+            that touch it, and to shrink it when finding those within it.
+
+        Returns
+        -------
+        shardIdList : `list` of `int`
+            IDs of the shards that touch the circle.
+        isOnBoundary : `list` of `bool`
+            For each shard in ``shardIdList``, whether it crosses the
+            boundary of the circle.
+        """
+        shardIds = np.asarray(self.htm.intersect(math.degrees(ra), math.degrees(dec),
+                                                 math.degrees(radius + padding), inclusive=True),
+                              dtype=np.int64)
+        innerRadius = radius - padding
+        if len(shardIds) == 0 or innerRadius <= 0:
+            return shardIds.tolist(), [True]*len(shardIds)
+        if innerRadius >= 0.5*math.pi:
+            # caps larger than a hemisphere are not convex, so containing
+            # the vertices of a trixel does not imply containing the trixel
+            covered = set(self.htm.intersect(math.degrees(ra), math.degrees(dec),
+                                             math.degrees(innerRadius), inclusive=False))
+            return shardIds.tolist(), [shardId not in covered for shardId in shardIds.tolist()]
+        # a cap smaller than a hemisphere contains a trixel if and only if it
+        # contains all three of its vertices
+        center = np.array([math.cos(dec)*math.cos(ra), math.cos(dec)*math.sin(ra), math.sin(dec)])
+        vertices = np.array([[(vertex.x(), vertex.y(), vertex.z())
+                              for vertex in self._pixelization.triangle(int(shardId)).getVertices()]
+                             for shardId in shardIds])
+        inside = np.all(vertices @ center > math.cos(innerRadius), axis=1)
+        return shardIds.tolist(), np.logical_not(inside).tolist()
 
     def indexPoints(self, raList, decList):
         """Generate shard IDs for sky positions.
@@ -102,3 +178,203 @@ class HtmIndexer:
             # NoneType doesn't format, so make dummy pixel
             shardId = 0
         return {'pixel_id': shardId, 'name': datasetName}
+
+
+class AdaptiveHtmIndexer(HtmIndexer):
+    """Manage a spatial index of hierarchical triangular mesh (HTM) shards
+    of varying depth.
+
+    The sky is covered by the trixels of depth ``minDepth``, some of which
+    are recursively subdivided, down to depth ``maxDepth``, so that dense
+    regions are split into more shards than sparse ones. Shard IDs are
+    standard HTM IDs, which are unique across depths.
+
+    Parameters
+    ----------
+    minDepth : `int`
+        Depth of the coarsest shards.
+    maxDepth : `int`
+        Depth of the finest shards.
+    subdivided : iterable of `int`, optional
+        IDs of the trixels that are subdivided into their four children,
+        e.g. as returned by `planSubdivision`. Each must have depth at
+        least ``minDepth`` and less than ``maxDepth``, and its parent must
+        also be subdivided, unless it has depth ``minDepth``.
+    """
+    def __init__(self, minDepth, maxDepth, subdivided=()):
+        if not 0 <= minDepth <= maxDepth:
+            raise ValueError("Invalid HTM depths: minDepth=%s, maxDepth=%s" % (minDepth, maxDepth))
+        HtmIndexer.__init__(self, depth=maxDepth)
+        self.minDepth = minDepth
+        self.maxDepth = maxDepth
+        self._subdivided = np.unique(np.array(list(subdivided), dtype=np.int64))
+        self._subdividedSet = set(self._subdivided.tolist())
+        for trixelId in self._subdivided.tolist():
+            depth = self.getDepth(trixelId)
+            if not minDepth <= depth < maxDepth or \
+                    (depth > minDepth and (trixelId >> 2) not in self._subdividedSet):
+                raise ValueError("Trixel %d cannot be subdivided" % (trixelId,))
+        self._pixelizations = [sphgeom.HtmPixelization(depth) for depth in range(maxDepth + 1)]
+
+    @staticmethod
+    def getDepth(trixelId):
+        """Return the depth of an HTM trixel.
+
+        Parameters
+        ----------
+        trixelId : `int`
+            HTM ID of the trixel.
+
+        Returns
+        -------
+        depth : `int`
+            Depth of the trixel.
+        """
+        return (int(trixelId).bit_length() - 4)//2
+
+    def getShardRegion(self, shardId):
+        """Return the region of the sky covered by a shard.
+
+        Parameters
+        ----------
+        shardId : `int`
+            ID of the shard.
+
+        Returns
+        -------
+        region : `lsst.sphgeom.ConvexPolygon`
+            The trixel of the shard.
+        """
+        return self._pixelizations[self.getDepth(shardId)].triangle(shardId)
+
+    def _isShard(self, trixelId, depth):
+        """Return whether a trixel is a shard, rather than being too coarse
+        or subdivided.
+        """
+        return depth >= self.minDepth and trixelId not in self._subdividedSet
+
+    def getShardIds(self, ctrCoord, radius):
+        """Get the IDs of all shards that touch a circular aperture.
+
+        Parameters
+        ----------
+        ctrCoord : `lsst.geom.SpherePoint`
+            ICRS center of search region.
+        radius : `lsst.geom.Angle`
+            Radius of search region.
+
+        Returns
+        -------
+        results : `tuple`
+            A tuple containing:
+
+            - shardIdList : `list` of `int`
+                List of shard IDs
+            - isOnBoundary : `list` of `bool`
+                For each shard in ``shardIdList`` is the shard on the
+                boundary (not fully enclosed by the search region)?
+        """
+        circle = sphgeom.Circle(ctrCoord.getVector(), sphgeom.Angle(radius.asRadians()))
+        shardIdList = []
+        isOnBoundary = []
+        # descend from the root trixels, skipping those disjoint from the
+        # circle, and not testing the descendants of those it contains
+        stack = [(trixelId, 0, False) for trixelId in range(15, 7, -1)]
+        while stack:
+            trixelId, depth, contained = stack.pop()
+            if not contained:
+                relation = circle.relate(self._pixelizations[depth].triangle(trixelId))
+                if relation & sphgeom.DISJOINT:
+                    continue
+                contained = bool(relation & sphgeom.CONTAINS)
+            if self._isShard(trixelId, depth):
+                shardIdList.append(trixelId)
+                isOnBoundary.append(not contained)
+            else:
+                stack.extend((childId, depth + 1, contained) for childId in range(4*trixelId + 3,
+                                                                                   4*trixelId - 1, -1))
+        return shardIdList, isOnBoundary
+
+    def indexPoints(self, raList, decList):
+        """Generate shard IDs for sky positions.
+
+        Parameters
+        ----------
+        raList : `list` of `float`
+            List of right ascensions, in degrees.
+        decList : `list` of `float`
+            List of declinations, in degrees.
+
+        Returns
+        -------
+        shardIds : `numpy.ndarray` of `int`
+            List of shard IDs
+        """
+        trixelIds = np.asarray(self.htm.lookup_id(raList, decList), dtype=np.int64)
+        shardIds = trixelIds >> 2*(self.maxDepth - self.minDepth)
+        inSubdivided = np.isin(shardIds, self._subdivided)
+        for depth in range(self.minDepth + 1, self.maxDepth + 1):
+            if not np.any(inSubdivided):
+                break
+            shardIds[inSubdivided] = trixelIds[inSubdivided] >> 2*(self.maxDepth - depth)
+            inSubdivided[inSubdivided] = np.isin(shardIds[inSubdivided], self._subdivided)
+        return shardIds
+
+    def countPoints(self, raList, decList):
+        """Count sky positions in each trixel of depth ``maxDepth``.
+
+        Parameters
+        ----------
+        raList : `list` of `float`
+            List of right ascensions, in degrees.
+        decList : `list` of `float`
+            List of declinations, in degrees.
+
+        Returns
+        -------
+        counts : `dict` [`int`, `int`]
+            Number of positions in each trixel of depth ``maxDepth`` that
+            holds any, by HTM ID; suitable for `planSubdivision`.
+        """
+        trixelIds, counts = np.unique(np.asarray(self.htm.lookup_id(raList, decList), dtype=np.int64),
+                                      return_counts=True)
+        return dict(zip(trixelIds.tolist(), counts.tolist()))
+
+    @staticmethod
+    def planSubdivision(counts, minDepth, maxDepth, maxRows):
+        """Choose the trixels to subdivide so that each shard holds no more
+        than a given number of rows, where possible.
+
+        Parameters
+        ----------
+        counts : `dict` [`int`, `int`]
+            Number of rows in each trixel of depth ``maxDepth``, by HTM ID,
+            as returned by `countPoints` (summed over all inputs).
+        minDepth : `int`
+            Depth of the coarsest shards.
+        maxDepth : `int`
+            Depth of the finest shards; shards of this depth may hold more
+            than ``maxRows`` rows.
+        maxRows : `int`
+            Maximum number of rows per shard.
+
+        Returns
+        -------
+        subdivided : `list` of `int`
+            Sorted IDs of the trixels to subdivide.
+        """
+        trixelIds = np.array(list(counts.keys()), dtype=np.int64)
+        nRows = np.array(list(counts.values()), dtype=np.int64)
+        subdivided = []
+        parents = None
+        for depth in range(minDepth, maxDepth):
+            ancestors, inverse = np.unique(trixelIds >> 2*(maxDepth - depth), return_inverse=True)
+            dense = ancestors[np.bincount(inverse, weights=nRows, minlength=len(ancestors)) > maxRows]
+            if parents is not None:
+                # only the children of subdivided trixels are shards
+                dense = dense[np.isin(dense >> 2, parents)]
+            if len(dense) == 0:
+                break
+            subdivided.extend(dense.tolist())
+            parents = dense
+        return sorted(subdivided)
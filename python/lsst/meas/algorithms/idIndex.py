@@ -0,0 +1,350 @@
+# This file is part of meas_algorithms.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["IdIndex", "PartitionedIdIndex", "getPartitionName", "makePartitionSchema"]
+
+import numpy as np
+
+import lsst.afw.table as afwTable
+
+
+class IdIndex:
+    """Index of the shard that holds each object of an indexed reference
+    catalog, which lets loaders read only the shards that hold the objects
+    with given IDs.
+
+    It is persisted in partitions, each holding the objects in a range of
+    IDs with only their ``id`` and the ID of the ``shard`` holding them, and
+    a directory of the ID range of each partition, so that a loader need
+    read only the partitions covering the IDs it looks up; see
+    `makePartitions` and `PartitionedIdIndex`.
+
+    Parameters
+    ----------
+    ids : `dict`, optional
+        IDs of the objects in each shard (`numpy.ndarray` of `int`), by
+        shard ID.
+    """
+    def __init__(self, ids=None):
+        self._ids = {}
+        if ids is not None:
+            for shardId, shardIds in ids.items():
+                self.set(shardId, shardIds)
+        # ids and shard IDs of all objects, sorted by id; see _getSorted
+        self._sorted = None
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, shardId):
+        return shardId in self._ids
+
+    @staticmethod
+    def getIds(catalog):
+        """Return the IDs of the objects in one shard.
+
+        Parameters
+        ----------
+        catalog : `lsst.afw.table.SimpleCatalog`
+            The shard.
+
+        Returns
+        -------
+        ids : `numpy.ndarray` of `int`
+            The IDs of all the objects in the shard.
+        """
+        if not catalog.isContiguous():
+            catalog = catalog.copy(deep=True)
+        return np.array(catalog["id"], dtype=np.int64)
+
+    def update(self, shardId, catalog):
+        """Record the IDs of the objects in one shard.
+
+        Parameters
+        ----------
+        shardId : `int`
+            ID of the shard.
+        catalog : `lsst.afw.table.SimpleCatalog`
+            The shard.
+        """
+        self.set(shardId, self.getIds(catalog))
+
+    def set(self, shardId, ids):
+        """Record the IDs of the objects in one shard.
+
+        Parameters
+        ----------
+        shardId : `int`
+            ID of the shard.
+        ids : `numpy.ndarray` of `int`
+            The IDs of all the objects in the shard, as returned by
+            `getIds`.
+        """
+        self._ids[shardId] = np.asarray(ids, dtype=np.int64)
+        self._sorted = None
+
+    def getNRows(self, shardId):
+        """Return the number of objects in a shard, or `None` if the shard
+        is not in the index.
+        """
+        ids = self._ids.get(shardId)
+        return None if ids is None else len(ids)
+
+    def _getSorted(self):
+        """Return the IDs of all objects and of the shards holding them,
+        sorted by object ID.
+        """
+        if self._sorted is None:
+            shardIds = sorted(self._ids)
+            ids = np.concatenate([self._ids[shardId] for shardId in shardIds] + [np.empty(0, dtype=np.int64)])
+            shards = np.repeat(np.array(shardIds, dtype=np.int64),
+                               [len(self._ids[shardId]) for shardId in shardIds])
+            order = np.argsort(ids, kind="stable")
+            self._sorted = (ids[order], shards[order])
+        return self._sorted
+
+    def lookup(self, ids):
+        """Find the shards that hold objects with given IDs.
+
+        Parameters
+        ----------
+        ids : `numpy.ndarray` of `int`
+            IDs of the objects to find.
+
+        Returns
+        -------
+        idsByShard : `dict`
+            IDs of the objects found in each shard (`numpy.ndarray` of
+            `int`), by shard ID. IDs that are not in the index are omitted.
+        """
+        sortedIds, sortedShards = self._getSorted()
+        return _lookupSorted(sortedIds, sortedShards, np.unique(np.asarray(ids, dtype=np.int64)))
+
+    def makePartitions(self, maxRows):
+        """Split the index into partitions by id range, to be persisted.
+
+        Parameters
+        ----------
+        maxRows : `int`
+            Maximum number of objects per partition; a partition may hold
+            more only if more objects than this share one ID.
+
+        Returns
+        -------
+        directory : `lsst.afw.table.SimpleCatalog`
+            Catalog with one record per partition, sorted by ``id``, which
+            is the number of the partition; see `PartitionedIdIndex`.
+        partitions : `list` of `lsst.afw.table.BaseCatalog`
+            The partitions, each with one record per object, sorted by
+            ``id``, whose ``shard`` field is the ID of the shard holding the
+            object.
+        """
+        sortedIds, sortedShards = self._getSorted()
+        # objects with the same ID are kept in the same partition
+        starts = np.unique(np.searchsorted(sortedIds, sortedIds[::maxRows], side="left"))
+        ends = np.append(starts[1:], len(sortedIds))
+        schema = makePartitionSchema()
+        partitions = []
+        for begin, end in zip(starts, ends):
+            partition = afwTable.BaseCatalog(schema)
+            partition.resize(end - begin)
+            partition["id"] = sortedIds[begin:end]
+            partition["shard"] = sortedShards[begin:end]
+            partitions.append(partition)
+
+        schema = afwTable.SimpleTable.makeMinimalSchema()
+        schema.addField("id_min", type=np.int64, doc="smallest object ID in the partition")
+        schema.addField("id_max", type=np.int64, doc="largest object ID in the partition")
+        schema.addField("n_rows", type=np.int64, doc="number of objects in the partition")
+        directory = afwTable.SimpleCatalog(schema)
+        directory.resize(len(starts))
+        directory["id"] = np.arange(len(starts), dtype=np.int64)
+        directory["id_min"] = sortedIds[starts]
+        directory["id_max"] = sortedIds[ends - 1]
+        directory["n_rows"] = ends - starts
+        return directory, partitions
+
+    @classmethod
+    def fromPartitions(cls, partitions):
+        """Construct an index from partitions made by `makePartitions`.
+
+        Parameters
+        ----------
+        partitions : `list` of `lsst.afw.table.BaseCatalog`
+            All the persisted partitions, in order.
+
+        Returns
+        -------
+        idIndex : `IdIndex`
+            The index.
+        """
+        columns = [_getColumns(partition) for partition in partitions]
+        ids = np.concatenate([ids for ids, _ in columns] + [np.empty(0, dtype=np.int64)])
+        shards = np.concatenate([shards for _, shards in columns] + [np.empty(0, dtype=np.int64)])
+        order = np.argsort(shards, kind="stable")
+        shardIds, starts = np.unique(shards[order], return_index=True)
+        idIndex = cls(dict(zip(shardIds.tolist(), np.split(ids[order], starts[1:]))))
+        # the persisted records are already sorted by id
+        idIndex._sorted = (ids, shards)
+        return idIndex
+
+
+class PartitionedIdIndex:
+    """A persisted id index, whose partitions are read only when they are
+    needed to look up the requested IDs.
+
+    Parameters
+    ----------
+    directory : `lsst.afw.table.SimpleCatalog`
+        The directory of the partitions, as made by
+        `IdIndex.makePartitions`.
+    readPartition : callable
+        Function that reads a partition given its number, returning a
+        `lsst.afw.table.BaseCatalog`.
+    cache : `lsst.meas.algorithms.shardCache.ShardCache`
+        Cache in which to hold the partitions that have been read.
+    """
+    def __init__(self, directory, readPartition, cache):
+        if not directory.isContiguous():
+            directory = directory.copy(deep=True)
+        self._idMin = np.array(directory["id_min"], dtype=np.int64)
+        self._idMax = np.array(directory["id_max"], dtype=np.int64)
+        self._readPartition = readPartition
+        self._cache = cache
+
+    def __len__(self):
+        return len(self._idMin)
+
+    def getPartitions(self, ids):
+        """Return the numbers of the partitions that may hold objects with
+        given IDs.
+
+        Parameters
+        ----------
+        ids : `numpy.ndarray` of `int`
+            IDs of the objects to find.
+
+        Returns
+        -------
+        partitions : `numpy.ndarray` of `int`
+            Sorted numbers of the partitions.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        partitions = np.searchsorted(self._idMin, ids, side="right") - 1
+        inRange = partitions >= 0
+        inRange[inRange] = ids[inRange] <= self._idMax[partitions[inRange]]
+        return np.unique(partitions[inRange])
+
+    def lookup(self, ids):
+        """Find the shards that hold objects with given IDs, reading only
+        the partitions that cover them.
+
+        Parameters
+        ----------
+        ids : `numpy.ndarray` of `int`
+            IDs of the objects to find.
+
+        Returns
+        -------
+        idsByShard : `dict`
+            IDs of the objects found in each shard (`numpy.ndarray` of
+            `int`), by shard ID. IDs that are not in the index are omitted.
+        """
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        idsByShard = {}
+        for number in self.getPartitions(ids).tolist():
+            partition = self._cache.get(number, lambda: self._readPartition(number))
+            sortedIds, sortedShards = _getColumns(partition)
+            for shardId, found in _lookupSorted(sortedIds, sortedShards, ids).items():
+                if shardId in idsByShard:
+                    found = np.concatenate((idsByShard[shardId], found))
+                idsByShard[shardId] = found
+        return idsByShard
+
+
+def getPartitionName(number):
+    """Return the shard ID under which a partition of an id index is stored.
+
+    Parameters
+    ----------
+    number : `int`
+        Number of the partition.
+
+    Returns
+    -------
+    name : `str`
+        The special shard ID of the partition, e.g. ``id_index_0``.
+    """
+    return "id_index_%d" % (number,)
+
+
+def makePartitionSchema():
+    """Make the schema of the partitions of a persisted id index.
+
+    Returns
+    -------
+    schema : `lsst.afw.table.Schema`
+        Schema with an ``id`` field and a ``shard`` field, holding the ID
+        of the shard holding the object.
+    """
+    schema = afwTable.Schema()
+    schema.addField("id", type=np.int64, doc="unique ID of the object")
+    schema.addField("shard", type=np.int64, doc="ID of the shard holding the object")
+    return schema
+
+
+def _getColumns(partition):
+    """Return the ``id`` and ``shard`` columns of a partition of an id
+    index.
+    """
+    if not partition.isContiguous():
+        partition = partition.copy(deep=True)
+    return np.array(partition["id"], dtype=np.int64), np.array(partition["shard"], dtype=np.int64)
+
+
+def _lookupSorted(sortedIds, sortedShards, ids):
+    """Find the shards that hold objects with given IDs.
+
+    Parameters
+    ----------
+    sortedIds : `numpy.ndarray` of `int`
+        IDs of the indexed objects, sorted.
+    sortedShards : `numpy.ndarray` of `int`
+        IDs of the shards holding the indexed objects.
+    ids : `numpy.ndarray` of `int`
+        Unique IDs of the objects to find.
+
+    Returns
+    -------
+    idsByShard : `dict`
+        IDs of the objects found in each shard (`numpy.ndarray` of `int`),
+        by shard ID.
+    """
+    begin = np.searchsorted(sortedIds, ids, side="left")
+    end = np.searchsorted(sortedIds, ids, side="right")
+    found = end > begin
+    if not np.any(found):
+        return {}
+    # an ID held by more than one shard is found in all of them
+    positions = np.concatenate([np.arange(b, e) for b, e in zip(begin[found], end[found])])
+    shards = sortedShards[positions]
+    foundIds = sortedIds[positions]
+    return {int(shardId): foundIds[shards == shardId] for shardId in np.unique(shards)}
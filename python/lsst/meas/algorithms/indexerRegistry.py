@@ -23,8 +23,9 @@
 
 __all__ = ["IndexerRegistry"]
 
-from lsst.pex.config import Config, makeRegistry, Field
-from .htmIndexer import HtmIndexer
+from lsst.pex.config import Config, makeRegistry, Field, ListField, RangeField
+from .htmIndexer import HtmIndexer, AdaptiveHtmIndexer
+from .healpixIndexer import HealpixIndexer
 
 IndexerRegistry = makeRegistry(
     """Registry of indexing algorithms
@@ -48,3 +49,71 @@ def makeHtmIndexer(config):
 
 makeHtmIndexer.ConfigClass = HtmIndexerConfig
 IndexerRegistry.register("HTM", makeHtmIndexer)
+
+
+class AdaptiveHtmIndexerConfig(Config):
+    min_depth = RangeField(
+        doc="Depth of the coarsest HTM trixels, used where the catalog is sparse.",
+        dtype=int,
+        default=5,
+        min=0,
+    )
+    max_depth = RangeField(
+        doc="Depth of the finest HTM trixels; shards of this depth may hold more than max_rows rows.",
+        dtype=int,
+        default=10,
+        min=0,
+    )
+    max_rows = RangeField(
+        doc="Target maximum number of rows per shard: trixels holding more rows are subdivided, "
+            "down to max_depth.",
+        dtype=int,
+        default=100000,
+        min=1,
+    )
+    subdivided = ListField(
+        doc="IDs of the HTM trixels that are subdivided into their four children; the coverage map of "
+            "the shards. Set by the ingest from the number of rows in each trixel, and persisted with "
+            "the reference catalog config, so it should not normally be set by hand.",
+        dtype=int,
+        default=[],
+    )
+
+    def validate(self):
+        Config.validate(self)
+        if self.min_depth > self.max_depth:
+            raise ValueError("min_depth (%d) must not be greater than max_depth (%d)" %
+                             (self.min_depth, self.max_depth))
+
+
+def makeAdaptiveHtmIndexer(config):
+    """Make an AdaptiveHtmIndexer
+    """
+    return AdaptiveHtmIndexer(minDepth=config.min_depth, maxDepth=config.max_depth,
+                              subdivided=config.subdivided)
+
+
+makeAdaptiveHtmIndexer.ConfigClass = AdaptiveHtmIndexerConfig
+IndexerRegistry.register("ADAPTIVE_HTM", makeAdaptiveHtmIndexer)
+
+
+class HealpixIndexerConfig(Config):
+    order = RangeField(
+        doc="HEALPix order of the shards, in the nested scheme (nside = 2**order). "
+            "Default is order=7 which gives ~0.2 sq. deg. per pixel.",
+        dtype=int,
+        default=7,
+        min=0,
+        max=29,
+        inclusiveMax=True,
+    )
+
+
+def makeHealpixIndexer(config):
+    """Make a HealpixIndexer; this requires healpy
+    """
+    return HealpixIndexer(order=config.order)
+
+
+makeHealpixIndexer.ConfigClass = HealpixIndexerConfig
+IndexerRegistry.register("HEALPIX", makeHealpixIndexer)
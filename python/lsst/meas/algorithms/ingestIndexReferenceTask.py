@@ -23,10 +23,18 @@
 
 __all__ = ["IngestIndexedReferenceConfig", "IngestIndexedReferenceTask", "DatasetConfig"]
 
+import copy
+import itertools
 import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+from collections import Counter
 
 import astropy.time
 import astropy.units as u
+from astropy.io import fits
 import numpy as np
 
 import lsst.pex.config as pexConfig
@@ -36,8 +44,13 @@ import lsst.afw.table as afwTable
 from lsst.daf.base import PropertyList
 from lsst.afw.image import fluxErrFromABMagErr
 from .indexerRegistry import IndexerRegistry
+from .htmIndexer import HtmIndexer, AdaptiveHtmIndexer
 from .readTextCatalogTask import ReadTextCatalogTask
-from .loadReferenceObjects import LoadReferenceObjectsTask
+from .loadReferenceObjects import LoadReferenceObjectsTask, _getSortFluxName, isOldFluxField
+from .shardBuffer import ShardBuffer
+from .shardSummary import ShardSummary
+from .idIndex import IdIndex, getPartitionName
+from .columnarShard import getColumnarPath, writeColumnarShard
 
 _RAD_PER_DEG = math.pi / 180
 _RAD_PER_MILLIARCSEC = _RAD_PER_DEG/(3600*1000)
@@ -45,6 +58,13 @@ _RAD_PER_MILLIARCSEC = _RAD_PER_DEG/(3600*1000)
 # The most recent Indexed Reference Catalog on-disk format version.
 LATEST_FORMAT_VERSION = 1
 
+# Size of the blocks of a FITS file (bytes).
+_FITS_BLOCK_SIZE = 2880
+
+# State shared with forked worker processes by _createIndexedCatalogParallel;
+# a task holding a butler and a Schema cannot be pickled.
+_parallelIngestState = None
+
 
 def addRefCatMetadata(catalog):
     """Add metadata to a new (not yet populated) reference catalog.
@@ -62,6 +82,83 @@ def addRefCatMetadata(catalog):
     catalog.setMetadata(md)
 
 
+def convertRefCatFileToNanojansky(filename, log, doConvert=True):
+    """Convert the fluxes of a reference catalog file from jansky to
+    nanojansky, replacing the file atomically.
+
+    This is the file-level counterpart of
+    `lsst.meas.algorithms.loadReferenceObjects.convertToNanojansky`, for
+    converting whole reference catalogs: only the header of a file without
+    old-style flux fields is read, the flux columns are rescaled as arrays
+    of the memory-mapped table, and the converted file is written under a
+    temporary name in the same directory and renamed over the original, so
+    that an interrupted conversion never leaves a partially written file.
+    As with `convertToNanojansky`, ``_fluxSigma`` fields are renamed to
+    ``_fluxErr`` and aliases are dropped, and the format version is set in
+    the metadata.
+
+    Parameters
+    ----------
+    filename : `str`
+        Path of the FITS file written by `IngestIndexedReferenceTask`.
+    log : `lsst.log.Log`
+        Log to send messages to.
+    doConvert : `bool`, optional
+        Convert the file, or just identify the fields that need to be
+        converted?
+
+    Returns
+    -------
+    fluxNames : `list` of `str`
+        Names of the old-style flux fields, which were (or would be)
+        converted; empty if the file already has nJy fluxes, in which case
+        it is not modified.
+    """
+    header = fits.getheader(filename, 1)
+    fluxFields = []
+    for i in range(1, header.get("TFIELDS", 0) + 1):
+        name = header.get("TTYPE%d" % (i,), "")
+        units = header.get("TUNIT%d" % (i,), "")
+        if isOldFluxField(name, units):
+            fluxFields.append((name, units))
+    fluxNames = [name for name, _ in fluxFields]
+    if not fluxNames:
+        return fluxNames
+    fluxFieldsStr = '; '.join("(%s, '%s')" % field for field in fluxFields)
+    if not doConvert:
+        log.info(f"Found old-style refcat flux fields (name, units): {fluxFieldsStr}")
+        return fluxNames
+
+    fd, tmpPath = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)), prefix=".tmp-",
+                                   suffix=".fits")
+    os.close(fd)
+    try:
+        # a read-only memory map is copy-on-write, so the columns can be
+        # rescaled in place without modifying the file
+        with fits.open(filename, memmap=True) as hdus:
+            table = hdus[1]
+            for name in fluxNames:
+                table.data[name] *= 1e9
+                column = table.columns[name]
+                column.unit = "nJy"
+                if name.endswith("_fluxSigma"):
+                    column.name = name.replace("_fluxSigma", "_fluxErr")
+            for hdu in hdus:
+                while "ALIAS" in hdu.header:
+                    del hdu.header["ALIAS"]
+            table.header["HIERARCH REFCAT_FORMAT_VERSION"] = LATEST_FORMAT_VERSION
+            hdus.writeto(tmpPath, overwrite=True)
+        os.replace(tmpPath, filename)
+    except BaseException:
+        try:
+            os.unlink(tmpPath)
+        except FileNotFoundError:
+            pass
+        raise
+    log.info(f"Converted refcat flux fields to nJy (name, units): {fluxFieldsStr}")
+    return fluxNames
+
+
 class IngestReferenceRunner(pipeBase.TaskRunner):
     """Task runner for the reference catalog ingester
 
@@ -81,16 +178,23 @@ class IngestReferenceRunner(pipeBase.TaskRunner):
         Returns
         -------
         results : `lsst.pipe.base.Struct` or `None`
-            A empty struct if self.doReturnResults, else None
+            If self.doReturnResults, a struct holding the plan returned by
+            `IngestIndexedReferenceTask.planIngest` as ``plan`` if
+            ``config.plan_only`` is set, else an empty struct; otherwise
+            None.
         """
         files = parsedCmd.files
         butler = parsedCmd.butler
         task = self.TaskClass(config=self.config, log=self.log, butler=butler)
-        task.writeConfig(parsedCmd.butler, clobber=self.clobberConfig, doBackup=self.doBackup)
-
-        task.createIndexedCatalog(files)
+        if self.config.plan_only:
+            # nothing is written to the butler, not even the config
+            result = pipeBase.Struct(plan=task.planIngest(files))
+        else:
+            task.writeConfig(parsedCmd.butler, clobber=self.clobberConfig, doBackup=self.doBackup)
+            task.createIndexedCatalog(files)
+            result = pipeBase.Struct()
         if self.doReturnResults:
-            return pipeBase.Struct()
+            return result
 
 
 class DatasetConfig(pexConfig.Config):
@@ -113,6 +217,16 @@ class DatasetConfig(pexConfig.Config):
         default='HTM',
         doc='Name of indexer algoritm to use.  Default is HTM',
     )
+    shard_format = pexConfig.ChoiceField(
+        dtype=str,
+        default='fits',
+        allowed={
+            'fits': "Shards are FITS binary tables.",
+            'columnar': "Shards are FITS binary tables, each with a memory-mappable columnar copy "
+                        "(see lsst.meas.algorithms.columnarShard) that the Gen2 loader reads instead.",
+        },
+        doc='On-disk format of the shards.',
+    )
 
 
 class IngestIndexedReferenceConfig(pexConfig.Config):
@@ -233,6 +347,95 @@ class IngestIndexedReferenceConfig(pexConfig.Config):
         default=[],
         doc='Extra columns to add to the reference catalog.'
     )
+    column_storage = pexConfig.DictField(
+        keytype=str,
+        itemtype=str,
+        default={},
+        doc="Storage type of floating-point columns, by column name or by class of column: 'flux' "
+            "(all <band>_flux columns), 'fluxErr' (all <band>_fluxErr columns) or 'extra' (all "
+            "floating-point columns of extra_col_names); a column name takes precedence over its class. "
+            "Types are 'float64' (the default) and 'float32'. Loaders widen columns stored as float32 to "
+            "float64."
+    )
+    buffer_shards = pexConfig.Field(
+        dtype=bool,
+        default=False,
+        doc="Buffer the rows for each shard across all input files and write each shard exactly once "
+            "at the end, instead of reading, appending to and rewriting every touched shard for "
+            "each input file?"
+    )
+    shard_buffer_size = pexConfig.RangeField(
+        dtype=float,
+        default=1000.0,
+        min=0.0,
+        doc="Approximate amount of memory (MB) to use for buffered shard rows before spilling them "
+            "to disk; only used if buffer_shards is True."
+    )
+    spill_dir = pexConfig.Field(
+        dtype=str,
+        optional=True,
+        doc="Directory in which to write shard buffer spill files, and the per-file shard pieces "
+            "written when n_processes > 1; if None then a temporary directory is used."
+    )
+    n_processes = pexConfig.RangeField(
+        dtype=int,
+        default=1,
+        min=1,
+        doc="Number of worker processes to use. If more than one, input files are read and indexed "
+            "in parallel, then each shard is assembled and written once by the worker that owns it. "
+            "Automatically generated ids do not depend on the number of processes."
+    )
+    sort_by_flux = pexConfig.Field(
+        dtype=str,
+        optional=True,
+        doc="Name of a column in mag_column_list by whose flux the rows of each shard are sorted, "
+            "brightest first (rows with no flux last), so that loaders limited to the brightest objects "
+            "need only take a prefix of each shard. If None, rows are kept in the order they were read."
+    )
+    write_id_index = pexConfig.Field(
+        dtype=bool,
+        default=False,
+        doc="Write an index of the shard holding each object, so that loaders can read only the shards "
+            "holding objects with given ids (e.g. to reconstitute persisted match lists)? "
+            "The index is held in memory during the ingest, which takes 16 bytes per object."
+    )
+    id_index_partition_rows = pexConfig.RangeField(
+        dtype=int,
+        default=100000,
+        min=1,
+        doc="Number of objects in each partition of the id index, which holds a range of ids; loaders "
+            "read only the partitions covering the ids they look up. Each object takes 16 bytes."
+    )
+    checkpoint = pexConfig.Field(
+        dtype=bool,
+        default=True,
+        doc="Record the progress of the ingest in a manifest stored with the master schema, so that "
+            "rerunning with the same list of files resumes an interrupted ingest, dropping any rows "
+            "it left in shards, rather than starting again and duplicating rows? Rerunning with "
+            "more files appended to the list ingests only the new files. Files added to a catalog "
+            "that was ingested without a checkpoint are ingested without one."
+    )
+    plan_only = pexConfig.Field(
+        dtype=bool,
+        default=False,
+        doc="Only plan the ingest: read the positions of the input rows and log the number of rows "
+            "in each shard, the predicted size of the catalog on disk, the memory needed to ingest it "
+            "and a recommended HTM depth, without writing anything to the butler?"
+    )
+    plan_max_rows = pexConfig.RangeField(
+        dtype=int,
+        default=100000,
+        min=1,
+        doc="Maximum number of rows per shard for which the plan recommends an HTM depth; only used "
+            "if plan_only is True."
+    )
+    plan_max_depth = pexConfig.RangeField(
+        dtype=int,
+        default=12,
+        min=0,
+        max=20,
+        doc="Deepest HTM depth the plan considers; only used if plan_only is True."
+    )
 
     def setDefaults(self):
         # Newly ingested reference catalogs always have the latest format_version.
@@ -268,6 +471,13 @@ class IngestIndexedReferenceConfig(pexConfig.Config):
         if (self.pm_ra_name or self.parallax_name) and not self.epoch_name:
             raise ValueError(
                 '"epoch_name" must be specified if "pm_ra/dec_name" or "parallax_name" are specified')
+        badStorage = {key: value for key, value in self.column_storage.items()
+                      if value not in ("float64", "float32")}
+        if badStorage:
+            raise ValueError('"column_storage" types must be "float64" or "float32": {}'.format(badStorage))
+        if self.sort_by_flux and self.sort_by_flux not in self.mag_column_list:
+            raise ValueError('"sort_by_flux" must be in "mag_column_list": {} not in {}'.format(
+                self.sort_by_flux, list(self.mag_column_list)))
 
 
 class IngestIndexedReferenceTask(pipeBase.CmdLineTask):
@@ -312,44 +522,891 @@ class IngestIndexedReferenceTask(pipeBase.CmdLineTask):
     def __init__(self, *args, **kwargs):
         self.butler = kwargs.pop('butler')
         pipeBase.Task.__init__(self, *args, **kwargs)
-        self.indexer = IndexerRegistry[self.config.dataset_config.indexer.name](
-            self.config.dataset_config.indexer.active)
+        # config of the ingested catalog, which differs from
+        # config.dataset_config if the indexer's coverage map is chosen by
+        # the ingest; see _planSubdivision
+        self.datasetConfig = self.config.dataset_config
+        self.indexer = IndexerRegistry[self.datasetConfig.indexer.name](self.datasetConfig.indexer.active)
         self.makeSubtask('file_reader')
+        # number of rows in each shard that belong to completely ingested
+        # files, or None if not checkpointing; see createIndexedCatalog
+        self._shardRows = None
+        # summary statistics of each shard, or None if no summary is to be
+        # written; see createIndexedCatalog
+        self._shardSummary = None
+        # index of the shard holding each object, or None if no index is to
+        # be written; see createIndexedCatalog
+        self._idIndex = None
+        # IDs of the shards written by createIndexedCatalog
+        self._writtenShards = set()
 
     def createIndexedCatalog(self, files):
         """Index a set of files comprising a reference catalog.
 
         Outputs are persisted in the data repository.
 
+        If ``config.checkpoint`` is set and a previous ingest into the same
+        repository recorded its progress, the files it finished ingesting
+        are skipped and automatically generated ids carry on from where it
+        stopped.
+        Files added to a catalog that was ingested without a checkpoint are
+        ingested without one, whatever ``config.checkpoint``.
+
+        If ``config.sort_by_flux`` is set, each shard that was written is
+        sorted once all files have been ingested, and marked as sorted in
+        its metadata; shards are never sorted while files are being added
+        to them, so that an interrupted ingest can still be resumed.
+
+        A summary of the statistics of each shard, which loaders use to skip
+        shards, is written as the ``ref_cat`` dataset with the special shard
+        ID ``shard_summary``; see
+        `lsst.meas.algorithms.shardSummary.ShardSummary`. It is not written
+        when adding files to a catalog that was ingested without a summary
+        and without a checkpoint.
+
+        If ``config.write_id_index`` is set, an index of the shard holding
+        each object, which loaders use to read objects by ID, is written in
+        partitions by id range, with a directory of the partitions as the
+        ``ref_cat`` dataset with the special shard ID ``id_index``; see
+        `lsst.meas.algorithms.idIndex.IdIndex`. Like the summary, it is not
+        written when adding files to a catalog that was ingested without one
+        and without a checkpoint.
+
+        If ``config.dataset_config.shard_format`` is ``columnar``, a
+        columnar copy of each shard that was written is made once all files
+        have been ingested and the shards sorted; see
+        `_writeColumnarShards`.
+
+        If ``config.dataset_config`` uses the ``ADAPTIVE_HTM`` indexer
+        without a coverage map, the coverage map is chosen first; see
+        `_planSubdivision`.
+
         Parameters
         ----------
         files : `list`
             A list of file paths to read.
+
+        Raises
+        ------
+        RuntimeError
+            Raised if ``config.checkpoint`` is set and ``files`` does not
+            start with the files recorded by a previous ingest.
         """
         rec_num = 0
-        first = True
+        ingestedFiles = []
+        self._shardRows = None
+        masterDataId = self.indexer.makeDataId('master_schema', self.config.dataset_config.ref_dataset_name)
+        masterExists = self.butler.datasetExists('ref_cat', dataId=masterDataId)
+        if self.config.checkpoint:
+            manifest = self._readManifest()
+            if manifest is not None:
+                ingestedFiles = manifest.ingestedFiles
+                rec_num = manifest.recNum
+                self._shardRows = manifest.shardRows
+                nDone = len(ingestedFiles)
+                if list(files[:nDone]) != ingestedFiles or \
+                        list(files[nDone:nDone + len(manifest.pendingFiles)]) != manifest.pendingFiles:
+                    raise RuntimeError("Files to ingest do not start with the %d files ingested and %d "
+                                       "files being ingested when the previous ingest stopped" %
+                                       (nDone, len(manifest.pendingFiles)))
+                self.log.info("Resuming ingest: skipping %d files that were already ingested", nDone)
+            elif masterExists:
+                self.log.warn("Not checkpointing, because the reference catalog was ingested without "
+                              "a checkpoint")
+            else:
+                self._shardRows = {}
+        self._planSubdivision(files)
+        self._shardSummary = self._readShardSummary()
+        if self._shardSummary is None:
+            if masterExists and self._shardRows is None:
+                self.log.warn("Not writing a shard summary, because the reference catalog was ingested "
+                              "without one")
+            else:
+                self._shardSummary = ShardSummary()
+        self._idIndex = None
+        if self.config.write_id_index:
+            self._idIndex = self._readIdIndex()
+            if self._idIndex is None:
+                if masterExists and self._shardRows is None:
+                    self.log.warn("Not writing an id index, because the reference catalog was ingested "
+                                  "without one")
+                else:
+                    self._idIndex = IdIndex()
+        resuming = bool(ingestedFiles)
+        files = list(files[len(ingestedFiles):])
+
+        self._writtenShards = set()
+        if files and self.config.n_processes > 1:
+            self._writeManifest(ingestedFiles, files, rec_num)
+            rec_num = self._createIndexedCatalogParallel(files, rec_num)
+            self._writeManifest(ingestedFiles + files, [], rec_num)
+        elif files:
+            self._createIndexedCatalogSerial(files, ingestedFiles, rec_num)
+        if self.config.sort_by_flux:
+            # a previous run may have stopped before sorting the shards it wrote
+            toSort = set(self._shardRows) if resuming else set()
+            self._sortShards(sorted(self._writtenShards | toSort))
+        if self.datasetConfig.shard_format == 'columnar':
+            # a previous run may have stopped before writing the copies
+            toWrite = set(self._shardRows) if resuming else set()
+            self._writeColumnarShards(sorted(self._writtenShards | toWrite))
+        self._writeShardSummary()
+        self._writeIdIndex()
+        dataId = self.indexer.makeDataId(None, self.config.dataset_config.ref_dataset_name)
+        self.butler.put(self.datasetConfig, 'ref_cat_config', dataId=dataId)
+
+    def _planSubdivision(self, files):
+        """Choose the coverage map of an adaptive HTM indexer, so that each
+        shard holds no more than the configured number of rows.
+
+        Nothing is done unless ``config.dataset_config`` uses the
+        ``ADAPTIVE_HTM`` indexer and does not set its coverage map. The
+        coverage map of a catalog whose config has already been written
+        (when adding files to it) is reused; otherwise all the input files
+        are read once to count their rows in each of the finest trixels.
+        Counting all the files, including those already ingested, gives the
+        same coverage map when an interrupted ingest is resumed.
+
+        The chosen coverage map is set in ``self.datasetConfig``, which is
+        persisted with the catalog, and ``self.indexer`` is remade with it.
+
+        Parameters
+        ----------
+        files : `list`
+            A list of file paths to read.
+        """
+        indexerConfig = self.config.dataset_config.indexer
+        if indexerConfig.name != "ADAPTIVE_HTM" or indexerConfig.active.subdivided:
+            return
+        dataId = self.indexer.makeDataId(None, self.config.dataset_config.ref_dataset_name)
+        if self.butler.datasetExists('ref_cat_config', dataId=dataId):
+            subdivided = list(self.butler.get('ref_cat_config', dataId=dataId).indexer.active.subdivided)
+        else:
+            self.log.info("Counting the rows of %d files to plan the shards", len(files))
+            counts = Counter()
+            for filename in files:
+                for arr in self._readChunks(filename):
+                    counts.update(self.indexer.countPoints(arr[self.config.ra_name],
+                                                           arr[self.config.dec_name]))
+            activeConfig = indexerConfig.active
+            subdivided = AdaptiveHtmIndexer.planSubdivision(counts, activeConfig.min_depth,
+                                                            activeConfig.max_depth, activeConfig.max_rows)
+            self.log.info("Subdividing %d trixels so that shards hold at most %d rows where possible",
+                          len(subdivided), activeConfig.max_rows)
+        # the config may be frozen, so set the coverage map in a copy
+        self.datasetConfig = copy.deepcopy(self.config.dataset_config)
+        self.datasetConfig.indexer.active.subdivided = subdivided
+        self.indexer = IndexerRegistry[self.datasetConfig.indexer.name](self.datasetConfig.indexer.active)
+
+    def planIngest(self, files, nLargest=10):
+        """Plan the ingest of a set of files, without writing anything.
+
+        Only the positions of the input rows are used: each row is assigned
+        to a shard by ``self.indexer``, as it would be by
+        `createIndexedCatalog`, and to a trixel of depth
+        ``config.plan_max_depth``, to find the largest shard for every HTM
+        depth. The plan is logged and returned.
+
+        Sizes are predicted from the width of a row of a FITS shard with the
+        schema of the catalog, and the size of the headers of an empty one.
+        The memory estimate is rough: it allows each process two copies of
+        the largest shard, as when appending rows to it, plus the shard
+        buffer and the id index, if they are used.
+
+        Parameters
+        ----------
+        files : `list`
+            A list of file paths to read.
+        nLargest : `int`, optional
+            Number of the largest shards to report.
+
+        Returns
+        -------
+        plan : `lsst.pipe.base.Struct`
+            A struct containing:
+
+            - ``nRows`` : number of input rows (`int`).
+            - ``shardRows`` : number of rows in each shard, by shard ID
+              (`dict` [`int`, `int`]).
+            - ``histogram`` : number of shards holding from ``2**k`` to
+              ``2**(k+1) - 1`` rows, as a `list` of tuples
+              ``(2**k, 2**(k+1), nShards)`` of increasing ``k``.
+            - ``largestShards`` : IDs and numbers of rows of the
+              ``nLargest`` largest shards, largest first (`list` of
+              `tuple` [`int`, `int`]).
+            - ``nBytes`` : predicted size of the shards on disk (`int`).
+            - ``memoryBytes`` : estimated memory needed to ingest the
+              catalog (`int`).
+            - ``depthMaxRows`` : number of rows in the largest shard of an
+              HTM indexer of each depth, up to ``config.plan_max_depth``
+              (`dict` [`int`, `int`]).
+            - ``recommendedDepth`` : shallowest HTM depth whose shards hold
+              no more than ``config.plan_max_rows`` rows, or
+              ``config.plan_max_depth`` if there is none (`int`).
+
+        Raises
+        ------
+        RuntimeError
+            Raised if the files hold no rows.
+        """
+        def countIds(ids):
+            ids, counts = np.unique(np.asarray(ids, dtype=np.int64), return_counts=True)
+            return dict(zip(ids.tolist(), counts.tolist()))
+
+        self._planSubdivision(files)
+        maxDepth = self.config.plan_max_depth
+        fineIndexer = HtmIndexer(depth=maxDepth)
+        shardRows = Counter()
+        trixelRows = Counter()
+        schema = None
+        nRows = 0
+        self.log.info("Reading the positions of the rows of %d files to plan the ingest", len(files))
         for filename in files:
-            arr = self.file_reader.run(filename)
+            for arr in self._readChunks(filename):
+                if schema is None:
+                    schema, _ = self.makeSchema(arr.dtype)
+                ra = arr[self.config.ra_name]
+                dec = arr[self.config.dec_name]
+                shardRows.update(countIds(self.indexer.indexPoints(ra, dec)))
+                trixelRows.update(countIds(fineIndexer.indexPoints(ra, dec)))
+                nRows += len(arr)
+        if nRows == 0:
+            raise RuntimeError("No rows found in %d files" % (len(files),))
+
+        exponents, counts = np.unique(np.log2(list(shardRows.values())).astype(int), return_counts=True)
+        histogram = [(2**k, 2**(k + 1), n) for k, n in zip(exponents.tolist(), counts.tolist())]
+        largestShards = shardRows.most_common(nLargest)
+
+        rowBytes, headerBytes = self._measureShardFile(schema)
+        nBytes = 0
+        for n in shardRows.values():
+            nBytes += headerBytes + _FITS_BLOCK_SIZE*math.ceil(n*rowBytes/_FITS_BLOCK_SIZE)
+            if self.datasetConfig.shard_format == 'columnar':
+                nBytes += n*schema.getRecordSize()
+        memoryBytes = 2*self.config.n_processes*largestShards[0][1]*schema.getRecordSize()
+        if self.config.buffer_shards:
+            memoryBytes += int(self.config.shard_buffer_size*1e6)
+        if self.config.write_id_index:
+            memoryBytes += 16*nRows
+
+        trixelIds = np.array(list(trixelRows.keys()), dtype=np.int64)
+        trixelCounts = np.array(list(trixelRows.values()), dtype=np.int64)
+        depthMaxRows = {}
+        for depth in range(maxDepth + 1):
+            _, inverse = np.unique(trixelIds >> 2*(maxDepth - depth), return_inverse=True)
+            depthMaxRows[depth] = int(np.bincount(inverse, weights=trixelCounts).max())
+        recommendedDepth = min((depth for depth, n in depthMaxRows.items()
+                                if n <= self.config.plan_max_rows), default=maxDepth)
+
+        self.log.info("Planned %d rows in %d shards: %.1f MB on disk; about %.1f MB of memory needed",
+                      nRows, len(shardRows), nBytes/1e6, memoryBytes/1e6)
+        for low, high, n in histogram:
+            self.log.info("Shards with %d to %d rows: %d", low, high - 1, n)
+        for shardId, n in largestShards:
+            self.log.info("Shard %d: %d rows", shardId, n)
+        if depthMaxRows[recommendedDepth] > self.config.plan_max_rows:
+            self.log.warn("No HTM depth up to %d gives shards of at most %d rows", maxDepth,
+                          self.config.plan_max_rows)
+        self.log.info("Recommended HTM depth: %d, whose largest shard holds %d rows", recommendedDepth,
+                      depthMaxRows[recommendedDepth])
+        return pipeBase.Struct(
+            nRows=nRows,
+            shardRows=dict(shardRows),
+            histogram=histogram,
+            largestShards=largestShards,
+            nBytes=nBytes,
+            memoryBytes=memoryBytes,
+            depthMaxRows=depthMaxRows,
+            recommendedDepth=recommendedDepth,
+        )
+
+    @staticmethod
+    def _measureShardFile(schema):
+        """Measure the layout of a FITS shard file.
+
+        Parameters
+        ----------
+        schema : `lsst.afw.table.Schema`
+            Schema of the shards.
+
+        Returns
+        -------
+        rowBytes : `int`
+            Width of a row of the table (bytes).
+        headerBytes : `int`
+            Size of a shard with no rows (bytes).
+        """
+        catalog = afwTable.SimpleCatalog(schema)
+        addRefCatMetadata(catalog)
+        with tempfile.TemporaryDirectory() as tmpDir:
+            path = os.path.join(tmpDir, "shard.fits")
+            catalog.writeFits(path)
+            headerBytes = os.path.getsize(path)
+            rowBytes = fits.getheader(path, 1)["NAXIS1"]
+        return rowBytes, headerBytes
+
+    def _createIndexedCatalogSerial(self, files, ingestedFiles, rec_num):
+        """Index a set of files in this process.
+
+        Parameters
+        ----------
+        files : `list`
+            A list of file paths to read.
+        ingestedFiles : `list`
+            A list of file paths that were ingested by a previous run.
+        rec_num : `int`
+            The last unique id that was assigned by a previous run.
+        """
+        first = True
+        shardBuffer = None
+        if self.config.buffer_shards:
+            shardBuffer = ShardBuffer(int(self.config.shard_buffer_size*2**20),
+                                      spillDir=self.config.spill_dir, log=self.log)
+            # no shard is written until all files have been read
+            self._writeManifest(ingestedFiles, files, rec_num)
+        try:
+            for filename in files:
+                if shardBuffer is None:
+                    self._writeManifest(ingestedFiles, [filename], rec_num)
+                for arr in self._readChunks(filename):
+                    if first:
+                        schema, key_map = self.makeSchema(arr.dtype)
+                        # persist empty catalog to hold the master schema
+                        dataId = self.indexer.makeDataId('master_schema',
+                                                         self.config.dataset_config.ref_dataset_name)
+                        self.butler.put(self.getCatalog(dataId, schema), 'ref_cat',
+                                        dataId=dataId)
+                        first = False
+                    rec_num = self._ingestChunk(arr, schema, key_map, rec_num, shardBuffer)
+                if shardBuffer is None:
+                    ingestedFiles = ingestedFiles + [filename]
+            if shardBuffer is not None:
+                self._writeBufferedShards(shardBuffer, schema)
+                ingestedFiles = ingestedFiles + files
+        finally:
+            if shardBuffer is not None:
+                shardBuffer.close()
+        self._writeManifest(ingestedFiles, [], rec_num)
+
+    def _readManifest(self):
+        """Read the manifest recording the progress of a previous ingest.
+
+        Returns
+        -------
+        manifest : `lsst.pipe.base.Struct` or `None`
+            `None` if there is no manifest, else a struct containing:
+
+            - ``ingestedFiles`` : files that were completely ingested, in
+              order (`list` of `str`).
+            - ``pendingFiles`` : files that were being ingested when the
+              ingest stopped (`list` of `str`).
+            - ``recNum`` : the last unique id that was assigned (`int`).
+            - ``shardRows`` : the number of rows in each shard that belong to
+              the ingested files (`dict` mapping shard ID to `int`).
+        """
+        dataId = self.indexer.makeDataId('ingest_manifest', self.config.dataset_config.ref_dataset_name)
+        if not self.butler.datasetExists('ref_cat', dataId=dataId):
+            return None
+        manifest = self.butler.get('ref_cat', dataId=dataId)
+        md = manifest.getMetadata()
+
+        def getList(name):
+            return list(md.getArray(name)) if md.exists(name) else []
+
+        return pipeBase.Struct(
+            ingestedFiles=getList("INGESTED_FILES"),
+            pendingFiles=getList("PENDING_FILES"),
+            recNum=md.getScalar("REC_NUM"),
+            shardRows=dict(zip(manifest["id"].tolist(), manifest["n_rows"].tolist())),
+        )
+
+    def _writeManifest(self, ingestedFiles, pendingFiles, rec_num):
+        """Write the manifest recording the progress of this ingest, if it is
+        being checkpointed.
+
+        The manifest is stored as a ``ref_cat`` dataset with the special
+        shard ID ``ingest_manifest``. It has one row per shard, holding the
+        shard ID in the ``id`` field and the number of rows in the shard
+        that belong to the ingested files in the ``n_rows`` field; the
+        files and the last assigned unique id are in its metadata.
+
+        Parameters
+        ----------
+        ingestedFiles : `list` of `str`
+            Files that have been completely ingested, in order.
+        pendingFiles : `list` of `str`
+            Files that are about to be ingested; any shard rows beyond those
+            recorded here belong to these files.
+        rec_num : `int`
+            The last unique id that was assigned.
+        """
+        if self._shardRows is None:
+            return
+        schema = afwTable.SimpleTable.makeMinimalSchema()
+        schema.addField("n_rows", type=np.int64, doc="number of rows in the shard from ingested files")
+        manifest = afwTable.SimpleCatalog(schema)
+        shardIds = sorted(self._shardRows)
+        manifest.resize(len(shardIds))
+        manifest["id"] = np.array(shardIds, dtype=np.int64)
+        manifest["n_rows"] = np.array([self._shardRows[shardId] for shardId in shardIds], dtype=np.int64)
+        md = PropertyList()
+        md.set("REC_NUM", int(rec_num))
+        if ingestedFiles:
+            md.set("INGESTED_FILES", list(ingestedFiles))
+        if pendingFiles:
+            md.set("PENDING_FILES", list(pendingFiles))
+        manifest.setMetadata(md)
+        dataId = self.indexer.makeDataId('ingest_manifest', self.config.dataset_config.ref_dataset_name)
+        self.butler.put(manifest, 'ref_cat', dataId=dataId)
+
+    def _readShardSummary(self):
+        """Read the shard summary written by a previous ingest.
+
+        Returns
+        -------
+        shardSummary : `lsst.meas.algorithms.shardSummary.ShardSummary` or `None`
+            The shard summary, or `None` if there is none.
+        """
+        dataId = self.indexer.makeDataId('shard_summary', self.config.dataset_config.ref_dataset_name)
+        if not self.butler.datasetExists('ref_cat', dataId=dataId):
+            return None
+        return ShardSummary.fromCatalog(self.butler.get('ref_cat', dataId=dataId))
+
+    def _writeShardSummary(self):
+        """Write the shard summary, if one is being kept.
+
+        If checkpointing, the shards whose summary is missing or out of date
+        (because a previous ingest stopped before writing the summary) are
+        read and summarized first.
+        """
+        if self._shardSummary is None:
+            return
+        if self._shardRows is not None:
+            for pixel_id, nRows in sorted(self._shardRows.items()):
+                if self._shardSummary.getNRows(pixel_id) != nRows:
+                    dataId = self.indexer.makeDataId(pixel_id, self.config.dataset_config.ref_dataset_name)
+                    self._shardSummary.update(pixel_id, self.butler.get('ref_cat', dataId=dataId)[:nRows])
+        dataId = self.indexer.makeDataId('shard_summary', self.config.dataset_config.ref_dataset_name)
+        self.butler.put(self._shardSummary.makeCatalog(), 'ref_cat', dataId=dataId)
+
+    def _readIdIndex(self):
+        """Read the id index written by a previous ingest.
+
+        Returns
+        -------
+        idIndex : `lsst.meas.algorithms.idIndex.IdIndex` or `None`
+            The id index, or `None` if there is none.
+        """
+        datasetName = self.config.dataset_config.ref_dataset_name
+        dataId = self.indexer.makeDataId('id_index', datasetName)
+        if not self.butler.datasetExists('ref_cat', dataId=dataId):
+            return None
+        directory = self.butler.get('ref_cat', dataId=dataId)
+        partitions = []
+        for number in range(len(directory)):
+            dataId = self.indexer.makeDataId(getPartitionName(number), datasetName)
+            partitions.append(afwTable.BaseCatalog.readFits(self.butler.get('ref_cat_filename',
+                                                                            dataId=dataId)[0]))
+        return IdIndex.fromPartitions(partitions)
+
+    def _writeIdIndex(self):
+        """Write the id index, if one is being kept.
+
+        If checkpointing, the shards whose entries are missing or out of
+        date (because a previous ingest stopped before writing the index)
+        are read and indexed first.
+        """
+        if self._idIndex is None:
+            return
+        if self._shardRows is not None:
+            for pixel_id, nRows in sorted(self._shardRows.items()):
+                if self._idIndex.getNRows(pixel_id) != nRows:
+                    dataId = self.indexer.makeDataId(pixel_id, self.config.dataset_config.ref_dataset_name)
+                    self._idIndex.update(pixel_id, self.butler.get('ref_cat', dataId=dataId)[:nRows])
+        datasetName = self.config.dataset_config.ref_dataset_name
+        directory, partitions = self._idIndex.makePartitions(self.config.id_index_partition_rows)
+        # the partitions are written before the directory that lists them
+        for number, partition in enumerate(partitions):
+            dataId = self.indexer.makeDataId(getPartitionName(number), datasetName)
+            self._writeFitsAtomically(partition, self.butler.get('ref_cat_filename', dataId=dataId)[0])
+        # remove partitions left by a previous ingest that made more of them
+        for number in itertools.count(len(partitions)):
+            dataId = self.indexer.makeDataId(getPartitionName(number), datasetName)
+            path = self.butler.get('ref_cat_filename', dataId=dataId)[0]
+            if not os.path.exists(path):
+                break
+            os.unlink(path)
+        dataId = self.indexer.makeDataId('id_index', datasetName)
+        self.butler.put(directory, 'ref_cat', dataId=dataId)
+
+    @staticmethod
+    def _writeFitsAtomically(catalog, path):
+        """Write a catalog to a FITS file under a temporary name and rename
+        it, so that readers never see a partial file.
+
+        Parameters
+        ----------
+        catalog : `lsst.afw.table.BaseCatalog`
+            The catalog to write.
+        path : `str`
+            Path of the file to write; its directory is created if needed.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmpPath = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".fits")
+        os.close(fd)
+        try:
+            catalog.writeFits(tmpPath)
+            os.replace(tmpPath, path)
+        except BaseException:
+            try:
+                os.unlink(tmpPath)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def _sortShards(self, shardIds):
+        """Sort the rows of shards by the flux of ``config.sort_by_flux``,
+        brightest first, and mark them as sorted in their metadata.
+
+        Shards that are already marked as sorted are not rewritten.
+
+        Parameters
+        ----------
+        shardIds : `list` of `int`
+            IDs of the shards to sort.
+        """
+        fluxName = self.config.sort_by_flux + "_flux"
+        self.log.info("Sorting %d shards by %s", len(shardIds), fluxName)
+        for pixel_id in shardIds:
+            dataId = self.indexer.makeDataId(pixel_id, self.config.dataset_config.ref_dataset_name)
+            catalog = self.butler.get('ref_cat', dataId=dataId)
+            if _getSortFluxName(catalog) == fluxName:
+                continue
+            if not catalog.isContiguous():
+                catalog = catalog.copy(deep=True)
+            # a stable sort on the negated flux puts NaN fluxes last
+            order = np.argsort(-catalog[fluxName], kind="stable")
+            sortedCatalog = afwTable.SimpleCatalog(catalog.schema)
+            sortedCatalog.resize(len(catalog))
+            for item in catalog.schema:
+                key = item.key
+                if item.field.getTypeString() != "String":
+                    sortedCatalog[key] = catalog[key][order]
+                    continue
+                # String columns cannot be set through column views
+                for record, i in zip(sortedCatalog, order.tolist()):
+                    record.set(key, catalog[i].get(key))
+            md = catalog.getMetadata()
+            if md is None:
+                md = PropertyList()
+            md.set("REFCAT_SORT_FLUX", fluxName)
+            sortedCatalog.setMetadata(md)
+            self.butler.put(sortedCatalog, 'ref_cat', dataId=dataId)
+
+    def _writeColumnarShards(self, shardIds):
+        """Write a columnar copy of shards, next to their FITS files.
+
+        Parameters
+        ----------
+        shardIds : `list` of `int`
+            IDs of the shards to copy.
+        """
+        self.log.info("Writing columnar copies of %d shards", len(shardIds))
+        for pixel_id in shardIds:
+            dataId = self.indexer.makeDataId(pixel_id, self.config.dataset_config.ref_dataset_name)
+            path = self.butler.get('ref_cat_filename', dataId=dataId)[0]
+            writeColumnarShard(self.butler.get('ref_cat', dataId=dataId), getColumnarPath(path))
+
+    @staticmethod
+    def _clearSortFlux(catalog):
+        """Remove the mark that a shard is sorted, before writing rows that
+        may be out of order.
+
+        Parameters
+        ----------
+        catalog : `lsst.afw.table.SimpleCatalog`
+            The shard; its metadata is modified in place.
+        """
+        md = catalog.getMetadata()
+        if md is not None and md.exists("REFCAT_SORT_FLUX"):
+            md.remove("REFCAT_SORT_FLUX")
+
+    def _getShard(self, pixel_id, schema, nNewElements=0):
+        """Get a shard to extend, dropping any rows left in it by an
+        interrupted ingest.
+
+        Parameters
+        ----------
+        pixel_id : `int`
+            ID of the shard.
+        schema : `lsst.afw.table.Schema`
+            Schema to use in catalog creation if the shard doesn't exist.
+        nNewElements : `int`, optional
+            Number of new (default-initialized) records to append to the
+            catalog, to be filled in by the caller.
+
+        Returns
+        -------
+        dataId : `dict`
+            Identifier of the shard.
+        catalog : `lsst.afw.table.SimpleCatalog`
+            The shard, as returned by `getCatalog`.
+        """
+        dataId = self.indexer.makeDataId(pixel_id, self.config.dataset_config.ref_dataset_name)
+        nRows = None if self._shardRows is None else self._shardRows.get(pixel_id, 0)
+        return dataId, self.getCatalog(dataId, schema, nNewElements, nRows=nRows)
+
+    def _putShard(self, pixel_id, dataId, catalog):
+        """Write a shard, and record its new length for the manifest, its
+        statistics for the shard summary and its ids for the id index.
+
+        Parameters
+        ----------
+        pixel_id : `int`
+            ID of the shard.
+        dataId : `dict`
+            Identifier of the shard.
+        catalog : `lsst.afw.table.SimpleCatalog`
+            The shard to write.
+        """
+        self._clearSortFlux(catalog)
+        self.butler.put(catalog, 'ref_cat', dataId=dataId)
+        self._writtenShards.add(pixel_id)
+        if self._shardRows is not None:
+            self._shardRows[pixel_id] = len(catalog)
+        if self._shardSummary is not None:
+            self._shardSummary.update(pixel_id, catalog)
+        if self._idIndex is not None:
+            self._idIndex.update(pixel_id, catalog)
+
+    def _readChunks(self, filename):
+        """Read an input file in chunks of rows.
+
+        Parameters
+        ----------
+        filename : `str`
+            Path of the file to read.
+
+        Returns
+        -------
+        chunks : iterator of structured `numpy.array`
+            The rows of the file; a single chunk holding the whole file
+            if ``file_reader`` has no ``readChunks`` method.
+        """
+        readChunks = getattr(self.file_reader, "readChunks", None)
+        if readChunks is None:
+            return iter([self.file_reader.run(filename)])
+        return readChunks(filename)
+
+    def _ingestChunk(self, arr, schema, key_map, rec_num, shardBuffer=None):
+        """Index a chunk of rows and append them to the shards they belong to.
+
+        Parameters
+        ----------
+        arr : structured `numpy.array`
+            Rows from catalog being ingested.
+        schema : `lsst.afw.table.Schema`
+            Schema of the indexed catalogs.
+        key_map : `dict` mapping `str` to `lsst.afw.table.Key`
+            Map of catalog keys.
+        rec_num : `int`
+            Starting integer to increment for the unique id
+        shardBuffer : `lsst.meas.algorithms.shardBuffer.ShardBuffer`, optional
+            Buffer to add the rows of each shard to; if `None`, each shard
+            is read, extended and written immediately.
+
+        Returns
+        -------
+        rec_num : `int`
+            The last unique id that was assigned.
+        """
+        index_list = self.indexer.indexPoints(arr[self.config.ra_name], arr[self.config.dec_name])
+        pixel_ids = set(index_list)
+        for pixel_id in pixel_ids:
+            els = np.where(index_list == pixel_id)[0]
+            if shardBuffer is None:
+                dataId, catalog = self._getShard(pixel_id, schema, len(els))
+                rec_num = self._fillCatalog(catalog, arr[els], rec_num, key_map)
+                self._putShard(pixel_id, dataId, catalog)
+            else:
+                catalog = afwTable.SimpleCatalog(schema)
+                catalog.resize(len(els))
+                rec_num = self._fillCatalog(catalog, arr[els], rec_num, key_map)
+                shardBuffer.add(pixel_id, catalog)
+        return rec_num
+
+    def _writeBufferedShards(self, shardBuffer, schema):
+        """Write each buffered shard once, appending to the shard if it
+        already exists.
+
+        Parameters
+        ----------
+        shardBuffer : `lsst.meas.algorithms.shardBuffer.ShardBuffer`
+            Buffered rows for each shard; emptied as shards are written.
+        schema : `lsst.afw.table.Schema`
+            Schema to use in catalog creation for new shards.
+        """
+        self.log.info("Writing %d buffered shards", len(shardBuffer))
+        for pixel_id in shardBuffer.shardIds():
+            dataId, catalog = self._getShard(pixel_id, schema)
+            for part in shardBuffer.getParts(pixel_id):
+                catalog.extend(part, deep=True)
+            self._putShard(pixel_id, dataId, catalog)
+            shardBuffer.pop(pixel_id)
+
+    def _createIndexedCatalogParallel(self, files, rec_num=0):
+        """Index a set of files using ``config.n_processes`` worker processes.
+
+        This happens in two stages. First, each worker reads and indexes
+        whole input files, writing the rows for each shard that a file
+        touches to a separate scratch file. Then each shard is assigned to
+        one worker (by hashing the shard ID), which concatenates the pieces
+        of the shard in input file order and writes the shard once.
+
+        Automatically generated ids are numbered within each file during the
+        first stage and offset by the number of rows in all preceding files
+        during the second, so they are identical to the ids assigned by a
+        single process.
+
+        Parameters
+        ----------
+        files : `list`
+            A list of file paths to read.
+        rec_num : `int`, optional
+            The last unique id that was assigned by a previous run.
+
+        Returns
+        -------
+        rec_num : `int`
+            The last unique id that was assigned.
+        """
+        global _parallelIngestState
+        nProcesses = self.config.n_processes
+        schema, key_map = self.makeSchema(next(iter(self._readChunks(files[0]))).dtype)
+        dataId = self.indexer.makeDataId('master_schema', self.config.dataset_config.ref_dataset_name)
+        self.butler.put(self.getCatalog(dataId, schema), 'ref_cat', dataId=dataId)
+
+        if self.config.spill_dir is not None:
+            os.makedirs(self.config.spill_dir, exist_ok=True)
+        scratchDir = tempfile.mkdtemp(prefix="refcatIngest", dir=self.config.spill_dir)
+        _parallelIngestState = (self, schema, key_map, scratchDir)
+        try:
+            with multiprocessing.get_context("fork").Pool(nProcesses) as pool:
+                self.log.info("Indexing %d files with %d processes", len(files), nProcesses)
+                nRowsList = pool.map(_indexFileWorker, list(enumerate(files)), chunksize=1)
+                offsets = rec_num + np.cumsum([0] + nRowsList[:-1])
+                shardIds = sorted(int(name) for name in os.listdir(scratchDir))
+                self.log.info("Writing %d shards with %d processes", len(shardIds), nProcesses)
+                assignments = [[] for _ in range(nProcesses)]
+                for shardId in shardIds:
+                    assignments[hash(shardId) % nProcesses].append(shardId)
+                writtenList = pool.map(_writeShardsWorker,
+                                       [(shardIdList, offsets) for shardIdList in assignments],
+                                       chunksize=1)
+        finally:
+            _parallelIngestState = None
+            shutil.rmtree(scratchDir, ignore_errors=True)
+        for written in writtenList:
+            self._writtenShards.update(written.shardRows)
+            if self._shardRows is not None:
+                self._shardRows.update(written.shardRows)
+            if self._shardSummary is not None:
+                for pixel_id, entry in written.summaries.items():
+                    self._shardSummary.set(pixel_id, entry)
+            if self._idIndex is not None:
+                for pixel_id, ids in written.ids.items():
+                    self._idIndex.set(pixel_id, ids)
+        if not self.config.id_name:
+            rec_num += sum(nRowsList)
+        return rec_num
+
+    def _indexFile(self, fileIndex, filename, schema, key_map, scratchDir):
+        """Read and index one input file, writing the rows of each chunk for
+        each shard it touches to a scratch file.
+
+        Parameters
+        ----------
+        fileIndex : `int`
+            Index of the file in the list of input files.
+        filename : `str`
+            Path of the file to read.
+        schema : `lsst.afw.table.Schema`
+            Schema of the indexed catalogs.
+        key_map : `dict` mapping `str` to `lsst.afw.table.Key`
+            Map of catalog keys.
+        scratchDir : `str`
+            Directory in which to write the pieces of each shard, one
+            subdirectory per shard.
+
+        Returns
+        -------
+        nRows : `int`
+            Number of rows read from the file.
+        """
+        rec_num = 0
+        nRows = 0
+        for chunkIndex, arr in enumerate(self._readChunks(filename)):
+            nRows += len(arr)
             index_list = self.indexer.indexPoints(arr[self.config.ra_name], arr[self.config.dec_name])
-            if first:
-                schema, key_map = self.makeSchema(arr.dtype)
-                # persist empty catalog to hold the master schema
-                dataId = self.indexer.makeDataId('master_schema',
-                                                 self.config.dataset_config.ref_dataset_name)
-                self.butler.put(self.getCatalog(dataId, schema), 'ref_cat',
-                                dataId=dataId)
-                first = False
-            pixel_ids = set(index_list)
-            for pixel_id in pixel_ids:
-                dataId = self.indexer.makeDataId(pixel_id, self.config.dataset_config.ref_dataset_name)
-                catalog = self.getCatalog(dataId, schema)
-                els = np.where(index_list == pixel_id)
-                for row in arr[els]:
-                    record = catalog.addNew()
-                    rec_num = self._fillRecord(record, row, rec_num, key_map)
-                self.butler.put(catalog, 'ref_cat', dataId=dataId)
-        dataId = self.indexer.makeDataId(None, self.config.dataset_config.ref_dataset_name)
-        self.butler.put(self.config.dataset_config, 'ref_cat_config', dataId=dataId)
+            for pixel_id in set(index_list):
+                els = np.where(index_list == pixel_id)[0]
+                catalog = afwTable.SimpleCatalog(schema)
+                catalog.resize(len(els))
+                rec_num = self._fillCatalog(catalog, arr[els], rec_num, key_map)
+                shardDir = os.path.join(scratchDir, str(pixel_id))
+                os.makedirs(shardDir, exist_ok=True)
+                catalog.writeFits(os.path.join(shardDir, "%09d-%09d.fits" % (fileIndex, chunkIndex)))
+        return nRows
+
+    def _writeShards(self, shardIdList, offsets, schema, scratchDir):
+        """Assemble and write shards from the pieces written by `_indexFile`.
+
+        Parameters
+        ----------
+        shardIdList : `list` of `int`
+            IDs of the shards to write.
+        offsets : `numpy.ndarray` of `int`
+            For each input file, the number of rows in all preceding files;
+            added to automatically generated ids.
+        schema : `lsst.afw.table.Schema`
+            Schema to use in catalog creation for new shards.
+        scratchDir : `str`
+            Directory containing the pieces of each shard.
+
+        Returns
+        -------
+        result : `lsst.pipe.base.Struct`
+            A struct containing:
+
+            - ``shardRows`` : the number of rows in each shard that was
+              written (`dict`).
+            - ``summaries`` : the statistics of each shard that was written,
+              as returned by
+              `lsst.meas.algorithms.shardSummary.ShardSummary.summarize`
+              (`dict`).
+            - ``ids`` : the ids of the objects in each shard that was
+              written, if an id index is being kept (`dict` of
+              `numpy.ndarray`).
+        """
+        shardRows = {}
+        summaries = {}
+        ids = {}
+        for pixel_id in shardIdList:
+            dataId, catalog = self._getShard(pixel_id, schema)
+            shardDir = os.path.join(scratchDir, str(pixel_id))
+            for name in sorted(os.listdir(shardDir)):
+                part = afwTable.SimpleCatalog.readFits(os.path.join(shardDir, name))
+                if not self.config.id_name:
+                    part["id"] += offsets[int(name.split("-")[0])]
+                catalog.extend(part, deep=True)
+            self._clearSortFlux(catalog)
+            self.butler.put(catalog, 'ref_cat', dataId=dataId)
+            shardRows[pixel_id] = len(catalog)
+            summaries[pixel_id] = ShardSummary.summarize(catalog)
+            if self._idIndex is not None:
+                ids[pixel_id] = IdIndex.getIds(catalog)
+        return pipeBase.Struct(shardRows=shardRows, summaries=summaries, ids=ids)
 
     @staticmethod
     def computeCoord(row, ra_name, dec_name):
@@ -371,68 +1428,97 @@ class IngestIndexedReferenceTask(pipeBase.CmdLineTask):
         """
         return lsst.geom.SpherePoint(row[ra_name], row[dec_name], lsst.geom.degrees)
 
-    def _setCoordErr(self, record, row, key_map):
-        """Set coordinate error in a record of an indexed catalog.
+    def _setCoord(self, catalog, arr):
+        """Set the ICRS coordinate columns in the new rows of an indexed catalog.
+
+        This matches `computeCoord`, including wrapping RA into [0, 2pi).
+
+        Parameters
+        ----------
+        catalog : `lsst.afw.table.SimpleCatalog`
+            Contiguous catalog of the new rows of the indexed catalog.
+        arr : structured `numpy.array`
+            Rows from catalog being ingested, one per row of ``catalog``.
+
+        Raises
+        ------
+        ValueError
+            Raised if any Dec is outside [-90, 90] degrees.
+        """
+        ra = arr[self.config.ra_name]*_RAD_PER_DEG
+        dec = arr[self.config.dec_name]*_RAD_PER_DEG
+        if np.any(np.abs(dec) > 0.5*math.pi):
+            raise ValueError("Dec values in column {} must be in [-90, 90] degrees".format(
+                self.config.dec_name))
+        ra = np.fmod(ra, 2*math.pi)
+        ra[ra < 0] += 2*math.pi
+        # adding 2 pi to a tiny negative angle can round to 2 pi
+        ra[ra >= 2*math.pi] = 0.0
+        catalog["coord_ra"] = ra
+        catalog["coord_dec"] = dec
+
+    def _setCoordErr(self, catalog, arr, key_map):
+        """Set coordinate error columns in the new rows of an indexed catalog.
 
         The errors are read from the specified columns, and installed
         in the appropriate columns of the output.
 
         Parameters
         ----------
-        record : `lsst.afw.table.SimpleRecord`
-            Row from indexed catalog to modify.
-        row : structured `numpy.array`
-            Row from catalog being ingested.
+        catalog : `lsst.afw.table.SimpleCatalog`
+            Contiguous catalog of the new rows of the indexed catalog.
+        arr : structured `numpy.array`
+            Rows from catalog being ingested, one per row of ``catalog``.
         key_map : `dict` mapping `str` to `lsst.afw.table.Key`
             Map of catalog keys.
         """
         if self.config.ra_err_name:  # IngestIndexedReferenceConfig.validate ensures all or none
-            record.set(key_map["coord_raErr"], row[self.config.ra_err_name]*_RAD_PER_DEG)
-            record.set(key_map["coord_decErr"], row[self.config.dec_err_name]*_RAD_PER_DEG)
+            catalog[key_map["coord_raErr"]] = arr[self.config.ra_err_name]*_RAD_PER_DEG
+            catalog[key_map["coord_decErr"]] = arr[self.config.dec_err_name]*_RAD_PER_DEG
 
-    def _setFlags(self, record, row, key_map):
-        """Set flags in an output record
+    def _setFlags(self, catalog, arr, key_map):
+        """Set flag columns in the new rows of an indexed catalog.
 
         Parameters
         ----------
-        record : `lsst.afw.table.SimpleRecord`
-            Row from indexed catalog to modify.
-        row : structured `numpy.array`
-            Row from catalog being ingested.
+        catalog : `lsst.afw.table.SimpleCatalog`
+            Contiguous catalog of the new rows of the indexed catalog.
+        arr : structured `numpy.array`
+            Rows from catalog being ingested, one per row of ``catalog``.
         key_map : `dict` mapping `str` to `lsst.afw.table.Key`
             Map of catalog keys.
         """
-        names = record.schema.getNames()
         for flag in self._flags:
-            if flag in names:
+            if flag in catalog.schema:
                 attr_name = 'is_{}_name'.format(flag)
-                record.set(key_map[flag], bool(row[getattr(self.config, attr_name)]))
+                catalog[key_map[flag]] = arr[getattr(self.config, attr_name)].astype(bool)
 
-    def _setFlux(self, record, row, key_map):
-        """Set flux fields in a record of an indexed catalog.
+    def _setFlux(self, catalog, arr, key_map):
+        """Set flux columns in the new rows of an indexed catalog.
 
         Parameters
         ----------
-        record : `lsst.afw.table.SimpleRecord`
-            Row from indexed catalog to modify.
-        row : structured `numpy.array`
-            Row from catalog being ingested.
+        catalog : `lsst.afw.table.SimpleCatalog`
+            Contiguous catalog of the new rows of the indexed catalog.
+        arr : structured `numpy.array`
+            Rows from catalog being ingested, one per row of ``catalog``.
         key_map : `dict` mapping `str` to `lsst.afw.table.Key`
             Map of catalog keys.
         """
         for item in self.config.mag_column_list:
-            record.set(key_map[item+'_flux'], (row[item]*u.ABmag).to_value(u.nJy))
+            catalog[key_map[item+'_flux']] = (arr[item]*u.ABmag).to_value(u.nJy)
         if len(self.config.mag_err_column_map) > 0:
             for err_key in self.config.mag_err_column_map.keys():
                 error_col_name = self.config.mag_err_column_map[err_key]
+                # The C++ implementation needs contiguous double arrays, which
+                # columns of a structured array are not.
+                magErr = np.ascontiguousarray(arr[error_col_name], dtype=np.float64)
+                mag = np.ascontiguousarray(arr[err_key], dtype=np.float64)
                 # TODO: multiply by 1e9 here until we have a replacement (see DM-16903)
-                fluxErr = fluxErrFromABMagErr(row[error_col_name], row[err_key])
-                if fluxErr is not None:
-                    fluxErr *= 1e9
-                record.set(key_map[err_key+'_fluxErr'], fluxErr)
+                catalog[key_map[err_key+'_fluxErr']] = fluxErrFromABMagErr(magErr, mag)*1e9
 
-    def _setProperMotion(self, record, row, key_map):
-        """Set proper motion fields in a record of an indexed catalog.
+    def _setProperMotion(self, catalog, arr, key_map):
+        """Set proper motion columns in the new rows of an indexed catalog.
 
         The proper motions are read from the specified columns,
         scaled appropriately, and installed in the appropriate
@@ -440,83 +1526,98 @@ class IngestIndexedReferenceTask(pipeBase.CmdLineTask):
 
         Parameters
         ----------
-        record : `lsst.afw.table.SimpleRecord`
-            Row from indexed catalog to modify.
-        row : structured `numpy.array`
-            Row from catalog being ingested.
+        catalog : `lsst.afw.table.SimpleCatalog`
+            Contiguous catalog of the new rows of the indexed catalog.
+        arr : structured `numpy.array`
+            Rows from catalog being ingested, one per row of ``catalog``.
         key_map : `dict` mapping `str` to `lsst.afw.table.Key`
             Map of catalog keys.
         """
         if self.config.pm_ra_name is None:  # IngestIndexedReferenceConfig.validate ensures all or none
             return
         radPerOriginal = _RAD_PER_MILLIARCSEC*self.config.pm_scale
-        record.set(key_map["pm_ra"], row[self.config.pm_ra_name]*radPerOriginal*lsst.geom.radians)
-        record.set(key_map["pm_dec"], row[self.config.pm_dec_name]*radPerOriginal*lsst.geom.radians)
-        record.set(key_map["epoch"], self._epochToMjdTai(row[self.config.epoch_name]))
+        catalog[key_map["pm_ra"]] = arr[self.config.pm_ra_name]*radPerOriginal
+        catalog[key_map["pm_dec"]] = arr[self.config.pm_dec_name]*radPerOriginal
+        catalog[key_map["epoch"]] = self._epochToMjdTai(arr[self.config.epoch_name])
         if self.config.pm_ra_err_name is not None:  # pm_dec_err_name also, by validation
-            record.set(key_map["pm_raErr"], row[self.config.pm_ra_err_name]*radPerOriginal)
-            record.set(key_map["pm_decErr"], row[self.config.pm_dec_err_name]*radPerOriginal)
+            catalog[key_map["pm_raErr"]] = arr[self.config.pm_ra_err_name]*radPerOriginal
+            catalog[key_map["pm_decErr"]] = arr[self.config.pm_dec_err_name]*radPerOriginal
 
     def _epochToMjdTai(self, nativeEpoch):
         """Convert an epoch in native format to TAI MJD (a float).
+
+        ``nativeEpoch`` may also be an array, in which case an array
+        of TAI MJD is returned.
         """
         return astropy.time.Time(nativeEpoch, format=self.config.epoch_format,
                                  scale=self.config.epoch_scale).tai.mjd
 
-    def _setExtra(self, record, row, key_map):
-        """Set extra data fields in a record of an indexed catalog.
+    def _setExtra(self, catalog, arr, key_map):
+        """Set extra data columns in the new rows of an indexed catalog.
 
         Parameters
         ----------
-        record : `lsst.afw.table.SimpleRecord`
-            Row from indexed catalog to modify.
-        row : structured `numpy.array`
-            Row from catalog being ingested.
+        catalog : `lsst.afw.table.SimpleCatalog`
+            Contiguous catalog of the new rows of the indexed catalog.
+        arr : structured `numpy.array`
+            Rows from catalog being ingested, one per row of ``catalog``.
         key_map : `dict` mapping `str` to `lsst.afw.table.Key`
             Map of catalog keys.
         """
         for extra_col in self.config.extra_col_names:
-            value = row[extra_col]
-            # If data read from a text file contains string like entires,
-            # numpy stores this as its own internal type, a numpy.str_
-            # object. This seems to be a consequence of how numpy stores
-            # string like objects in fixed column arrays. This checks
-            # if any of the values to be added to the catalog are numpy
-            # string types, and if they are, casts them to a python string
-            # which is what the python c++ records expect
-            if isinstance(value, np.str_):
-                value = str(value)
-            record.set(key_map[extra_col], value)
-
-    def _fillRecord(self, record, row, rec_num, key_map):
-        """Fill a record in an indexed catalog to be persisted.
+            if arr.dtype[extra_col].kind != 'U':
+                catalog[key_map[extra_col]] = arr[extra_col]
+                continue
+            # String columns cannot be set through column views, so they
+            # have to be set one record at a time. If data read from a text
+            # file contains string like entries, numpy stores them as its
+            # own internal type, numpy.str_, which must be cast to a python
+            # string, which is what the python c++ records expect.
+            key = key_map[extra_col]
+            for record, value in zip(catalog, arr[extra_col]):
+                record.set(key, str(value))
+
+    def _fillCatalog(self, catalog, arr, rec_num, key_map):
+        """Fill the last rows of an indexed catalog to be persisted.
+
+        All fields are set one column at a time from the structured array,
+        rather than one record at a time.
 
         Parameters
         ----------
-        record : `lsst.afw.table.SimpleRecord`
-            Row from indexed catalog to modify.
-        row : structured `numpy.array`
-            Row from catalog being ingested.
+        catalog : `lsst.afw.table.SimpleCatalog`
+            Contiguous indexed catalog to modify; its last ``len(arr)``
+            records are filled.
+        arr : structured `numpy.array`
+            Rows from catalog being ingested.
         rec_num : `int`
             Starting integer to increment for the unique id
         key_map : `dict` mapping `str` to `lsst.afw.table.Key`
             Map of catalog keys.
+
+        Returns
+        -------
+        rec_num : `int`
+            The last unique id that was assigned.
         """
-        record.setCoord(self.computeCoord(row, self.config.ra_name, self.config.dec_name))
+        if len(arr) == 0:
+            return rec_num
+        newRows = catalog[len(catalog) - len(arr):]
+        self._setCoord(newRows, arr)
         if self.config.id_name:
-            record.setId(row[self.config.id_name])
+            newRows["id"] = arr[self.config.id_name]
         else:
-            rec_num += 1
-            record.setId(rec_num)
-
-        self._setCoordErr(record, row, key_map)
-        self._setFlags(record, row, key_map)
-        self._setFlux(record, row, key_map)
-        self._setProperMotion(record, row, key_map)
-        self._setExtra(record, row, key_map)
+            newRows["id"] = np.arange(rec_num + 1, rec_num + len(arr) + 1)
+            rec_num += len(arr)
+
+        self._setCoordErr(newRows, arr, key_map)
+        self._setFlags(newRows, arr, key_map)
+        self._setFlux(newRows, arr, key_map)
+        self._setProperMotion(newRows, arr, key_map)
+        self._setExtra(newRows, arr, key_map)
         return rec_num
 
-    def getCatalog(self, dataId, schema):
+    def getCatalog(self, dataId, schema, nNewElements=0, nRows=None):
         """Get a catalog from the butler or create it if it doesn't exist.
 
         Parameters
@@ -525,18 +1626,122 @@ class IngestIndexedReferenceTask(pipeBase.CmdLineTask):
             Identifier for catalog to retrieve
         schema : `lsst.afw.table.Schema`
             Schema to use in catalog creation if the butler can't get it
+        nNewElements : `int`, optional
+            Number of new (default-initialized) records to append to the
+            catalog, to be filled in by the caller.
+        nRows : `int`, optional
+            Number of existing records to keep; any later records were
+            left by an interrupted ingest and are dropped. If `None`, all
+            existing records are kept.
 
         Returns
         -------
         catalog : `lsst.afw.table.SimpleCatalog`
-            The catalog specified by `dataId`
+            The catalog specified by `dataId`, with ``nNewElements`` records
+            appended. The catalog is contiguous, so that its columns may be
+            assigned to.
         """
         if self.butler.datasetExists('ref_cat', dataId=dataId):
-            return self.butler.get('ref_cat', dataId=dataId)
+            catalog = self.butler.get('ref_cat', dataId=dataId)
+            if nRows is not None and len(catalog) > nRows:
+                self.log.warn("Dropping %d rows left in %s by an interrupted ingest",
+                              len(catalog) - nRows, dataId)
+                catalog = catalog[:nRows].copy(deep=True)
+            if nNewElements > 0:
+                catalog.resize(len(catalog) + nNewElements)
+                # ensure contiguity, so that column assignment works
+                catalog = catalog.copy(deep=True)
+            return catalog
         catalog = afwTable.SimpleCatalog(schema)
+        catalog.resize(nNewElements)
         addRefCatMetadata(catalog)
+        narrowedNames = self._getNarrowedFieldNames(schema)
+        if narrowedNames:
+            # tell loaders which columns to widen
+            md = catalog.getMetadata()
+            md.set("REFCAT_WIDEN", ",".join(narrowedNames))
+            catalog.setMetadata(md)
         return catalog
 
+    def _getColumnStorage(self, name):
+        """Return the storage type of a column, according to
+        ``config.column_storage``.
+
+        Parameters
+        ----------
+        name : `str`
+            Name of the column.
+
+        Returns
+        -------
+        storage : `str`
+            ``"float64"`` or ``"float32"``.
+        """
+        if name in self.config.column_storage:
+            return self.config.column_storage[name]
+        if name in self.config.extra_col_names:
+            columnClass = "extra"
+        elif name.endswith("_fluxErr"):
+            columnClass = "fluxErr"
+        elif name.endswith("_flux"):
+            columnClass = "flux"
+        else:
+            return "float64"
+        return self.config.column_storage.get(columnClass, "float64")
+
+    def _getNarrowedFieldNames(self, schema):
+        """Return the names of the fields of a schema that are stored as
+        float32 rather than float64, according to ``config.column_storage``.
+
+        Parameters
+        ----------
+        schema : `lsst.afw.table.Schema`
+            Schema of the persisted catalogs.
+
+        Returns
+        -------
+        names : `list` of `str`
+            Names of the narrowed fields, in schema order.
+        """
+        return [item.field.getName() for item in schema if item.field.getTypeString() == "F"
+                and self._getColumnStorage(item.field.getName()) == "float32"]
+
+    def _narrowSchema(self, schema):
+        """Copy a schema, changing the type of the float64 fields to be
+        stored as float32 according to ``config.column_storage``.
+
+        Parameters
+        ----------
+        schema : `lsst.afw.table.Schema`
+            Schema made by `LoadReferenceObjectsTask.makeMinimalSchema`.
+
+        Returns
+        -------
+        schema : `lsst.afw.table.Schema`
+            The schema with the narrowed fields.
+
+        Raises
+        ------
+        ValueError
+            Raised if a column named in ``config.column_storage`` is to be
+            stored as float32 but is not a float64 field.
+        """
+        narrowSchema = afwTable.SimpleTable.makeMinimalSchema()
+        minimalNames = narrowSchema.getNames()
+        for item in schema:
+            field = item.field
+            name = field.getName()
+            if name in minimalNames:
+                continue
+            if self._getColumnStorage(name) == "float32":
+                if field.getTypeString() != "D":
+                    raise ValueError("Column %s of type %s cannot be stored as float32" %
+                                     (name, field.getTypeString()))
+                narrowSchema.addField(name, type=np.float32, doc=field.getDoc(), units=field.getUnits())
+            else:
+                narrowSchema.addField(field)
+        return narrowSchema
+
     def makeSchema(self, dtype):
         """Make the schema to use in constructing the persisted catalogs.
 
@@ -568,6 +1773,8 @@ class IngestIndexedReferenceTask(pipeBase.CmdLineTask):
             addParallax=bool(self.config.parallax_name),
             addParallaxErr=bool(self.config.parallax_err_name),
         )
+        if self.config.column_storage:
+            schema = self._narrowSchema(schema)
         keysToSkip = set(("id", "centroid_x", "centroid_y", "hasCentroid"))
         key_map = {fieldName: schema[fieldName].asKey() for fieldName in schema.getOrderedNames()
                    if fieldName not in keysToSkip}
@@ -579,8 +1786,29 @@ class IngestIndexedReferenceTask(pipeBase.CmdLineTask):
                 return schema.addField(name, type=str, size=at_size)
             else:
                 at_type = dtype[name].type
+                if dtype[name].kind == 'f' and self._getColumnStorage(name) == "float32":
+                    at_type = np.float32
                 return schema.addField(name, at_type)
 
         for col in self.config.extra_col_names:
             key_map[col] = addField(col)
+        unknown = set(self.config.column_storage) - set(schema.getNames()) - {"flux", "fluxErr", "extra"}
+        if unknown:
+            raise ValueError("Unknown columns in column_storage: %s" % (", ".join(sorted(unknown)),))
         return schema, key_map
+
+
+def _indexFileWorker(args):
+    """Call `IngestIndexedReferenceTask._indexFile` in a worker process.
+    """
+    task, schema, key_map, scratchDir = _parallelIngestState
+    fileIndex, filename = args
+    return task._indexFile(fileIndex, filename, schema, key_map, scratchDir)
+
+
+def _writeShardsWorker(args):
+    """Call `IngestIndexedReferenceTask._writeShards` in a worker process.
+    """
+    task, schema, key_map, scratchDir = _parallelIngestState
+    shardIdList, offsets = args
+    return task._writeShards(shardIdList, offsets, schema, scratchDir)
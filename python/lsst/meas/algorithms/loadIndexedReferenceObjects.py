@@ -23,13 +23,28 @@
 
 __all__ = ["LoadIndexedReferenceObjectsConfig", "LoadIndexedReferenceObjectsTask"]
 
+import functools
+import os
+
+import numpy as np
+
 from .loadReferenceObjects import hasNanojanskyFluxUnits, convertToNanojansky, getFormatVersionFromRefCat
+from .loadReferenceObjects import _copyCatalogs, _fetchConcurrently, _getRequiredFieldNames
+from .loadReferenceObjects import _makeProjectionMapper, _unitVectors
+from .loadReferenceObjects import _applyFluxLimit, _checkShardSummary, _getFluxLimit
+from .loadReferenceObjects import _getNthBrightest, _getSortedPrefix, _getSortFluxName
+from .loadReferenceObjects import _limitPieces, _selectBrightest
+from .loadReferenceObjects import _PrefetchFuture, _submitPrefetch, _widenCatalog
 from lsst.meas.algorithms import getRefFluxField, LoadReferenceObjectsTask, LoadReferenceObjectsConfig
 import lsst.afw.table as afwTable
-import lsst.geom
 import lsst.pex.config as pexConfig
 import lsst.pipe.base as pipeBase
+from lsst import sphgeom
 from .indexerRegistry import IndexerRegistry
+from .shardCache import ShardCache, SharedShardCache
+from .shardSummary import ShardSummary
+from .idIndex import PartitionedIdIndex, getPartitionName
+from .columnarShard import getColumnarPath, readColumnarShard
 
 
 class LoadIndexedReferenceObjectsConfig(LoadReferenceObjectsConfig):
@@ -38,6 +53,34 @@ class LoadIndexedReferenceObjectsConfig(LoadReferenceObjectsConfig):
         default='cal_ref_cat',
         doc='Name of the ingested reference dataset'
     )
+    shard_cache_size = pexConfig.RangeField(
+        dtype=float,
+        default=500.0,
+        min=0.0,
+        doc="Approximate amount of memory (MB) to use for caching shards read by earlier loads, so that "
+            "overlapping loads (e.g. for neighboring CCDs) do not read the same shards again. "
+            "The least recently used shards are evicted first; 0 disables the cache."
+    )
+    shared_cache_dir = pexConfig.Field(
+        dtype=str,
+        optional=True,
+        doc="Directory in which to keep copies of the shard files read, shared by all the processes on a "
+            "node, so that each shard is read from the data repository once per node; it should be "
+            "node-local and memory-backed, e.g. under /dev/shm. If None, shards are read directly."
+    )
+    shared_cache_size = pexConfig.RangeField(
+        dtype=float,
+        default=2000.0,
+        min=0.0,
+        doc="Approximate total size (MB) of the shard files kept in shared_cache_dir; the least "
+            "recently used files are removed first."
+    )
+    use_shard_summary = pexConfig.Field(
+        dtype=bool,
+        default=True,
+        doc="Use the shard summary written by the ingest, if there is one, to skip shards that hold "
+            "no objects to load and to avoid trimming shards that lie entirely within the search region?"
+    )
 
 
 class LoadIndexedReferenceObjectsTask(LoadReferenceObjectsTask):
@@ -60,65 +103,292 @@ class LoadIndexedReferenceObjectsTask(LoadReferenceObjectsTask):
         # change the path where the shards are found.
         self.ref_dataset_name = self.config.ref_dataset_name
         self.butler = butler
+        self.shardCache = ShardCache(int(self.config.shard_cache_size*2**20))
+        self.sharedCache = None
+        if self.config.shared_cache_dir is not None:
+            self.sharedCache = SharedShardCache(self.config.shared_cache_dir,
+                                                int(self.config.shared_cache_size*2**20))
+        # shards read by a prefetch, by shard ID, while the load is being
+        # completed; see prefetchPixelBox
+        self._prefetched = {}
+        # master schema and whether it is version 0, read on first use; see
+        # _getMasterSchema
+        self._masterSchema = None
+        # schema of the shards as stored, before widening any narrowed
+        # fields; set when the master schema is read
+        self._storedSchema = None
+        # schema mapper and flux field of the output catalog, by filter name
+        # and columns; see _getOutputTemplate
+        self._outputTemplates = {}
+        # shard summary, read on first use; see getShardSummary
+        self._shardSummary = None
+        self._shardSummaryRead = False
+        # id index, read on first use; see getIdIndex
+        self._idIndex = None
+        self._idIndexRead = False
 
     @pipeBase.timeMethod
-    def loadSkyCircle(self, ctrCoord, radius, filterName=None, epoch=None):
+    def loadSkyCircle(self, ctrCoord, radius, filterName=None, epoch=None, columns=None):
+        """Load reference objects that overlap a circular sky region.
+
+        Parameters
+        ----------
+        ctrCoord : `lsst.geom.SpherePoint`
+            ICRS center of search region.
+        radius : `lsst.geom.Angle`
+            Radius of search region.
+        filterName : `str` (optional)
+            Name of filter, or `None` or `""` for the default filter.
+        epoch : `astropy.time.Time` (optional)
+            Epoch to which to correct proper motion and parallax,
+            or None to not apply such corrections.
+        columns : `list` of `str` (optional)
+            Names of fields to return in addition to those required for
+            astrometry and for the flux fields of ``filterName``,
+            ``config.defaultFilter`` and ``config.filterMap``. If `None`,
+            all fields are returned, unless ``config.onlyRequiredColumns``
+            is set.
+
+        Returns
+        -------
+        results : `lsst.pipe.base.Struct`
+            A Struct containing the following fields:
+            refCat : `lsst.afw.catalog.SimpleCatalog`
+                A catalog of reference objects; it is contiguous.
+            fluxField : `str`
+                Name of flux field for specified `filterName`.
+        """
         shardIdList, isOnBoundaryList = self.indexer.getShardIds(ctrCoord, radius)
-        shards = self.getShards(shardIdList)
-        refCat = self.butler.get('ref_cat',
-                                 dataId=self.indexer.makeDataId('master_schema', self.ref_dataset_name),
-                                 immediate=True)
+        masterSchema, isVersion0 = self._getMasterSchema()
+
+        fluxLimit = _getFluxLimit(self.config, filterName)
+        plan = [pipeBase.Struct(shardId=shardId, isOnBoundary=isOnBoundary, bright=fluxLimit is None,
+                                fluxMax=np.inf)
+                for shardId, isOnBoundary in zip(shardIdList, isOnBoundaryList)]
+        shardSummary = self.getShardSummary()
+        if shardSummary is not None:
+            # skip the shards that hold no objects to load, and do not trim
+            # those that lie entirely within the circle
+            circle = sphgeom.Circle(ctrCoord.getVector(), sphgeom.Angle(radius.asRadians()))
+            kept = []
+            for item in plan:
+                summary = shardSummary.get(item.shardId)
+                check = _checkShardSummary(summary, circle, fluxLimit)
+                if check.skip:
+                    continue
+                item.isOnBoundary = item.isOnBoundary and not check.contained
+                item.bright = check.bright
+                if summary is not None and fluxLimit is not None:
+                    item.fluxMax = summary.fluxMax.get(fluxLimit.fluxName, np.inf)
+                kept.append(item)
+            self.log.debug("Skipping %d shards that hold no objects to load, according to the shard summary",
+                           len(plan) - len(kept))
+            plan = kept
+
+        # When loading only the brightest objects, read the shards that may
+        # hold the brightest objects first, a few at a time, and stop once
+        # no other shard can hold any of the objects to load.
+        stopEarly = (fluxLimit is not None and fluxLimit.maxCount is not None and shardSummary is not None
+                     and not isVersion0)
+        order = list(range(len(plan)))
+        batchSize = len(plan)
+        if stopEarly:
+            order.sort(key=lambda i: -plan[i].fluxMax)
+            batchSize = self.config.nFetchThreads
+        limitPieces = fluxLimit is not None and not isVersion0
+
+        # trim the shards to the circle and apply the flux limit; these
+        # catalogs share records with the shards
+        pieces = {}
+        fluxes = {}
+        nQueued = 0
+        while nQueued < len(order):
+            batch = order[nQueued:nQueued + batchSize]
+            nQueued += len(batch)
+            for i, shard in zip(batch, self.getShards([plan[i].shardId for i in batch])):
+                if shard is None:
+                    continue
+                item = plan[i]
+                if limitPieces and not item.bright and _getSortFluxName(shard) == fluxLimit.fluxName:
+                    # only the leading records of a sorted shard can pass the flux limit
+                    shard = _getSortedPrefix(shard, fluxLimit)
+                piece = self._trimToCircle(shard, ctrCoord, radius) if item.isOnBoundary else shard
+                if limitPieces and (fluxLimit.maxCount is not None or not item.bright):
+                    piece, fluxes[i] = _applyFluxLimit(piece, fluxLimit)
+                pieces[i] = piece
+            if stopEarly and nQueued < len(order):
+                nthBrightest = _getNthBrightest(list(fluxes.values()), fluxLimit.maxCount)
+                if plan[order[nQueued]].fluxMax < nthBrightest:
+                    self.log.debug("Skipping %d shards that cannot hold any of the %d brightest objects",
+                                   len(order) - nQueued, fluxLimit.maxCount)
+                    break
+        # restore the order of the shards
+        indices = sorted(pieces)
+        pieces = [pieces[i] for i in indices]
+
+        schema = masterSchema.schema
+        if isVersion0:
+            pieces = _limitPieces([self._convertVersion0(masterSchema, pieces)], [fluxLimit is None],
+                                  fluxLimit)
+            schema = pieces[0].schema
+        elif limitPieces and fluxLimit.maxCount is not None:
+            pieces = _selectBrightest(pieces, [fluxes[i] for i in indices], fluxLimit.maxCount)
+        return self._expandCatalogs(schema, pieces, filterName, epoch, columns)
 
-        # load the catalog, one shard at a time
-        for shard, isOnBoundary in zip(shards, isOnBoundaryList):
+    @pipeBase.timeMethod
+    def loadIds(self, ids, filterName=None, epoch=None, columns=None):
+        """Load the reference objects with given IDs.
+
+        Only the shards that hold the objects are read, as listed by the id
+        index written by the ingest; see `getIdIndex`. The flux limits in
+        the config (``magLimit`` and ``maxRefObjects``) are not applied.
+
+        Parameters
+        ----------
+        ids : `numpy.ndarray` of `int`
+            IDs of the reference objects to load.
+        filterName : `str` (optional)
+            Name of filter, or `None` or `""` for the default filter.
+        epoch : `astropy.time.Time` (optional)
+            Epoch to which to correct proper motion and parallax,
+            or None to not apply such corrections.
+        columns : `list` of `str` (optional)
+            Names of fields to return in addition to those required for
+            astrometry and for the flux fields; see `loadSkyCircle`.
+
+        Returns
+        -------
+        results : `lsst.pipe.base.Struct` or `None`
+            `None` if the reference catalog has no id index, else a Struct
+            containing the following fields:
+            refCat : `lsst.afw.catalog.SimpleCatalog`
+                A catalog of the reference objects that were found, in
+                shard order; it is contiguous. IDs that are not in the
+                reference catalog are ignored.
+            fluxField : `str`
+                Name of flux field for specified `filterName`.
+        """
+        idIndex = self.getIdIndex()
+        if idIndex is None:
+            return None
+        masterSchema, isVersion0 = self._getMasterSchema()
+        idsByShard = idIndex.lookup(ids)
+        shardIdList = sorted(idsByShard)
+        pieces = []
+        for shardId, shard in zip(shardIdList, self.getShards(shardIdList)):
             if shard is None:
                 continue
-            if isOnBoundary:
-                refCat.extend(self._trimToCircle(shard, ctrCoord, radius))
-            else:
-                refCat.extend(shard)
+            if not shard.isContiguous():
+                shard = shard.copy(deep=True)
+            pieces.append(shard[np.isin(shard["id"], idsByShard[shardId])])
+        self.log.debug("Read %d shards to load %d reference objects by id", len(pieces), len(ids))
+        schema = masterSchema.schema
+        if isVersion0:
+            pieces = [self._convertVersion0(masterSchema, pieces)]
+            schema = pieces[0].schema
+        return self._expandCatalogs(schema, pieces, filterName, epoch, columns)
 
-        # apply proper motion corrections
-        if epoch is not None and "pm_ra" in refCat.schema:
-            # check for a catalog in a non-standard format
-            if isinstance(refCat.schema["pm_ra"].asKey(), lsst.afw.table.KeyAngle):
-                self.applyProperMotions(refCat, epoch)
-            else:
-                self.log.warn("Catalog pm_ra field is not an Angle; not applying proper motion")
+    def _getMasterSchema(self):
+        """Get the master schema catalog and check its format version.
 
-        # update version=0 style refcats to have nJy fluxes
-        if self.dataset_config.format_version == 0 or not hasNanojanskyFluxUnits(refCat.schema):
-            self.log.warn("Found version 0 reference catalog with old style units in schema.")
-            self.log.warn("run `meas_algorithms/bin/convert_refcat_to_nJy.py` to convert fluxes to nJy.")
-            self.log.warn("See RFC-575 for more details.")
-            refCat = convertToNanojansky(refCat, self.log)
-        else:
+        The master schema is read and checked once, and held by the loader
+        for its lifetime, independently of the shard cache.
+
+        Returns
+        -------
+        masterSchema : `lsst.afw.table.SimpleCatalog`
+            The (empty) master schema catalog; it may be shared with the
+            cache, so it must not be modified.
+        isVersion0 : `bool`
+            Whether the reference catalog has version 0 style fluxes, which
+            must be converted to nJy by `_convertVersion0`.
+
+        Raises
+        ------
+        RuntimeError
+            Raised if there is no master schema, or if its format version
+            does not match the dataset config.
+        """
+        if self._masterSchema is not None:
+            return self._masterSchema
+        masterSchema = self._getShard('master_schema')
+        if masterSchema is None:
+            raise RuntimeError("No master_schema found for reference catalog %s" % (self.ref_dataset_name,))
+        isVersion0 = (self.dataset_config.format_version == 0
+                      or not hasNanojanskyFluxUnits(masterSchema.schema))
+        if not isVersion0:
             # For version >= 1, the version should be in the catalog header,
             # too, and should be consistent with the version in the config.
-            catVersion = getFormatVersionFromRefCat(refCat)
+            catVersion = getFormatVersionFromRefCat(masterSchema)
             if catVersion != self.dataset_config.format_version:
                 raise RuntimeError(f"Format version in reference catalog ({catVersion}) does not match"
                                    f" format_version field in config ({self.dataset_config.format_version})")
+        self._masterSchema = (masterSchema, isVersion0)
+        return self._masterSchema
 
-        self._addFluxAliases(refCat.schema)
-        fluxField = getRefFluxField(schema=refCat.schema, filterName=filterName)
+    def _convertVersion0(self, masterSchema, pieces):
+        """Combine pieces of a version 0 style reference catalog and convert
+        their fluxes to nJy.
 
-        # add and initialize centroid and hasCentroid fields (these are
-        # added after loading to avoid wasting space in the saved catalogs)
-        # the new fields are automatically initialized to (nan, nan) and
-        # False so no need to set them explicitly
-        mapper = afwTable.SchemaMapper(refCat.schema, True)
-        mapper.addMinimalSchema(refCat.schema, True)
-        mapper.editOutputSchema().addField("centroid_x", type=float)
-        mapper.editOutputSchema().addField("centroid_y", type=float)
-        mapper.editOutputSchema().addField("hasCentroid", type="Flag")
-        expandedCat = afwTable.SimpleCatalog(mapper.getOutputSchema())
-        expandedCat.extend(refCat, mapper=mapper)
-        del refCat  # avoid accidentally returning the unexpanded ref cat
-
-        # make sure catalog is contiguous
-        if not expandedCat.isContiguous():
-            expandedCat = expandedCat.copy(True)
+        Parameters
+        ----------
+        masterSchema : `lsst.afw.table.SimpleCatalog`
+            The master schema catalog; it is not modified.
+        pieces : `list` of `lsst.afw.table.SimpleCatalog`
+            Pieces of shards to combine.
+
+        Returns
+        -------
+        refCat : `lsst.afw.table.SimpleCatalog`
+            The combined catalog, with fluxes in nJy.
+        """
+        self.log.warn("Found version 0 reference catalog with old style units in schema.")
+        self.log.warn("run `meas_algorithms/bin/convert_refcat_to_nJy.py` to convert fluxes to nJy.")
+        self.log.warn("See RFC-575 for more details.")
+        # the master schema catalog may be cached, so copy it before extending it
+        refCat = masterSchema.copy(deep=True)
+        for piece in pieces:
+            refCat.extend(piece)
+        return convertToNanojansky(refCat, self.log)
+
+    def _expandCatalogs(self, schema, pieces, filterName=None, epoch=None, columns=None):
+        """Copy pieces of shards into a single new catalog ready to be
+        returned by a load.
+
+        Parameters
+        ----------
+        schema : `lsst.afw.table.Schema`
+            Schema of the pieces.
+        pieces : `list` of `lsst.afw.table.SimpleCatalog`
+            Pieces of shards, with fluxes in nJy; these may share records
+            with cached shards, so they are not modified.
+        filterName, epoch, columns
+            See `loadSkyCircle`.
+
+        Returns
+        -------
+        results : `lsst.pipe.base.Struct`
+            A struct containing ``refCat`` and ``fluxField``; see
+            `loadSkyCircle`.
+        """
+        _, isVersion0 = self._getMasterSchema()
+        if isVersion0:
+            # the schema of a converted catalog is made anew for each load
+            template = self._makeOutputTemplate(schema, filterName, columns)
+        else:
+            template = self._getOutputTemplate(filterName, columns)
+        expandedCat = _copyCatalogs(pieces, template.mapper)
+        fluxField = template.fluxField
+
+        # apply proper motion corrections; this is done after copying the
+        # records to the expanded catalog, because the pieces share
+        # records with cached shards
+        if epoch is not None and "pm_ra" in expandedCat.schema:
+            # check for a catalog in a non-standard format
+            if isinstance(expandedCat.schema["pm_ra"].asKey(), afwTable.KeyAngle):
+                self.applyProperMotions(expandedCat, epoch)
+            else:
+                self.log.warn("Catalog pm_ra field is not an Angle; not applying proper motion")
 
         # return reference catalog
         return pipeBase.Struct(
@@ -126,9 +396,187 @@ class LoadIndexedReferenceObjectsTask(LoadReferenceObjectsTask):
             fluxField=fluxField,
         )
 
+    def _getOutputTemplate(self, filterName=None, columns=None):
+        """Get the template of the catalog returned by a load, made once
+        per filter name and set of columns.
+
+        Parameters
+        ----------
+        filterName, columns
+            See `loadSkyCircle`.
+
+        Returns
+        -------
+        template : `lsst.pipe.base.Struct`
+            The template, as returned by `_makeOutputTemplate` for the master
+            schema.
+        """
+        key = (filterName or None, None if columns is None else tuple(columns))
+        template = self._outputTemplates.get(key)
+        if template is None:
+            masterSchema, _ = self._getMasterSchema()
+            template = self._makeOutputTemplate(masterSchema.schema, filterName, columns)
+            self._outputTemplates[key] = template
+        return template
+
+    def _makeOutputTemplate(self, schema, filterName=None, columns=None):
+        """Make the template of the catalog returned by a load.
+
+        Parameters
+        ----------
+        schema : `lsst.afw.table.Schema`
+            Schema of the shards.
+        filterName, columns
+            See `loadSkyCircle`.
+
+        Returns
+        -------
+        template : `lsst.pipe.base.Struct`
+            A struct containing:
+
+            - ``mapper`` : schema mapper that copies the required fields of
+              the shards, whose output schema has centroid fields and flux
+              aliases (`lsst.afw.table.SchemaMapper`).
+            - ``fluxField`` : name of the flux field for ``filterName``
+              (`str`).
+        """
+        # copy the required fields of the pieces into a single new
+        # catalog, adding centroid and hasCentroid fields (these are added
+        # after loading to avoid wasting space in the saved catalogs);
+        # the new fields are automatically initialized to (nan, nan) and
+        # False so no need to set them explicitly
+        fieldNames = _getRequiredFieldNames(schema, self.config, filterName, columns)
+        mapper = _makeProjectionMapper(schema, fieldNames)
+        # the master schema is shared by all loads, so do not add aliases to
+        # it; each new catalog gets its own copy of the output aliases
+        outputSchema = mapper.editOutputSchema()
+        outputSchema.disconnectAliases()
+        outputSchema.addField("centroid_x", type=float)
+        outputSchema.addField("centroid_y", type=float)
+        outputSchema.addField("hasCentroid", type="Flag")
+        self._addFluxAliases(outputSchema)
+        fluxField = getRefFluxField(schema=outputSchema, filterName=filterName)
+        return pipeBase.Struct(mapper=mapper, fluxField=fluxField)
+
+    def getIdIndex(self):
+        """Get the id index written by the ingest.
+
+        Only the directory of the partitions of the index is read here;
+        each partition is read when it is first needed to look up an ID,
+        and held in a cache with the same budget as the shard cache.
+
+        Returns
+        -------
+        idIndex : `lsst.meas.algorithms.idIndex.PartitionedIdIndex` or `None`
+            The index of the shard holding each object, or `None` if the
+            reference catalog has none.
+        """
+        if not self._idIndexRead:
+            directory = self._readShard('id_index')
+            if directory is not None:
+                cache = ShardCache(int(self.config.shard_cache_size*2**20))
+                self._idIndex = PartitionedIdIndex(directory, self._readIdIndexPartition, cache)
+            self._idIndexRead = True
+        return self._idIndex
+
+    def _readIdIndexPartition(self, number):
+        """Read one partition of the id index.
+
+        Parameters
+        ----------
+        number : `int`
+            Number of the partition.
+
+        Returns
+        -------
+        partition : `lsst.afw.table.BaseCatalog`
+            The partition.
+        """
+        dataId = self.indexer.makeDataId(getPartitionName(number), self.ref_dataset_name)
+        path = self.butler.get('ref_cat_filename', dataId=dataId)[0]
+        self.log.debug("Reading id index partition %d", number)
+        if self.sharedCache is not None:
+            return self.sharedCache.read(path, afwTable.BaseCatalog.readFits)
+        return afwTable.BaseCatalog.readFits(path)
+
+    def prefetchPixelBox(self, bbox, wcs, filterName=None, epoch=None, columns=None):
+        """Start reading the shards needed to load the reference objects
+        that overlap a rectangular pixel region, in the background.
+
+        The shards are read by a background thread while the caller does
+        other work; the load is completed, in the calling thread, when the
+        result of the returned future is requested. The master schema and
+        the shard summary are read in the calling thread before the
+        background reads start.
+
+        Parameters
+        ----------
+        bbox, wcs, filterName, epoch, columns
+            See `loadPixelBox`.
+
+        Returns
+        -------
+        future : `lsst.meas.algorithms.loadReferenceObjects._PrefetchFuture`
+            Future whose ``result()`` is the struct that `loadPixelBox`
+            would return.
+        """
+        circle = self._calculateCircle(bbox, wcs)
+        shardIdList, _ = self.indexer.getShardIds(circle.coord, circle.radius)
+        shardSummary = self.getShardSummary()
+        if shardSummary is not None:
+            region = sphgeom.Circle(circle.coord.getVector(), sphgeom.Angle(circle.radius.asRadians()))
+            fluxLimit = _getFluxLimit(self.config, filterName)
+            shardIdList = [shardId for shardId in shardIdList
+                           if not _checkShardSummary(shardSummary.get(shardId), region, fluxLimit).skip]
+        # the master schema is read in this thread, before the background
+        # reads start, so that they never set it; columnar shards are read
+        # with it
+        self._getMasterSchema()
+        toRead = [shardId for shardId in dict.fromkeys(shardIdList)
+                  if (self.ref_dataset_name, shardId) not in self.shardCache]
+
+        def read():
+            return dict(zip(toRead, _fetchConcurrently(self._readShard, toRead, self.config.nFetchThreads,
+                                                       self.log).results))
+
+        def finish(readShards):
+            self._prefetched = readShards
+            try:
+                return self.loadPixelBox(bbox, wcs, filterName=filterName, epoch=epoch, columns=columns)
+            finally:
+                self._prefetched = {}
+
+        self.log.debug("Prefetching %d shards", len(toRead))
+        return _PrefetchFuture(_submitPrefetch(read), finish)
+
+    def getShardSummary(self):
+        """Get the shard summary written by the ingest.
+
+        Returns
+        -------
+        shardSummary : `lsst.meas.algorithms.shardSummary.ShardSummary` or `None`
+            The shard summary, or `None` if the reference catalog has none or
+            ``config.use_shard_summary`` is False.
+        """
+        if not self.config.use_shard_summary:
+            return None
+        if not self._shardSummaryRead:
+            catalog = self._readShard('shard_summary')
+            self._shardSummary = None if catalog is None else ShardSummary.fromCatalog(catalog)
+            self._shardSummaryRead = True
+        return self._shardSummary
+
     def getShards(self, shardIdList):
         """Get shards by ID.
 
+        Shards are read through a least-recently-used cache, whose total
+        hit, miss and eviction counts are recorded in the task metadata as
+        ``shardCacheHits``, ``shardCacheMisses`` and ``shardCacheEvictions``.
+        Shards that are not in the cache are read using up to
+        ``config.nFetchThreads`` threads; the largest number of concurrent
+        reads and the time spent waiting for them are recorded in the task
+        metadata as ``shardFetchMaxInFlight`` and ``shardFetchWaitTime``.
+
         Parameters
         ----------
         shardIdList : `list` of `int`
@@ -137,16 +585,91 @@ class LoadIndexedReferenceObjectsTask(LoadReferenceObjectsTask):
         Returns
         -------
         catalogs : `list` of `lsst.afw.table.SimpleCatalog`
-            A list of reference catalogs, one for each entry in shardIdList.
+            A list of reference catalogs, one for each entry in shardIdList;
+            `None` for shards that do not exist. The catalogs may be shared
+            with the cache, so they must not be modified.
         """
-        shards = []
-        for shardId in shardIdList:
-            if self.butler.datasetExists('ref_cat',
-                                         dataId=self.indexer.makeDataId(shardId, self.ref_dataset_name)):
-                shards.append(self.butler.get('ref_cat',
-                                              dataId=self.indexer.makeDataId(shardId, self.ref_dataset_name),
-                                              immediate=True))
-        return shards
+        toRead = [shardId for shardId in dict.fromkeys(shardIdList)
+                  if (self.ref_dataset_name, shardId) not in self.shardCache
+                  and shardId not in self._prefetched]
+        fetched = _fetchConcurrently(self._readShard, toRead, self.config.nFetchThreads, self.log)
+        self.metadata.set("shardFetchMaxInFlight", fetched.maxInFlight)
+        self.metadata.set("shardFetchWaitTime", fetched.waitTime)
+        readShards = dict(zip(toRead, fetched.results))
+        return [self._getShard(shardId, readShards) for shardId in shardIdList]
+
+    def _readShard(self, shardId):
+        """Read one shard by ID, bypassing the shard cache.
+
+        If the reference catalog has columnar shards (its
+        ``shard_format`` is ``columnar``), the columnar copy of a shard is
+        read instead of its FITS file, when there is one. Fields that the
+        ingest stored as float32 are widened to float64.
+
+        Parameters
+        ----------
+        shardId : `int` or `str`
+            Shard ID, or ``"master_schema"``.
+
+        Returns
+        -------
+        catalog : `lsst.afw.table.SimpleCatalog` or `None`
+            The shard, or `None` if it does not exist.
+        """
+        dataId = self.indexer.makeDataId(shardId, self.ref_dataset_name)
+        if not self.butler.datasetExists('ref_cat', dataId=dataId):
+            return None
+        catalog = None
+        if self.dataset_config.shard_format == 'columnar' and not isinstance(shardId, str):
+            path = getColumnarPath(self.butler.get('ref_cat_filename', dataId=dataId)[0])
+            if os.path.exists(path):
+                # the columnar copies are read with the stored schema
+                self._getMasterSchema()
+                reader = functools.partial(readColumnarShard, schema=self._storedSchema)
+                catalog = reader(path) if self.sharedCache is None else self.sharedCache.read(path, reader)
+        if catalog is None:
+            if self.sharedCache is not None:
+                path = self.butler.get('ref_cat_filename', dataId=dataId)[0]
+                catalog = self.sharedCache.read(path, afwTable.SimpleCatalog.readFits)
+            else:
+                catalog = self.butler.get('ref_cat', dataId=dataId, immediate=True)
+        if shardId == 'master_schema':
+            self._storedSchema = catalog.schema
+        return _widenCatalog(catalog)
+
+    def _getShard(self, shardId, readShards=None):
+        """Get one shard by ID, through the shard cache.
+
+        Parameters
+        ----------
+        shardId : `int` or `str`
+            Shard ID, or ``"master_schema"``.
+        readShards : `dict`, optional
+            Shards that have already been read, by shard ID; used instead of
+            reading the shard again if it is not in the cache.
+
+        Returns
+        -------
+        catalog : `lsst.afw.table.SimpleCatalog` or `None`
+            The shard, or `None` if it does not exist. The catalog may be
+            shared with the cache, so it must not be modified.
+        """
+        def load():
+            if readShards is not None and shardId in readShards:
+                return readShards[shardId]
+            if shardId in self._prefetched:
+                return self._prefetched[shardId]
+            return self._readShard(shardId)
+
+        shard = self.shardCache.get((self.ref_dataset_name, shardId), load)
+        self.metadata.set("shardCacheHits", self.shardCache.nHits)
+        self.metadata.set("shardCacheMisses", self.shardCache.nMisses)
+        self.metadata.set("shardCacheEvictions", self.shardCache.nEvictions)
+        if self.sharedCache is not None:
+            self.metadata.set("sharedCacheHits", self.sharedCache.nHits)
+            self.metadata.set("sharedCacheMisses", self.sharedCache.nMisses)
+            self.metadata.set("sharedCacheEvictions", self.sharedCache.nEvictions)
+        return shard
 
     def _trimToCircle(self, refCat, ctrCoord, radius):
         """Trim a reference catalog to a circular aperture.
@@ -165,8 +688,11 @@ class LoadIndexedReferenceObjectsTask(LoadReferenceObjectsTask):
         catalog : `lsst.afw.table.SimpleCatalog`
             Catalog containing objects that fall in the circular aperture.
         """
-        tempCat = type(refCat)(refCat.schema)
-        for record in refCat:
-            if record.getCoord().separation(ctrCoord) < radius:
-                tempCat.append(record)
-        return tempCat
+        if not refCat.isContiguous():
+            refCat = refCat.copy(deep=True)
+        # compare squared chord lengths, rather than angles, as they are
+        # cheap to compute and precise for small separations
+        ctrVector = ctrCoord.getVector()
+        offset = _unitVectors(refCat) - np.array([ctrVector.x(), ctrVector.y(), ctrVector.z()])
+        maxChord = 2*np.sin(0.5*min(radius.asRadians(), np.pi))
+        return refCat[np.einsum("ij,ij->i", offset, offset) < maxChord**2]
@@ -25,7 +25,10 @@ __all__ = ["getRefFluxField", "getRefFluxKeys", "LoadReferenceObjectsTask", "Loa
            "ReferenceObjectLoader"]
 
 import abc
+import concurrent.futures
 import itertools
+import threading
+import time
 
 import astropy.time
 import astropy.units
@@ -86,6 +89,98 @@ def getFormatVersionFromRefCat(refCat):
         return None
 
 
+def _getSortFluxName(refCat):
+    """Return the name of the flux field by which the records of a
+    reference catalog shard are sorted, brightest first.
+
+    Parameters
+    ----------
+    refCat : `lsst.afw.table.SimpleCatalog`
+        Reference catalog shard to inspect.
+
+    Returns
+    -------
+    fluxName : `str` or `None`
+        Name of the flux field, or `None` if the shard is not sorted (its
+        metadata does not include a "REFCAT_SORT_FLUX" key).
+    """
+    md = refCat.getMetadata()
+    if md is None:
+        return None
+    try:
+        return md.getScalar("REFCAT_SORT_FLUX")
+    except KeyError:
+        return None
+
+
+def _getNarrowedFieldNames(refCat):
+    """Return the names of the fields of a reference catalog that are stored
+    as float32, and are to be widened to float64 when loaded.
+
+    Parameters
+    ----------
+    refCat : `lsst.afw.table.SimpleCatalog`
+        Reference catalog to inspect.
+
+    Returns
+    -------
+    names : `list` of `str`
+        Names of the narrowed fields, from the "REFCAT_WIDEN" key of the
+        metadata; empty if there is none.
+    """
+    md = refCat.getMetadata()
+    if md is None or not md.exists("REFCAT_WIDEN"):
+        return []
+    return [name for name in md.getScalar("REFCAT_WIDEN").split(",") if name]
+
+
+def _widenCatalog(refCat):
+    """Widen the fields of a reference catalog that are stored as float32
+    to float64, as they were before the ingest narrowed them.
+
+    Parameters
+    ----------
+    refCat : `lsst.afw.table.SimpleCatalog`
+        Reference catalog, as read.
+
+    Returns
+    -------
+    refCat : `lsst.afw.table.SimpleCatalog`
+        ``refCat`` itself if it has no narrowed fields, else a new
+        contiguous catalog with the narrowed fields widened, and without
+        the "REFCAT_WIDEN" metadata key.
+    """
+    names = _getNarrowedFieldNames(refCat)
+    if not names:
+        return refCat
+    if not refCat.isContiguous():
+        refCat = refCat.copy(deep=True)
+    mapper = afwTable.SchemaMapper(refCat.schema, True)
+    minimalSchema = afwTable.SimpleTable.makeMinimalSchema()
+    mapper.addMinimalSchema(minimalSchema, True)
+    minimalNames = minimalSchema.getNames()
+    widenedKeys = []
+    for item in refCat.schema:
+        field = item.field
+        if field.getName() in minimalNames:
+            continue
+        if field.getName() in names:
+            # a schema mapper cannot change the type of a field, so these
+            # are copied one column at a time
+            outputKey = mapper.editOutputSchema().addField(field.getName(), type=numpy.float64,
+                                                           doc=field.getDoc(), units=field.getUnits())
+            widenedKeys.append((item.key, outputKey))
+        else:
+            mapper.addMapping(item.key)
+    output = _copyCatalogs([refCat], mapper)
+    for inputKey, outputKey in widenedKeys:
+        output[outputKey] = refCat[inputKey]
+    md = refCat.getMetadata().deepCopy()
+    md.remove("REFCAT_WIDEN")
+    output.setMetadata(md)
+    return output
+
+
 def convertToNanojansky(catalog, log, doConvert=True):
     """Convert fluxes in a catalog from jansky to nanojansky.
 
@@ -148,6 +243,544 @@ def convertToNanojansky(catalog, log, doConvert=True):
         return None
 
 
+def _fetchConcurrently(fetch, items, nThreads, log):
+    """Call a function on each of a list of items using a pool of threads,
+    returning the results in the order of the items.
+
+    Parameters
+    ----------
+    fetch : callable
+        Function taking one item, e.g. a function that reads a shard.
+    items : `list`
+        Items to pass to ``fetch``.
+    nThreads : `int`
+        Maximum number of concurrent calls to ``fetch``; if 1, ``fetch`` is
+        called for one item after another in this thread.
+    log : `lsst.log.Log`
+        Log to send messages to.
+
+    Returns
+    -------
+    result : `lsst.pipe.base.Struct`
+        A struct containing:
+
+        - ``results`` : the value of ``fetch`` for each item (`list`).
+        - ``maxInFlight`` : the largest number of concurrent calls to
+          ``fetch`` (`int`).
+        - ``waitTime`` : the time spent waiting for all the calls to
+          finish (`float`, seconds).
+    """
+    lock = threading.Lock()
+    inFlight = [0, 0]  # current, maximum
+
+    def countedFetch(item):
+        with lock:
+            inFlight[0] += 1
+            inFlight[1] = max(inFlight)
+        try:
+            return fetch(item)
+        finally:
+            with lock:
+                inFlight[0] -= 1
+
+    t0 = time.time()
+    if nThreads <= 1 or len(items) <= 1:
+        results = [countedFetch(item) for item in items]
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(nThreads, len(items))) as executor:
+            results = list(executor.map(countedFetch, items))
+    waitTime = time.time() - t0
+    log.debug("Read %d shards with up to %d reads in flight in %.3f sec",
+              len(items), inFlight[1], waitTime)
+    return pipeBase.Struct(results=results, maxInFlight=inFlight[1], waitTime=waitTime)
+
+
+# Executor that runs the reads started by prefetchPixelBox, one prefetch
+# after another; created on first use by _submitPrefetch.
+_prefetchExecutor = None
+_prefetchExecutorLock = threading.Lock()
+
+
+def _submitPrefetch(read):
+    """Run a function that reads reference catalogs in the background.
+
+    Parameters
+    ----------
+    read : callable
+        Function with no arguments that reads the reference catalogs.
+
+    Returns
+    -------
+    future : `concurrent.futures.Future`
+        Future whose result is the value returned by ``read``.
+    """
+    global _prefetchExecutor
+    with _prefetchExecutorLock:
+        if _prefetchExecutor is None:
+            _prefetchExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        return _prefetchExecutor.submit(read)
+
+
+class _PrefetchFuture:
+    """Future-like handle on a reference catalog load whose reads were
+    started in the background by ``prefetchPixelBox``.
+
+    Only the reads of shard files run in the background: the loader's
+    master schema, if it has one, is read before they start, and its shard
+    cache and metadata are only used by the rest of the load, which is done
+    in the thread that requests the result, the first time it is requested.
+    The only state the background thread updates is the hit, miss and
+    eviction counts of the loader's shared shard cache, if it has one,
+    which are guarded by a lock.
+
+    Parameters
+    ----------
+    readFuture : `concurrent.futures.Future`
+        Future for the reads, as returned by `_submitPrefetch`.
+    finish : callable
+        Function taking the result of ``readFuture`` and returning the
+        result of the load.
+    """
+    def __init__(self, readFuture, finish):
+        self._readFuture = readFuture
+        self._finish = finish
+        self._lock = threading.Lock()
+        self._result = None
+        self._finished = False
+
+    def done(self):
+        """Return whether the reads have finished, so that `result` will
+        not wait for I/O.
+        """
+        return self._finished or self._readFuture.done()
+
+    def cancel(self):
+        """Attempt to cancel the reads; return whether they were cancelled.
+        """
+        return self._readFuture.cancel()
+
+    def result(self, timeout=None):
+        """Wait for the reads to finish and complete the load.
+
+        Parameters
+        ----------
+        timeout : `float`, optional
+            Maximum time to wait for the reads (seconds); wait forever if
+            `None`.
+
+        Returns
+        -------
+        result : `lsst.pipe.base.Struct`
+            The result of the load, as returned by ``loadPixelBox``.
+
+        Raises
+        ------
+        concurrent.futures.TimeoutError
+            Raised if the reads did not finish within ``timeout``.
+        """
+        with self._lock:
+            if not self._finished:
+                self._result = self._finish(self._readFuture.result(timeout))
+                self._finished = True
+                self._finish = None
+            return self._result
+
+
+def _getRequiredFieldNames(schema, config, filterName=None, columns=None):
+    """Return the names of the fields of a reference catalog that a load
+    needs, or `None` if it needs all of them.
+
+    The required fields are the standard reference catalog fields other
+    than fluxes (those of `LoadReferenceObjectsTask.makeMinimalSchema`,
+    such as coordinates and their errors, proper motion, parallax and
+    flags), the fields of the reference filters that may be used as a
+    flux field (that of ``filterName``, ``config.defaultFilter`` and all
+    the values of ``config.filterMap``), and ``columns``.
+
+    Parameters
+    ----------
+    schema : `lsst.afw.table.Schema`
+        Schema of the reference catalog.
+    config : `LoadReferenceObjectsConfig`
+        Configuration of the loader.
+    filterName : `str`, optional
+        Name of camera filter, or `None` or blank for the default filter.
+    columns : `list` of `str`, optional
+        Names of additional fields to load. If `None`, all fields are
+        needed, unless ``config.onlyRequiredColumns`` is set.
+
+    Returns
+    -------
+    fieldNames : `set` of `str` or `None`
+        Names of the required fields that are in ``schema``.
+
+    Raises
+    ------
+    RuntimeError
+        Raised if any of ``columns`` is not in ``schema``.
+    """
+    if columns is None:
+        if not config.onlyRequiredColumns:
+            return None
+        columns = []
+    missing = [name for name in columns if name not in schema]
+    if missing:
+        raise RuntimeError("Unknown reference catalog columns: %s" % (", ".join(missing),))
+    standardSchema = LoadReferenceObjectsTask.makeMinimalSchema(
+        [], addIsPhotometric=True, addIsResolved=True, addIsVariable=True, coordErrDim=3,
+        addProperMotion=True, properMotionErrDim=3, addParallax=True, addParallaxErr=True)
+    refFilterNames = set(config.filterMap.values())
+    if config.defaultFilter:
+        refFilterNames.add(config.defaultFilter)
+    if filterName:
+        refFilterNames.add(config.filterMap.get(filterName, filterName))
+    prefixes = tuple(refFilterName + "_" for refFilterName in refFilterNames)
+    names = schema.getNames()
+    fieldNames = set(standardSchema.getNames()) & names
+    fieldNames.update(name for name in names if name.startswith(prefixes))
+    fieldNames.update(columns)
+    return fieldNames
+
+
+def _makeProjectionMapper(schema, fieldNames):
+    """Make a schema mapper that copies the minimal schema and some other
+    fields of a reference catalog.
+
+    Parameters
+    ----------
+    schema : `lsst.afw.table.Schema`
+        Schema of the reference catalog.
+    fieldNames : `set` of `str` or `None`
+        Names of the fields to copy, or `None` to copy all fields.
+
+    Returns
+    -------
+    mapper : `lsst.afw.table.SchemaMapper`
+        Schema mapper, whose output schema shares the input alias map.
+    """
+    mapper = afwTable.SchemaMapper(schema, True)
+    if fieldNames is None:
+        mapper.addMinimalSchema(schema, True)
+        return mapper
+    minimalSchema = afwTable.SimpleTable.makeMinimalSchema()
+    mapper.addMinimalSchema(minimalSchema, True)
+    minimalNames = minimalSchema.getNames()
+    for item in schema:
+        name = item.field.getName()
+        if name in fieldNames and name not in minimalNames:
+            mapper.addMapping(item.key)
+    return mapper
+
+
+def _copyCatalogs(catalogs, mapper):
+    """Copy the records of several catalogs through a schema mapper into
+    one new catalog, which is allocated once and is contiguous.
+
+    Parameters
+    ----------
+    catalogs : `list` of `lsst.afw.table.SimpleCatalog`
+        Catalogs to copy, whose schema is the input schema of ``mapper``.
+    mapper : `lsst.afw.table.SchemaMapper`
+        Schema mapper to copy the records with.
+
+    Returns
+    -------
+    catalog : `lsst.afw.table.SimpleCatalog`
+        Catalog with the output schema of ``mapper``, containing a copy of
+        each record of ``catalogs`` in order.
+    """
+    output = afwTable.SimpleCatalog(mapper.getOutputSchema())
+    output.reserve(sum(len(catalog) for catalog in catalogs))
+    for catalog in catalogs:
+        output.extend(catalog, mapper=mapper)
+    if not output.isContiguous():
+        output = output.copy(deep=True)
+    return output
+
+
+def _getFluxLimit(config, filterName=None):
+    """Return the flux field and limits corresponding to ``config.magLimit``
+    and ``config.maxRefObjects``.
+
+    Parameters
+    ----------
+    config : `LoadReferenceObjectsConfig`
+        Configuration of the loader.
+    filterName : `str`, optional
+        Name of camera filter, or `None` or blank for the default filter.
+
+    Returns
+    -------
+    fluxLimit : `lsst.pipe.base.Struct` or `None`
+        `None` if ``config.magLimit`` and ``config.maxRefObjects`` are both
+        `None`, else a struct containing:
+
+        - ``fluxName`` : name of the reference flux field (`str`).
+        - ``minFlux`` : minimum flux of the objects to load (nJy), or
+          ``-inf`` if there is no magnitude limit (`float`).
+        - ``maxCount`` : maximum number of objects to load, or `None`
+          (`int`).
+
+    Raises
+    ------
+    RuntimeError
+        Raised if ``config.magLimit`` or ``config.maxRefObjects`` is set but
+        there is no filter to apply it to.
+    """
+    if config.magLimit is None and config.maxRefObjects is None:
+        return None
+    refFilterName = config.filterMap.get(filterName, filterName) if filterName else config.defaultFilter
+    if not refFilterName:
+        raise RuntimeError("magLimit or maxRefObjects is set, but no filter was specified and "
+                           "defaultFilter is blank")
+    if config.magLimit is None:
+        minFlux = -numpy.inf
+    else:
+        minFlux = (config.magLimit*astropy.units.ABmag).to_value(astropy.units.nJy)
+    return pipeBase.Struct(fluxName=refFilterName + "_flux", minFlux=minFlux, maxCount=config.maxRefObjects)
+
+
+def _getSortedPrefix(refCat, fluxLimit):
+    """Return the records of a shard sorted by decreasing flux that pass the
+    minimum flux of a flux limit.
+
+    Parameters
+    ----------
+    refCat : `lsst.afw.table.SimpleCatalog`
+        Shard sorted by decreasing ``fluxLimit.fluxName``, with fluxes in
+        nJy; see `_getSortFluxName`.
+    fluxLimit : `lsst.pipe.base.Struct`
+        Flux limit, as returned by `_getFluxLimit`.
+
+    Returns
+    -------
+    refCat : `lsst.afw.table.SimpleCatalog`
+        View of the leading records of ``refCat`` whose flux is at least
+        ``fluxLimit.minFlux``. NaN fluxes sort last, so they are excluded.
+    """
+    if not refCat.isContiguous():
+        refCat = refCat.copy(deep=True)
+    flux = refCat[fluxLimit.fluxName]
+    with numpy.errstate(invalid="ignore"):
+        nBright = int(numpy.searchsorted(-flux, -fluxLimit.minFlux, side="right"))
+    return refCat[:nBright]
+
+
+def _applyFluxLimit(refCat, fluxLimit):
+    """Select the records of a reference catalog that are bright enough.
+
+    Parameters
+    ----------
+    refCat : `lsst.afw.table.SimpleCatalog`
+        Reference catalog, with fluxes in nJy.
+    fluxLimit : `lsst.pipe.base.Struct`
+        Flux limit, as returned by `_getFluxLimit`.
+
+    Returns
+    -------
+    refCat : `lsst.afw.table.SimpleCatalog`
+        Catalog of the records whose flux is at least the limit, in their
+        original order; records with a NaN flux are dropped. If
+        ``fluxLimit.maxCount`` is set, only that many of the brightest
+        records are kept.
+    flux : `numpy.ndarray`
+        Fluxes of the selected records.
+
+    Raises
+    ------
+    RuntimeError
+        Raised if the flux field is not in the catalog.
+    """
+    if fluxLimit.fluxName not in refCat.schema:
+        raise RuntimeError("Could not find flux field %s to apply magLimit or maxRefObjects to" %
+                           (fluxLimit.fluxName,))
+    if not refCat.isContiguous():
+        refCat = refCat.copy(deep=True)
+    flux = refCat[fluxLimit.fluxName]
+    select = flux >= fluxLimit.minFlux
+    if fluxLimit.maxCount is not None and numpy.count_nonzero(select) > fluxLimit.maxCount:
+        indices = numpy.flatnonzero(select)
+        brightest = numpy.argsort(-flux[indices], kind="stable")[:fluxLimit.maxCount]
+        select[:] = False
+        select[indices[brightest]] = True
+    return refCat[select], flux[select]
+
+
+def _selectBrightest(refCats, fluxes, maxCount):
+    """Keep only the brightest records of a set of reference catalogs.
+
+    Parameters
+    ----------
+    refCats : `list` of `lsst.afw.table.SimpleCatalog`
+        Reference catalogs.
+    fluxes : `list` of `numpy.ndarray`
+        Flux of each record of each catalog in ``refCats``; NaN fluxes must
+        already have been removed, e.g. by `_applyFluxLimit`.
+    maxCount : `int`
+        Maximum total number of records to keep.
+
+    Returns
+    -------
+    refCats : `list` of `lsst.afw.table.SimpleCatalog`
+        Catalogs holding the ``maxCount`` brightest records, in their
+        original order; ties are broken in favor of earlier records.
+    """
+    sizes = [len(flux) for flux in fluxes]
+    if sum(sizes) <= maxCount:
+        return refCats
+    allFlux = numpy.concatenate(fluxes)
+    select = numpy.zeros(len(allFlux), dtype=bool)
+    select[numpy.argsort(-allFlux, kind="stable")[:maxCount]] = True
+    bounds = numpy.cumsum([0] + sizes)
+    return [refCat[select[begin:end]] for refCat, begin, end in zip(refCats, bounds[:-1], bounds[1:])]
+
+
+def _limitPieces(refCats, brightList, fluxLimit):
+    """Apply a flux limit to a set of reference catalogs.
+
+    Parameters
+    ----------
+    refCats : `list` of `lsst.afw.table.SimpleCatalog`
+        Reference catalogs, with fluxes in nJy.
+    brightList : `list` of `bool`
+        For each catalog in ``refCats``, whether every record is known to
+        pass the minimum flux of ``fluxLimit``.
+    fluxLimit : `lsst.pipe.base.Struct` or `None`
+        Flux limit, as returned by `_getFluxLimit`.
+
+    Returns
+    -------
+    refCats : `list` of `lsst.afw.table.SimpleCatalog`
+        The records of ``refCats`` that pass the flux limit; if
+        ``fluxLimit.maxCount`` is set, at most that many records in total.
+    """
+    if fluxLimit is None:
+        return refCats
+    if fluxLimit.maxCount is None:
+        return [refCat if bright else _applyFluxLimit(refCat, fluxLimit)[0]
+                for refCat, bright in zip(refCats, brightList)]
+    limited = [_applyFluxLimit(refCat, fluxLimit) for refCat in refCats]
+    return _selectBrightest([refCat for refCat, _ in limited], [flux for _, flux in limited],
+                            fluxLimit.maxCount)
+
+
+def _getNthBrightest(fluxes, count):
+    """Return the flux of the ``count``-th brightest record in a set of
+    fluxes, or ``-inf`` if there are fewer records.
+
+    Parameters
+    ----------
+    fluxes : `list` of `numpy.ndarray`
+        Fluxes, without NaNs.
+    count : `int`
+        Rank of the record whose flux is wanted, starting from 1.
+
+    Returns
+    -------
+    flux : `float`
+        The flux.
+    """
+    allFlux = numpy.concatenate(fluxes) if fluxes else numpy.empty(0)
+    if len(allFlux) < count:
+        return -numpy.inf
+    return -numpy.partition(-allFlux, count - 1)[count - 1]
+
+
+def _checkShardSummary(summary, region, fluxLimit=None):
+    """Use the summary statistics of a shard to decide whether it needs to
+    be read, and whether its rows need to be filtered.
+
+    Parameters
+    ----------
+    summary : `lsst.pipe.base.Struct` or `None`
+        Summary statistics of the shard, as returned by
+        `lsst.meas.algorithms.shardSummary.ShardSummary.get`, or `None` if
+        unknown.
+    region : `lsst.sphgeom.Region`
+        Region being loaded.
+    fluxLimit : `lsst.pipe.base.Struct`, optional
+        Flux limit, as returned by `_getFluxLimit`.
+
+    Returns
+    -------
+    result : `lsst.pipe.base.Struct`
+        A struct containing:
+
+        - ``skip`` : no row of the shard can be loaded (`bool`).
+        - ``contained`` : every row of the shard is within ``region``
+          (`bool`).
+        - ``bright`` : every row of the shard passes ``fluxLimit``
+          (`bool`).
+    """
+    if summary is None:
+        return pipeBase.Struct(skip=False, contained=False, bright=fluxLimit is None)
+    relation = region.relate(summary.cap)
+    skip = summary.nRows == 0 or bool(relation & sphgeom.DISJOINT)
+    contained = bool(relation & sphgeom.CONTAINS)
+    bright = True
+    if fluxLimit is not None:
+        if fluxLimit.fluxName in summary.fluxMax:
+            # comparisons with NaN are false, so NaN fluxes are conservative
+            skip = skip or not summary.fluxMax[fluxLimit.fluxName] >= fluxLimit.minFlux
+            bright = summary.fluxMin[fluxLimit.fluxName] >= fluxLimit.minFlux
+        else:
+            bright = False
+    return pipeBase.Struct(skip=skip, contained=contained, bright=bright)
+
+
+def _unitVectors(refCat):
+    """Return the unit vectors of the coordinates of all the records in a
+    reference catalog.
+
+    Parameters
+    ----------
+    refCat : `lsst.afw.table.SimpleCatalog`
+        Contiguous reference catalog.
+
+    Returns
+    -------
+    vectors : `numpy.ndarray`
+        Array of shape (len(refCat), 3) of unit vectors.
+    """
+    ra = refCat["coord_ra"]
+    dec = refCat["coord_dec"]
+    cosDec = numpy.cos(dec)
+    return numpy.stack([numpy.cos(ra)*cosDec, numpy.sin(ra)*cosDec, numpy.sin(dec)], axis=1)
+
+
+def _regionContains(region, refCat):
+    """Test which records of a reference catalog lie within a region.
+
+    Circles and convex polygons are tested using NumPy on all records at
+    once; other regions are tested one record at a time.
+
+    Parameters
+    ----------
+    region : `lsst.sphgeom.Region`
+        Region to test.
+    refCat : `lsst.afw.table.SimpleCatalog`
+        Contiguous reference catalog.
+
+    Returns
+    -------
+    mask : `numpy.ndarray` of `bool`
+        True for each record within the region.
+    """
+    if isinstance(region, sphgeom.Circle):
+        center = region.getCenter()
+        offset = _unitVectors(refCat) - numpy.array([center.x(), center.y(), center.z()])
+        return numpy.einsum("ij,ij->i", offset, offset) <= region.getSquaredChordLength()
+    if isinstance(region, sphgeom.ConvexPolygon):
+        # a point is inside a convex polygon if it is to the left of every
+        # edge, as the vertices are counter-clockwise; unlike sphgeom this
+        # does not use exact arithmetic, which only matters for points on
+        # an edge
+        vertices = numpy.array([[v.x(), v.y(), v.z()] for v in region.getVertices()])
+        edgeNormals = numpy.cross(vertices, numpy.roll(vertices, -1, axis=0))
+        return numpy.all(_unitVectors(refCat) @ edgeNormals.T >= 0, axis=1)
+    return numpy.array([region.contains(record.getCoord().getVector()) for record in refCat], dtype=bool)
+
+
 class _FilterCatalog:
     """This is a private helper class which filters catalogs by
     row based on the row being inside the region used to initialize
@@ -169,10 +802,10 @@ class _FilterCatalog:
         initialize this class, then all the entries in the catalog must be
         within the region and so the whole catalog is returned.
 
-        If the catalog region is not entirely contained, then the location for
-        each record is tested against the region used to initialize the class.
-        Records which fall inside this region are added to a new catalog, and
-        this catalog is then returned.
+        If the catalog region is not entirely contained, then the location of
+        every record is tested against the region used to initialize the
+        class, and a catalog of the records which fall inside this region is
+        returned.
 
         Parameters
         ---------
@@ -185,11 +818,9 @@ class _FilterCatalog:
             # no filtering needed, region completely contains refcat
             return refCat
 
-        filteredRefCat = type(refCat)(refCat.table)
-        for record in refCat:
-            if self.region.contains(record.getCoord().getVector()):
-                filteredRefCat.append(record)
-        return filteredRefCat
+        if not refCat.isContiguous():
+            refCat = refCat.copy(deep=True)
+        return refCat[_regionContains(self.region, refCat)]
 
 
 class ReferenceObjectLoader:
@@ -202,7 +833,7 @@ class ReferenceObjectLoader:
     the exact region of the sky reference catalogs will be loaded for, and
     call a corresponding method to load the reference objects.
     """
-    def __init__(self, dataIds, butler, config, log=None):
+    def __init__(self, dataIds, butler, config, log=None, shardSummaries=None):
         """ Constructs an instance of ReferenceObjectLoader
 
         Parameters
@@ -215,12 +846,20 @@ class ReferenceObjectLoader:
         log : `lsst.log.Log`
             Logger object used to write out messages. If `None` (default) the default
             lsst logger will be used
+        shardSummaries : sequence of `lsst.pipe.base.Struct` (optional)
+            Summary statistics of each reference catalog in ``dataIds``, in the
+            same order, as returned by
+            `lsst.meas.algorithms.shardSummary.ShardSummary.get`; `None` for
+            catalogs with no summary. Reference catalogs that cannot hold any
+            objects to be loaded are not read, and those whose objects are all
+            within a region are not filtered when loading that region.
 
         """
         self.dataIds = dataIds
         self.butler = butler
         self.log = log or lsst.log.Log.getDefaultLogger()
         self.config = config
+        self.shardSummaries = shardSummaries
 
     @staticmethod
     def _makeBoxRegion(BBox, wcs, BBoxPadding):
@@ -252,7 +891,8 @@ class ReferenceObjectLoader:
 
         return innerSkyRegion, outerSkyRegion, innerSphCorners, outerSphCorners
 
-    def loadPixelBox(self, bbox, wcs, filterName=None, epoch=None, photoCalib=None, bboxPadding=100):
+    def loadPixelBox(self, bbox, wcs, filterName=None, epoch=None, photoCalib=None, bboxPadding=100,
+                     columns=None):
         """Load reference objects that are within a pixel-based rectangular region
 
         This algorithm works by creating a spherical box whose corners correspond
@@ -288,6 +928,12 @@ class ReferenceObjectLoader:
             used to determine if the reference catalog for a sky patch will be loaded from
             the data store, this function will filter out objects which lie within the
             padded region but fall outside the input bounding box region.
+        columns : `list` of `str` (optional)
+            Names of fields to return in addition to those required for
+            astrometry and for the flux fields of ``filterName``,
+            ``config.defaultFilter`` and ``config.filterMap``. If `None`,
+            all fields are returned, unless ``config.onlyRequiredColumns``
+            is set.
 
         Returns
         -------
@@ -302,6 +948,60 @@ class ReferenceObjectLoader:
         `lsst.pex.exception.TypeError`
             Raised if the loaded reference catalogs do not have matching schemas
         """
+        outerSkyRegion, filterFunction = self._makePixelBoxFilter(bbox, wcs, bboxPadding)
+        return self.loadRegion(outerSkyRegion, filtFunc=filterFunction, epoch=epoch, filterName=filterName,
+                               columns=columns)
+
+    def prefetchPixelBox(self, bbox, wcs, filterName=None, epoch=None, bboxPadding=100, columns=None):
+        """Start reading the reference catalogs needed to load the reference
+        objects within a pixel-based rectangular region, in the background.
+
+        The reference catalogs are read by a background thread while the
+        caller does other work; the load is completed, in the calling
+        thread, when the result of the returned future is requested.
+
+        Parameters
+        ----------
+        bbox, wcs, filterName, epoch, bboxPadding, columns
+            See `loadPixelBox`.
+
+        Returns
+        -------
+        future : `_PrefetchFuture`
+            Future whose ``result()`` is the struct that `loadPixelBox`
+            would return.
+        """
+        outerSkyRegion, filterFunction = self._makePixelBoxFilter(bbox, wcs, bboxPadding)
+        overlapList = self._findOverlaps(outerSkyRegion, _getFluxLimit(self.config, filterName))
+
+        def finish(catalogs):
+            return self._assembleRegion(outerSkyRegion, overlapList, catalogs, filtFunc=filterFunction,
+                                        filterName=filterName, epoch=epoch, columns=columns)
+
+        return _PrefetchFuture(_submitPrefetch(lambda: self._fetchCatalogs(overlapList)), finish)
+
+    def _makePixelBoxFilter(self, bbox, wcs, bboxPadding):
+        """Make the region and filter function used to load the reference
+        objects within a pixel-based rectangular region.
+
+        Parameters
+        ----------
+        bbox : `lsst.geom.box2I`
+            Box which bounds a region in pixel space
+        wcs : `lsst.afw.geom.SkyWcs`
+            Wcs object defining the pixel to sky (and inverse) transform for the space
+            of pixels of the supplied bbox
+        bboxPadding : `int`
+            Number describing how much to pad the input bbox by (in pixels);
+            see `loadPixelBox`.
+
+        Returns
+        -------
+        outerSkyRegion : `lsst.sphgeom.ConvexPolygon`
+            Sky region enclosing the padded bounding box.
+        filterFunction : callable
+            Filter function to pass to `loadRegion`.
+        """
         innerSkyRegion, outerSkyRegion, _, _ = self._makeBoxRegion(bbox, wcs, bboxPadding)
 
         def _filterFunction(refCat, region):
@@ -321,9 +1021,57 @@ class ReferenceObjectLoader:
                 if bbox.contains(geom.Point2I(pixCoords)):
                     filteredRefCat.append(record)
             return filteredRefCat
-        return self.loadRegion(outerSkyRegion, filtFunc=_filterFunction, epoch=epoch, filterName=filterName)
+        return outerSkyRegion, _filterFunction
+
+    def loadPixelBoxes(self, boxes, filterName=None, epoch=None, bboxPadding=100, columns=None):
+        """Load reference objects within several pixel-based rectangular
+        regions, reading each overlapping reference catalog only once.
+
+        This is equivalent to calling `loadPixelBox` for each box, e.g. for
+        each detector of a visit, but the reference catalogs that overlap
+        more than one box are read from the datastore once.
+
+        Parameters
+        ----------
+        boxes : iterable of (`lsst.geom.Box2I`, `lsst.afw.geom.SkyWcs`)
+            Bounding box and WCS of each region to load.
+        filterName : `str`
+            Name of camera filter, or None or blank for the default filter
+        epoch : `astropy.time.Time` (optional)
+            Epoch to which to correct proper motion and parallax,
+            or None to not apply such corrections.
+        bboxPadding : `int`
+            Number describing how much to pad each input bbox by (in
+            pixels); see `loadPixelBox`.
+        columns : `list` of `str` (optional)
+            Names of fields to return in addition to those required; see
+            `loadPixelBox`.
+
+        Returns
+        -------
+        results : `list` of `lsst.pipe.base.Struct`
+            One result for each box, in order, as returned by
+            `loadPixelBox`.
+
+        Raises
+        ------
+        `lsst.pex.exception.RuntimeError`
+            Raised if no reference catalogs could be found for one of the
+            regions
 
-    def loadRegion(self, region, filtFunc=None, filterName=None, epoch=None):
+        `lsst.pex.exception.TypeError`
+            Raised if the loaded reference catalogs do not have matching schemas
+        """
+        regions = []
+        filtFuncs = []
+        for bbox, wcs in boxes:
+            outerSkyRegion, filterFunction = self._makePixelBoxFilter(bbox, wcs, bboxPadding)
+            regions.append(outerSkyRegion)
+            filtFuncs.append(filterFunction)
+        return self.loadRegions(regions, filtFuncs=filtFuncs, filterName=filterName, epoch=epoch,
+                                columns=columns)
+
+    def loadRegion(self, region, filtFunc=None, filterName=None, epoch=None, columns=None):
         """ Load reference objects within a specified region
 
         This function loads the DataIds used to construct an instance of this class
@@ -348,6 +1096,12 @@ class ReferenceObjectLoader:
         epoch : `astropy.time.Time` (optional)
             Epoch to which to correct proper motion and parallax,
             or None to not apply such corrections.
+        columns : `list` of `str` (optional)
+            Names of fields to return in addition to those required for
+            astrometry and for the flux fields of ``filterName``,
+            ``config.defaultFilter`` and ``config.filterMap``. If `None`,
+            all fields are returned, unless ``config.onlyRequiredColumns``
+            is set.
 
         Returns
         -------
@@ -364,14 +1118,115 @@ class ReferenceObjectLoader:
             Raised if the loaded reference catalogs do not have matching schemas
 
         """
+        fluxLimit = _getFluxLimit(self.config, filterName)
+        overlapList = self._findOverlaps(region, fluxLimit)
+        catalogs = self._fetchCatalogs(overlapList)
+        return self._assembleRegion(region, overlapList, catalogs, filtFunc=filtFunc, filterName=filterName,
+                                    epoch=epoch, columns=columns)
+
+    def loadRegions(self, regions, filtFuncs=None, filterName=None, epoch=None, columns=None):
+        """Load reference objects within several regions, reading each
+        overlapping reference catalog only once.
+
+        This is equivalent to calling `loadRegion` for each region, but the
+        reference catalogs that overlap more than one region are read from the
+        datastore once, so the number of reads is the number of distinct
+        reference catalogs rather than the sum over the regions.
+
+        Parameters
+        ----------
+        regions : `list` of `lsst.sphgeom.Region`
+            Spatial regions for which reference objects are to be loaded.
+        filtFuncs : `list` of callable (optional)
+            Filter function for each region; see `loadRegion`. If `None`,
+            the records are filtered according to whether they fall within
+            each region.
+        filterName : `str`
+            Name of camera filter, or None or blank for the default filter
+        epoch : `astropy.time.Time` (optional)
+            Epoch to which to correct proper motion and parallax,
+            or None to not apply such corrections.
+        columns : `list` of `str` (optional)
+            Names of fields to return in addition to those required; see
+            `loadRegion`.
+
+        Returns
+        -------
+        results : `list` of `lsst.pipe.base.Struct`
+            One result for each region, in order, as returned by
+            `loadRegion`; the catalogs share no records.
+
+        Raises
+        ------
+        `lsst.pex.exception.RuntimeError`
+            Raised if no reference catalogs could be found for one of the
+            regions
+
+        `lsst.pex.exception.TypeError`
+            Raised if the loaded reference catalogs do not have matching schemas
+        """
+        if filtFuncs is None:
+            filtFuncs = [None]*len(regions)
+        if len(filtFuncs) != len(regions):
+            raise ValueError(f"Got {len(filtFuncs)} filter functions for {len(regions)} regions")
+        fluxLimit = _getFluxLimit(self.config, filterName)
+        overlapLists = [self._findOverlaps(region, fluxLimit) for region in regions]
+
+        # Read the union of the overlapping reference catalogs, once each;
+        # the datasets are identified by their index in self.dataIds.
+        union = dict(item for overlapList in overlapLists for item in overlapList)
+        self.log.info(f"Loading {len(union)} reference catalogs for {len(regions)} regions "
+                      f"({sum(len(overlapList) for overlapList in overlapLists)} region overlaps)")
+        unionList = sorted(union.items(), key=lambda item: item[0])
+        catalogs = dict(zip((index for index, _ in unionList), self._fetchCatalogs(unionList)))
+
+        return [self._assembleRegion(region, overlapList, [catalogs[index] for index, _ in overlapList],
+                                     filtFunc=filtFunc, filterName=filterName, epoch=epoch, columns=columns)
+                for region, overlapList, filtFunc in zip(regions, overlapLists, filtFuncs)]
+
+    def _getShardSummary(self, index):
+        """Return the summary statistics of a reference catalog, or `None`
+        if unknown.
+
+        Parameters
+        ----------
+        index : `int`
+            Index of the reference catalog in ``self.dataIds``.
+        """
+        if self.shardSummaries is None:
+            return None
+        return self.shardSummaries[index]
+
+    def _findOverlaps(self, region, fluxLimit=None):
+        """Find the reference catalogs that overlap a region.
+
+        Parameters
+        ----------
+        region : `lsst.sphgeom.Region`
+            Region for which reference objects are to be loaded.
+        fluxLimit : `lsst.pipe.base.Struct` (optional)
+            Flux limit of the objects to load, as returned by
+            `_getFluxLimit`.
+
+        Returns
+        -------
+        overlapList : `list` of (`int`, data ID)
+            Index in ``self.dataIds`` and data ID of each reference catalog
+            that overlaps ``region``, leaving out those whose summary shows
+            that they hold no objects to load (but keeping at least one, to
+            define the schema).
+
+        Raises
+        ------
+        `lsst.pex.exception.RuntimeError`
+            Raised if no reference catalogs could be found for the specified region
+        """
         regionBounding = region.getBoundingBox()
         self.log.info("Loading reference objects from region bounded by {}, {} lat lon".format(
             regionBounding.getLat(), regionBounding.getLon()))
-        if filtFunc is None:
-            filtFunc = _FilterCatalog(region)
         # filter out all the regions supplied by the constructor that do not overlap
         overlapList = []
-        for dataId in self.dataIds:
+        for index, dataId in enumerate(self.dataIds):
             # SphGeom supports some objects intersecting others, but is not symmetric,
             # try the intersect operation in both directions
             try:
@@ -380,57 +1235,127 @@ class ReferenceObjectLoader:
                 intersects = region.intersects(dataId.region)
 
             if intersects:
-                overlapList.append(dataId)
+                overlapList.append((index, dataId))
 
         if len(overlapList) == 0:
             raise pexExceptions.RuntimeError("No reference tables could be found for input region")
+        if self.shardSummaries is not None:
+            keptList = [(index, dataId) for index, dataId in overlapList
+                        if not _checkShardSummary(self._getShardSummary(index), region, fluxLimit).skip]
+            self.log.debug(f"Skipping {len(overlapList) - len(keptList)} reference catalogs that hold "
+                           "no objects to load, according to their summaries")
+            overlapList = keptList or overlapList[:1]
+        return overlapList
 
-        firstCat = self.butler.get('ref_cat', overlapList[0])
-        refCat = filtFunc(firstCat, overlapList[0].region)
-        trimmedAmount = len(firstCat) - len(refCat)
+    def _fetchCatalogs(self, overlapList):
+        """Read reference catalogs from the datastore.
 
-        # Load in the remaining catalogs
-        for dataId in overlapList[1:]:
-            tmpCat = self.butler.get('ref_cat', dataId)
+        Parameters
+        ----------
+        overlapList : `list` of (`int`, data ID)
+            Reference catalogs to read, as returned by `_findOverlaps`.
 
-            if tmpCat.schema != firstCat.schema:
-                raise pexExceptions.TypeError("Reference catalogs have mismatching schemas")
+        Returns
+        -------
+        catalogs : `list` of `lsst.afw.table.SimpleCatalog`
+            The reference catalogs, in the order of ``overlapList``, with
+            any fields stored as float32 widened; see `_widenCatalog`.
+        """
+        nThreads = self.config.nFetchThreads if self.config is not None else 1
+        return _fetchConcurrently(lambda item: _widenCatalog(self.butler.get('ref_cat', item[1])),
+                                  overlapList, nThreads, self.log).results
 
-            filteredCat = filtFunc(tmpCat, dataId.region)
-            refCat.extend(filteredCat)
-            trimmedAmount += len(tmpCat) - len(filteredCat)
+    def _assembleRegion(self, region, overlapList, catalogs, filtFunc=None, filterName=None, epoch=None,
+                        columns=None):
+        """Filter reference catalogs that have been read to a region and
+        combine them into a single catalog; see `loadRegion`.
 
-        self.log.debug(f"Trimmed {trimmedAmount} out of region objects, leaving {len(refCat)}")
-        self.log.info(f"Loaded {len(refCat)} reference objects")
+        Parameters
+        ----------
+        region : `lsst.sphgeom.Region`
+            Region for which reference objects are to be loaded.
+        overlapList : `list` of (`int`, data ID)
+            Reference catalogs that overlap ``region``, as returned by
+            `_findOverlaps`.
+        catalogs : `list` of `lsst.afw.table.SimpleCatalog`
+            The reference catalogs of ``overlapList``; these are not modified.
 
-        if epoch is not None and "pm_ra" in refCat.schema:
-            # check for a catalog in a non-standard format
-            if isinstance(refCat.schema["pm_ra"].asKey(), lsst.afw.table.KeyAngle):
-                applyProperMotionsImpl(self.log, refCat, epoch)
-            else:
-                self.log.warn("Catalog pm_ra field is not an Angle; not applying proper motion")
+        Returns
+        -------
+        result : `lsst.pipe.base.Struct`
+            Result struct, as returned by `loadRegion`; see that method for
+            the other parameters.
+        """
+        trimToRegion = filtFunc is None
+        if filtFunc is None:
+            filtFunc = _FilterCatalog(region)
+        fluxLimit = _getFluxLimit(self.config, filterName)
+        firstCat = catalogs[0]
+        formatVersion = getFormatVersionFromRefCat(firstCat)
+        isVersion0 = not hasNanojanskyFluxUnits(firstCat.schema) or formatVersion is None or formatVersion < 1
+
+        # Filter the catalogs; these share records with the catalogs read
+        pieces = []
+        brightList = []
+        nRead = 0
+        for (index, dataId), tmpCat in zip(overlapList, catalogs):
+            if tmpCat.schema != firstCat.schema:
+                raise pexExceptions.TypeError("Reference catalogs have mismatching schemas")
+
+            check = _checkShardSummary(self._getShardSummary(index), region, fluxLimit)
+            if check.skip:
+                continue
+            nRead += len(tmpCat)
+            if (fluxLimit is not None and not isVersion0 and not check.bright
+                    and _getSortFluxName(tmpCat) == fluxLimit.fluxName):
+                # only the leading records of a sorted catalog can pass the flux limit
+                tmpCat = _getSortedPrefix(tmpCat, fluxLimit)
+            # the default filter need not be applied to catalogs entirely within the region
+            pieces.append(tmpCat if trimToRegion and check.contained else filtFunc(tmpCat, dataId.region))
+            brightList.append(check.bright)
+        if not pieces:
+            # keep an empty catalog to define the schema
+            pieces.append(firstCat[:0])
+            brightList.append(True)
 
         # Verify the schema is in the correct units and has the correct version; automatically convert
         # it with a warning if this is not the case.
-        if not hasNanojanskyFluxUnits(refCat.schema) or not getFormatVersionFromRefCat(refCat) >= 1:
+        if isVersion0:
             self.log.warn("Found version 0 reference catalog with old style units in schema.")
             self.log.warn("run `meas_algorithms/bin/convert_refcat_to_nJy.py` to convert fluxes to nJy.")
             self.log.warn("See RFC-575 for more details.")
-            refCat = convertToNanojansky(refCat, self.log)
+            refCat = type(pieces[0])(pieces[0].table)
+            for piece in pieces:
+                refCat.extend(piece)
+            pieces = [convertToNanojansky(refCat, self.log)]
+            brightList = [fluxLimit is None]
+
+        pieces = _limitPieces(pieces, brightList, fluxLimit)
 
-        expandedCat = self.remapReferenceCatalogSchema(refCat, position=True)
+        nLoaded = sum(len(piece) for piece in pieces)
+        self.log.debug(f"Trimmed {nRead - nLoaded} out of region objects, leaving {nLoaded}")
+        self.log.info(f"Loaded {nLoaded} reference objects")
+
+        # Copy the required fields of the filtered catalogs into a single
+        # new contiguous catalog, adding centroid fields
+        fieldNames = _getRequiredFieldNames(pieces[0].schema, self.config, filterName, columns)
+        mapper = self._makeRemapper(pieces[0].schema, position=True, fieldNames=fieldNames)
+        expandedCat = _copyCatalogs(pieces, mapper)
+
+        if epoch is not None and "pm_ra" in expandedCat.schema:
+            # check for a catalog in a non-standard format
+            if isinstance(expandedCat.schema["pm_ra"].asKey(), lsst.afw.table.KeyAngle):
+                applyProperMotionsImpl(self.log, expandedCat, epoch)
+            else:
+                self.log.warn("Catalog pm_ra field is not an Angle; not applying proper motion")
 
         # Add flux aliases
         self.addFluxAliases(expandedCat, self.config.defaultFilter, self.config.filterMap)
 
-        # Ensure that the returned reference catalog is continuous in memory
-        if not expandedCat.isContiguous():
-            expandedCat = refCat.copy(deep=True)
-
         fluxField = getRefFluxField(schema=expandedCat.schema, filterName=filterName)
         return pipeBase.Struct(refCat=expandedCat, fluxField=fluxField)
 
-    def loadSkyCircle(self, ctrCoord, radius, filterName=None, epoch=None):
+    def loadSkyCircle(self, ctrCoord, radius, filterName=None, epoch=None, columns=None):
         """Load reference objects that lie within a circular region on the sky
 
         This method constructs a circular region from an input center and angular radius,
@@ -449,6 +1374,12 @@ class ReferenceObjectLoader:
         epoch : `astropy.time.Time` (optional)
             Epoch to which to correct proper motion and parallax,
             or None to not apply such corrections.
+        columns : `list` of `str` (optional)
+            Names of fields to return in addition to those required for
+            astrometry and for the flux fields of ``filterName``,
+            ``config.defaultFilter`` and ``config.filterMap``. If `None`,
+            all fields are returned, unless ``config.onlyRequiredColumns``
+            is set.
 
         Returns
         -------
@@ -467,7 +1398,7 @@ class ReferenceObjectLoader:
         centerVector = ctrCoord.getVector()
         sphRadius = sphgeom.Angle(radius.asRadians())
         circularRegion = sphgeom.Circle(centerVector, sphRadius)
-        return self.loadRegion(circularRegion, filterName=filterName, epoch=None)
+        return self.loadRegion(circularRegion, filterName=filterName, epoch=None, columns=columns)
 
     def joinMatchListWithCatalog(self, matchCat, sourceCat):
         """Relink an unpersisted match list to sources and reference
@@ -626,8 +1557,9 @@ class ReferenceObjectLoader:
 
         return refCat
 
-    @staticmethod
-    def remapReferenceCatalogSchema(refCat, *, filterNameList=None, position=False, photometric=False):
+    @classmethod
+    def remapReferenceCatalogSchema(cls, refCat, *, filterNameList=None, position=False, photometric=False,
+                                    fieldNames=None):
         """This function takes in a reference catalog and creates a new catalog with additional
         columns defined the remaining function arguments.
 
@@ -635,14 +1567,39 @@ class ReferenceObjectLoader:
         ----------
         refCat : `lsst.afw.table.SimpleCatalog`
             Reference catalog to map to new catalog
+        fieldNames : `set` of `str`, optional
+            Names of the fields of ``refCat`` to copy, in addition to the
+            minimal schema; if `None`, all fields are copied.
 
         Returns
         -------
         expandedCat : `lsst.afw.table.SimpleCatalog`
             Deep copy of input reference catalog with additional columns added
         """
-        mapper = afwTable.SchemaMapper(refCat.schema, True)
-        mapper.addMinimalSchema(refCat.schema, True)
+        mapper = cls._makeRemapper(refCat.schema, filterNameList=filterNameList, position=position,
+                                   photometric=photometric, fieldNames=fieldNames)
+        expandedCat = afwTable.SimpleCatalog(mapper.getOutputSchema())
+        expandedCat.extend(refCat, mapper=mapper)
+
+        return expandedCat
+
+    @staticmethod
+    def _makeRemapper(schema, *, filterNameList=None, position=False, photometric=False, fieldNames=None):
+        """Make the schema mapper used by `remapReferenceCatalogSchema`.
+
+        Parameters
+        ----------
+        schema : `lsst.afw.table.Schema`
+            Schema of the reference catalog.
+
+        Returns
+        -------
+        mapper : `lsst.afw.table.SchemaMapper`
+            Schema mapper from ``schema`` to the schema with additional
+            columns; see `remapReferenceCatalogSchema` for the other
+            parameters.
+        """
+        mapper = _makeProjectionMapper(schema, fieldNames)
         mapper.editOutputSchema().disconnectAliases()
         if filterNameList:
             for filterName in filterNameList:
@@ -678,10 +1635,7 @@ class ReferenceObjectLoader:
                                                doc="set if the object has variable brightness"
                                                )
 
-        expandedCat = afwTable.SimpleCatalog(mapper.getOutputSchema())
-        expandedCat.extend(refCat, mapper=mapper)
-
-        return expandedCat
+        return mapper
 
 
 def getRefFluxField(schema, filterName=None):
@@ -784,6 +1738,42 @@ class LoadReferenceObjectsConfig(pexConfig.Config):
         dtype=bool,
         default=False,
     )
+    onlyRequiredColumns = pexConfig.Field(
+        doc="Only load the reference catalog fields that are needed: the standard fields other than "
+            "fluxes, the flux fields of the requested filter, defaultFilter and the filters in filterMap, "
+            "and any columns requested by the caller? If False, all fields are loaded unless the caller "
+            "requests specific columns.",
+        dtype=bool,
+        default=False,
+    )
+    nFetchThreads = pexConfig.RangeField(
+        doc="Number of threads to use to read reference catalog shards concurrently, "
+            "which hides the latency of each read on network filesystems; 1 reads shards one at a time.",
+        dtype=int,
+        default=1,
+        min=1,
+    )
+    magLimit = pexConfig.Field(
+        doc="Only load reference objects at least this bright (AB magnitude) in the reference filter of "
+            "the requested filter, or of defaultFilter if no filter is requested; objects with no flux "
+            "in that filter are not loaded. Shards that hold no such objects are skipped if the "
+            "reference catalog has a shard summary. If None, objects of all brightnesses are loaded. "
+            "Only supported when loading indexed reference catalogs.",
+        dtype=float,
+        optional=True,
+        default=None,
+    )
+    maxRefObjects = pexConfig.RangeField(
+        doc="Maximum number of reference objects to load: only the brightest objects in the reference "
+            "filter of the requested filter, or of defaultFilter if no filter is requested, are loaded; "
+            "objects with no flux in that filter are not loaded. Loading is fastest from reference "
+            "catalogs ingested with sort_by_flux set to that filter. If None, there is no limit. "
+            "Only supported when loading indexed reference catalogs.",
+        dtype=int,
+        optional=True,
+        default=None,
+        min=1,
+    )
 
 # The following comment block adds a link to this task from the Task Documentation page.
 ## @addtogroup LSST_task_documentation
@@ -897,7 +1887,7 @@ class LoadReferenceObjectsTask(pipeBase.Task, metaclass=abc.ABCMeta):
         self.butler = butler
 
     @pipeBase.timeMethod
-    def loadPixelBox(self, bbox, wcs, filterName=None, photoCalib=None, epoch=None):
+    def loadPixelBox(self, bbox, wcs, filterName=None, photoCalib=None, epoch=None, columns=None):
         """Load reference objects that overlap a rectangular pixel region.
 
         Parameters
@@ -916,6 +1906,13 @@ class LoadReferenceObjectsTask(pipeBase.Task, metaclass=abc.ABCMeta):
         epoch : `astropy.time.Time` (optional)
             Epoch to which to correct proper motion and parallax,
             or None to not apply such corrections.
+        columns : `list` of `str` (optional)
+            Names of fields to return in addition to those required for
+            astrometry and for the flux fields of ``filterName``,
+            ``config.defaultFilter`` and ``config.filterMap``. If `None`,
+            all fields are returned, unless ``config.onlyRequiredColumns``
+            is set. Only passed on to `loadSkyCircle` if not `None`, as not
+            all subclasses support it.
 
         Returns
         -------
@@ -941,7 +1938,8 @@ class LoadReferenceObjectsTask(pipeBase.Task, metaclass=abc.ABCMeta):
         # find objects in circle
         self.log.info("Loading reference objects using center %s and radius %s deg" %
                       (circle.coord, circle.radius.asDegrees()))
-        loadRes = self.loadSkyCircle(circle.coord, circle.radius, filterName)
+        kwargs = {} if columns is None else dict(columns=columns)
+        loadRes = self.loadSkyCircle(circle.coord, circle.radius, filterName, **kwargs)
         refCat = loadRes.refCat
         numFound = len(refCat)
 
@@ -1402,6 +2400,12 @@ def joinMatchListWithCatalogImpl(refObjLoader, matchCat, sourceCat):
     attribute. This method converts such a match catalog into a match
     list, with links to source records and reference object records.
 
+    If the loader has a ``loadIds`` method that can load the matched
+    reference objects by ID (see
+    `lsst.meas.algorithms.LoadIndexedReferenceObjectsTask.loadIds`), only
+    those objects are loaded; otherwise the region recorded in the match
+    metadata is loaded.
+
     Parameters
     ----------
     refObjLoader
@@ -1428,13 +2432,20 @@ def joinMatchListWithCatalogImpl(refObjLoader, matchCat, sourceCat):
         epoch = matchmeta.getDouble('EPOCH')
     except (pexExcept.NotFoundError, pexExcept.TypeError):
         epoch = None  # Not present, or not correct type means it's not set
-    if 'RADIUS' in matchmeta:
+    # Loaders that can read reference objects by ID need only read the
+    # shards that hold the matched objects, rather than the whole region.
+    refCat = None
+    loadIds = getattr(refObjLoader, "loadIds", None)
+    if loadIds is not None:
+        result = loadIds(matchCat["first"], filterName, epoch=epoch)
+        refCat = None if result is None else result.refCat
+    if refCat is None and 'RADIUS' in matchmeta:
         # This is a circle style metadata, call loadSkyCircle
         ctrCoord = lsst.geom.SpherePoint(matchmeta.getDouble('RA'),
                                          matchmeta.getDouble('DEC'), lsst.geom.degrees)
         rad = matchmeta.getDouble('RADIUS') * lsst.geom.degrees
         refCat = refObjLoader.loadSkyCircle(ctrCoord, rad, filterName, epoch=epoch).refCat
-    elif "INNER_UPPER_LEFT_RA" in matchmeta:
+    elif refCat is None and "INNER_UPPER_LEFT_RA" in matchmeta:
         # This is the sky box type (only triggers in the LoadReferenceObject class, not task)
         # Only the outer box is required to be loaded to get the maximum region, all filtering
         # will be done by the unpackMatches function, and no spatial filtering needs to be done
@@ -1506,10 +2517,26 @@ def applyProperMotionsImpl(log, catalog, epoch):
     # needlessly large errors for short duration
     offsetBearingsRad = numpy.arctan2(pmDecRad*1e6, pmRaRad*1e6)
     offsetAmountsRad = numpy.hypot(offsetsRaRad, offsetsDecRad)
-    for record, bearingRad, amountRad in zip(catalog, offsetBearingsRad, offsetAmountsRad):
-        record.set(coordKey,
-                   record.get(coordKey).offset(bearing=bearingRad*lsst.geom.radians,
-                                               amount=amountRad*lsst.geom.radians))
+    # Move each position along a great circle, as SpherePoint.offset does:
+    # the new position is r cos(amount) + v sin(amount), where r is the
+    # unit vector of the position and v is the unit vector tangent to the
+    # sphere at r in the direction of the bearing (measured from East
+    # towards North)
+    ra = catalog[coordKey.getRa()]
+    dec = catalog[coordKey.getDec()]
+    cosRa, sinRa = numpy.cos(ra), numpy.sin(ra)
+    cosDec, sinDec = numpy.cos(dec), numpy.sin(dec)
+    cosBearing, sinBearing = numpy.cos(offsetBearingsRad), numpy.sin(offsetBearingsRad)
+    cosAmount, sinAmount = numpy.cos(offsetAmountsRad), numpy.sin(offsetAmountsRad)
+    x = cosDec*cosRa*cosAmount - (cosBearing*sinRa + sinBearing*sinDec*cosRa)*sinAmount
+    y = cosDec*sinRa*cosAmount + (cosBearing*cosRa - sinBearing*sinDec*sinRa)*sinAmount
+    z = sinDec*cosAmount + sinBearing*cosDec*sinAmount
+    newRa = numpy.arctan2(y, x)
+    newRa[newRa < 0] += 2*numpy.pi
+    # adding 2 pi to a tiny negative angle can round to 2 pi
+    newRa[newRa >= 2*numpy.pi] = 0.0
+    catalog[coordKey.getRa()] = newRa
+    catalog[coordKey.getDec()] = numpy.arctan2(z, numpy.hypot(x, y))
     # Increase error in RA and Dec based on error in proper motion
     if "coord_raErr" in catalog.schema:
         catalog["coord_raErr"] = numpy.hypot(catalog["coord_raErr"],
@@ -42,6 +42,13 @@ class ReadFitsCatalogConfig(pexConfig.Config):
         itemtype=str,
         default={},
     )
+    chunk_size = pexConfig.RangeField(
+        dtype=int,
+        default=0,
+        min=0,
+        doc="Number of rows per chunk returned by ReadFitsCatalogTask.readChunks; "
+            "0 to return the whole table as a single chunk.",
+    )
 
 ## @addtogroup LSST_task_documentation
 ## @{
@@ -99,20 +106,46 @@ class ReadFitsCatalogTask(pipeBase.Task):
         @return a numpy structured array containing the specified columns
         """
         with fits.open(filename) as f:
-            hdu = f[self.config.hdu]
-            if hdu.data is None:
-                raise RuntimeError("No data found in %s HDU %s" % (filename, self.config.hdu))
-            if hdu.is_image:
-                raise RuntimeError("%s HDU %s is an image" % (filename, self.config.hdu))
-
-            if not self.config.column_map:
-                # take the data as it is
-                return hdu.data
-
-            missingnames = set(self.config.column_map.keys()) - set(hdu.columns.names)
-            if missingnames:
-                raise RuntimeError("Columns %s in column_map were not found in %s" % (missingnames, filename))
-
-            for inname, outname in self.config.column_map.items():
-                hdu.columns[inname].name = outname
+            return self._getData(f, filename)
+
+    def readChunks(self, filename):
+        """Read an object catalog from the specified FITS file, in chunks of rows
+
+        The table is memory-mapped, so only one chunk at a time is read into memory.
+
+        @param[in] filename  path to FITS file
+        @return an iterator over numpy structured arrays containing the specified columns,
+            each with at most config.chunk_size rows (all rows if config.chunk_size is 0)
+        """
+        with fits.open(filename, memmap=True) as f:
+            data = self._getData(f, filename)
+            if self.config.chunk_size == 0:
+                yield data
+                return
+            for start in range(0, len(data), self.config.chunk_size):
+                yield data[start:start + self.config.chunk_size].copy()
+
+    def _getData(self, f, filename):
+        """Check the configured HDU of an open FITS file and return its data, with columns renamed
+
+        @param[in] f  open FITS file (an astropy.io.fits.HDUList)
+        @param[in] filename  path to FITS file, for error messages
+        @return a numpy structured array containing the specified columns
+        """
+        hdu = f[self.config.hdu]
+        if hdu.data is None:
+            raise RuntimeError("No data found in %s HDU %s" % (filename, self.config.hdu))
+        if hdu.is_image:
+            raise RuntimeError("%s HDU %s is an image" % (filename, self.config.hdu))
+
+        if not self.config.column_map:
+            # take the data as it is
             return hdu.data
+
+        missingnames = set(self.config.column_map.keys()) - set(hdu.columns.names)
+        if missingnames:
+            raise RuntimeError("Columns %s in column_map were not found in %s" % (missingnames, filename))
+
+        for inname, outname in self.config.column_map.items():
+            hdu.columns[inname].name = outname
+        return hdu.data
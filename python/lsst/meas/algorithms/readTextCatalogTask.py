@@ -23,6 +23,8 @@
 
 __all__ = ["ReadTextCatalogConfig", "ReadTextCatalogTask"]
 
+import itertools
+
 import numpy as np
 
 import lsst.pex.config as pexConfig
@@ -47,6 +49,43 @@ class ReadTextCatalogConfig(pexConfig.Config):
         default=',',
         doc='Delimiter to use when reading text reference files.  Comma is default.'
     )
+    chunk_size = pexConfig.RangeField(
+        dtype=int,
+        default=0,
+        min=0,
+        doc="Number of lines per chunk returned by ReadTextCatalogTask.readChunks; "
+            "0 to return the whole file as a single chunk. "
+            "Column types are inferred from the first chunk; later chunks whose values do not "
+            "fit them (e.g. longer strings) are an error, unless their types are set in dtypes "
+            "for the loadtxt parser.",
+    )
+    parser = pexConfig.ChoiceField(
+        dtype=str,
+        default="genfromtxt",
+        doc="Engine used to parse the text.",
+        allowed={
+            "genfromtxt": "Parse with numpy.genfromtxt, inferring the type of every value.",
+            "loadtxt": "Parse with numpy.loadtxt, using the column types in dtypes or those "
+                       "numpy.genfromtxt infers from the first sample_lines lines. Text that does "
+                       "not fit the inferred types is parsed with numpy.genfromtxt instead, "
+                       "so the result is the same.",
+        },
+    )
+    sample_lines = pexConfig.RangeField(
+        dtype=int,
+        default=1000,
+        min=1,
+        doc="Number of lines used to infer column types for the loadtxt parser.",
+    )
+    dtypes = pexConfig.DictField(
+        keytype=str,
+        itemtype=str,
+        default={},
+        doc="Mapping of column name: numpy dtype (e.g. 'f8', 'i8', '?' or 'U20') for the loadtxt parser; "
+            "types of columns not listed are inferred. An unsized string type ('U') is sized to "
+            "the longest value. If any types are given, text that does not fit the column types "
+            "is an error, rather than being parsed with numpy.genfromtxt.",
+    )
 
 ## @addtogroup LSST_task_documentation
 ## @{
@@ -114,6 +153,12 @@ class ReadTextCatalogTask(pipeBase.Task):
         names = True
         if self.config.colnames:
             names = self.config.colnames
+        if self.config.parser == "loadtxt":
+            with open(filename, encoding="utf-8") as f:
+                for _ in range(self.config.header_lines):
+                    f.readline()
+                return self._parseLines(f.readlines(), names)
+
         arr = np.genfromtxt(filename, dtype=None, encoding="utf-8",
                             skip_header=self.config.header_lines,
                             delimiter=self.config.delimiter,
@@ -121,3 +166,171 @@ class ReadTextCatalogTask(pipeBase.Task):
 
         # Just in case someone has only one line in the file.
         return np.atleast_1d(arr)
+
+    def readChunks(self, filename):
+        """Read an object catalog from the specified text file, in chunks of rows
+
+        Only one chunk at a time is read into memory. Every chunk has the column types
+        of the first, so that a schema made from the first chunk holds all of them;
+        later chunks whose values fit those types (e.g. shorter strings, or integers in
+        a floating-point column) are converted to them.
+
+        @param[in] filename  path to text file
+        @return an iterator over numpy structured arrays containing the specified columns,
+            each with at most config.chunk_size rows (all rows if config.chunk_size is 0)
+        @throw ValueError if a chunk has values that do not fit the column types of the first
+            chunk, e.g. longer strings; set config.dtypes (with the loadtxt parser) or
+            config.chunk_size = 0 to read such a file
+        """
+        if self.config.chunk_size == 0:
+            yield self.run(filename)
+            return
+
+        names = True
+        if self.config.colnames:
+            names = self.config.colnames
+        # column types of the first chunk
+        dtype = None
+        with open(filename, encoding="utf-8") as f:
+            for _ in range(self.config.header_lines):
+                f.readline()
+            while True:
+                # include the line of column names in the first chunk, if they are to be discovered
+                nLines = self.config.chunk_size + 1 if names is True else self.config.chunk_size
+                lines = list(itertools.islice(f, nLines))
+                if not lines:
+                    return
+                # skip chunks with no data: numpy.genfromtxt cannot find column names in blank
+                # lines, and the names may be on a commented line, so comments are only skipped
+                # once the names are known
+                if all(not line.strip() or (names is not True and line.lstrip().startswith("#"))
+                       for line in lines):
+                    continue
+                arr = self._parseLines(lines, names)
+                if arr.dtype.names:
+                    names = list(arr.dtype.names)
+                if len(arr) == 0:
+                    continue
+                if dtype is None:
+                    dtype = arr.dtype
+                yield self._matchDtype(arr, dtype, filename)
+
+    @staticmethod
+    def _matchDtype(arr, dtype, filename):
+        """Convert a chunk of rows to the column types of the first chunk
+
+        @param[in] arr  numpy structured array holding the chunk
+        @param[in] dtype  numpy dtype of the first chunk
+        @param[in] filename  path to text file, for error messages
+        @return arr, converted to dtype if needed
+        @throw ValueError if a column of arr cannot be safely converted to its type in dtype
+        """
+        if arr.dtype == dtype:
+            return arr
+        badNames = [name for name in dtype.names
+                    if not np.can_cast(arr.dtype[name], dtype[name], casting="safe")]
+        if badNames:
+            raise ValueError("Columns %s of a chunk of %s have types %s, which do not fit the types %s "
+                             "inferred from the first chunk; set dtypes or chunk_size=0" %
+                             (badNames, filename, [str(arr.dtype[name]) for name in badNames],
+                              [str(dtype[name]) for name in badNames]))
+        return arr.astype(dtype)
+
+    def _parseLines(self, lines, names):
+        """Parse lines of text with the configured parser
+
+        @param[in] lines  list of lines to parse, not including any header lines to skip
+        @param[in] names  list of column names, or True to read them from the first line
+        @return a numpy structured array containing the specified columns
+        """
+        if self.config.parser == "loadtxt":
+            arr = self._parseLinesFast(lines, names)
+            if arr is not None:
+                return arr
+        arr = np.genfromtxt(lines, dtype=None, encoding="utf-8",
+                            delimiter=self.config.delimiter,
+                            names=names)
+        # Just in case someone has only one line in the chunk.
+        return np.atleast_1d(arr)
+
+    def _parseLinesFast(self, lines, names):
+        """Parse lines of text using numpy.loadtxt with known column types
+
+        Column names and the types of columns not in config.dtypes are found by running
+        numpy.genfromtxt on the first config.sample_lines lines. Numeric columns are then
+        converted by numpy.loadtxt directly; string and boolean columns are read as python
+        strings and converted afterwards, as numpy.genfromtxt would.
+
+        @param[in] lines  list of lines to parse, not including any header lines to skip
+        @param[in] names  list of column names, or True to read them from the first line
+        @return a numpy structured array containing the specified columns, or None if
+            the lines do not fit the inferred column types (or cannot otherwise be parsed
+            this way) and must be parsed with numpy.genfromtxt
+        @throw ValueError if config.dtypes is not empty and the lines do not fit the column types
+        """
+        dataLines = lines
+        if names is True:
+            # the column names are on the first line that is not blank
+            while dataLines and not dataLines[0].strip():
+                dataLines = dataLines[1:]
+            dataLines = dataLines[1:]
+        nSample = self.config.sample_lines + len(lines) - len(dataLines)
+        sample = np.atleast_1d(np.genfromtxt(lines[:nSample], dtype=None, encoding="utf-8",
+                                             delimiter=self.config.delimiter,
+                                             names=names))
+        if len(sample) == 0:
+            return None
+
+        dtypes = [np.dtype(self.config.dtypes[name]) if name in self.config.dtypes else sample.dtype[name]
+                  for name in sample.dtype.names]
+        readDtype = [(name, object if dtype.kind in "bU" else dtype)
+                     for name, dtype in zip(sample.dtype.names, dtypes)]
+        try:
+            arr = np.loadtxt(dataLines, dtype=readDtype, encoding="utf-8", comments="#",
+                             delimiter=self.config.delimiter, ndmin=1)
+            columns = []
+            for i, (name, dtype) in enumerate(zip(sample.dtype.names, dtypes)):
+                if dtype.kind not in "bU":
+                    columns.append(arr[name])
+                    continue
+                values = arr[name].astype(str)
+                # numpy.genfromtxt strips whitespace from the ends of each line, not from each field
+                if i == 0:
+                    values = np.char.lstrip(values, " \r\n")
+                if i == len(dtypes) - 1:
+                    values = np.char.rstrip(values, " \r\n")
+                if dtype.kind == "U" and name not in self.config.dtypes:
+                    # string columns are as wide as their longest value, not that in the sample
+                    dtype = np.dtype("U")
+                columns.append(self._convertColumn(values, dtype))
+        except (ValueError, OverflowError) as e:
+            if self.config.dtypes:
+                raise ValueError("Cannot parse text with column types %s: %s" % (dtypes, e))
+            return None
+
+        result = np.empty(len(arr), dtype=[(name, column.dtype)
+                                           for name, column in zip(sample.dtype.names, columns)])
+        for name, column in zip(sample.dtype.names, columns):
+            result[name] = column
+        return result
+
+    @staticmethod
+    def _convertColumn(values, dtype):
+        """Convert a column of strings to the specified type, as numpy.genfromtxt would
+
+        @param[in] values  numpy array of strings
+        @param[in] dtype  numpy dtype; an unsized string type is sized to the longest value
+        @return a numpy array of the specified type
+        @throw ValueError if a value cannot be converted
+        """
+        if dtype.kind == "b":
+            # numpy.genfromtxt only accepts TRUE and FALSE, in any case, as booleans
+            upper = np.char.upper(values)
+            isTrue = upper == "TRUE"
+            if not np.all(isTrue | (upper == "FALSE")):
+                raise ValueError("values are not all TRUE or FALSE")
+            return isTrue
+        if dtype.kind == "U" and dtype.itemsize == 0:
+            width = int(np.char.str_len(values).max()) if len(values) > 0 else 0
+            return values.astype("U%d" % max(width, 1))
+        return values.astype(dtype)
@@ -0,0 +1,169 @@
+# This file is part of meas_algorithms.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["ShardBuffer"]
+
+import os
+import shutil
+import tempfile
+
+import lsst.afw.table as afwTable
+
+
+class ShardBuffer:
+    """Accumulate the rows destined for each reference catalog shard, so
+    that each shard can be written exactly once at the end of an ingest.
+
+    Rows are held in memory until the memory budget is exceeded, at which
+    point the largest in-memory shard buffers are spilled to FITS files in
+    a scratch directory. The order in which rows were added to a shard is
+    preserved whether they were spilled or not.
+
+    Parameters
+    ----------
+    maxBytes : `int`
+        Approximate maximum number of bytes of catalog records to hold in
+        memory.
+    spillDir : `str`, optional
+        Directory in which to write spill files. If `None`, a temporary
+        directory is created, and removed again by `close`.
+    log : `lsst.log.Log`, optional
+        Log to send messages to.
+    """
+    def __init__(self, maxBytes, spillDir=None, log=None):
+        self.maxBytes = maxBytes
+        self.log = log
+        self._ownSpillDir = spillDir is None
+        if spillDir is None:
+            spillDir = tempfile.mkdtemp(prefix="refcatSpill")
+        else:
+            os.makedirs(spillDir, exist_ok=True)
+        self.spillDir = spillDir
+        # Each shard maps to a list of parts, in the order they were added;
+        # a part is either an in-memory catalog or the path of a spill file.
+        self._parts = {}
+        self._memBytes = {}
+        self._nBytes = 0
+        self._nSpillFiles = 0
+
+    def __len__(self):
+        return len(self._parts)
+
+    def __contains__(self, shardId):
+        return shardId in self._parts
+
+    @property
+    def nBytes(self):
+        """Number of bytes of catalog records held in memory (`int`).
+        """
+        return self._nBytes
+
+    def add(self, shardId, catalog):
+        """Add rows to the buffer for one shard.
+
+        Parameters
+        ----------
+        shardId : `int`
+            ID of the shard the rows belong to.
+        catalog : `lsst.afw.table.SimpleCatalog`
+            Filled rows to append to the shard; must not be modified by the
+            caller afterwards.
+        """
+        nBytes = len(catalog)*catalog.schema.getRecordSize()
+        self._parts.setdefault(shardId, []).append(catalog)
+        self._memBytes[shardId] = self._memBytes.get(shardId, 0) + nBytes
+        self._nBytes += nBytes
+        if self._nBytes > self.maxBytes:
+            self._spill()
+
+    def shardIds(self):
+        """Return the IDs of all shards with buffered rows, in sorted order.
+        """
+        return sorted(self._parts)
+
+    def getParts(self, shardId):
+        """Return the buffered rows for one shard, in the order they were
+        added.
+
+        Parameters
+        ----------
+        shardId : `int`
+            ID of shard.
+
+        Returns
+        -------
+        parts : iterator of `lsst.afw.table.SimpleCatalog`
+            Catalogs of buffered rows; spill files are read lazily.
+        """
+        for part in self._parts.get(shardId, []):
+            if isinstance(part, str):
+                yield afwTable.SimpleCatalog.readFits(part)
+            else:
+                yield part
+
+    def pop(self, shardId):
+        """Forget all buffered rows for one shard, deleting any spill files.
+
+        Parameters
+        ----------
+        shardId : `int`
+            ID of shard.
+        """
+        for part in self._parts.pop(shardId, []):
+            if isinstance(part, str):
+                os.remove(part)
+        self._nBytes -= self._memBytes.pop(shardId, 0)
+
+    def close(self):
+        """Discard all buffered rows and remove the spill files.
+        """
+        for shardId in list(self._parts):
+            self.pop(shardId)
+        if self._ownSpillDir:
+            shutil.rmtree(self.spillDir, ignore_errors=True)
+
+    def _spill(self):
+        """Spill the largest in-memory shard buffers to disk until at most
+        half of the memory budget is in use.
+        """
+        bySize = sorted(self._memBytes.items(), key=lambda item: item[1], reverse=True)
+        for shardId, nBytes in bySize:
+            if self._nBytes <= self.maxBytes//2:
+                break
+            if nBytes == 0:
+                continue
+            parts = self._parts[shardId]
+            memParts = [part for part in parts if not isinstance(part, str)]
+            # Merge any in-memory parts into one spill file; the in-memory
+            # parts always follow any earlier spill files, so order is kept.
+            spillCat = afwTable.SimpleCatalog(memParts[0].schema)
+            spillCat.reserve(sum(len(part) for part in memParts))
+            for part in memParts:
+                spillCat.extend(part, deep=True)
+            path = os.path.join(self.spillDir, "%s-%d.fits" % (shardId, self._nSpillFiles))
+            self._nSpillFiles += 1
+            spillCat.writeFits(path)
+            self._parts[shardId] = [part for part in parts if isinstance(part, str)] + [path]
+            self._memBytes[shardId] = 0
+            self._nBytes -= nBytes
+        if self.log is not None:
+            self.log.debug("Spilled shard buffers to %s; %d bytes remain in memory",
+                           self.spillDir, self._nBytes)
@@ -0,0 +1,290 @@
+# This file is part of meas_algorithms.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["ShardCache", "SharedShardCache"]
+
+from collections import OrderedDict
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+
+class ShardCache:
+    """A memory-bounded least-recently-used cache of reference catalog
+    shards.
+
+    Missing shards may be cached as `None`, so that their absence need not
+    be checked again.
+
+    Parameters
+    ----------
+    maxBytes : `int`
+        Approximate maximum number of bytes of catalog records to hold. If
+        0, nothing is cached.
+    """
+    def __init__(self, maxBytes):
+        self.maxBytes = maxBytes
+        self._shards = OrderedDict()
+        self._nBytes = 0
+        self.nHits = 0
+        self.nMisses = 0
+        self.nEvictions = 0
+
+    def __len__(self):
+        return len(self._shards)
+
+    def __contains__(self, key):
+        return key in self._shards
+
+    @property
+    def nBytes(self):
+        """Number of bytes of catalog records held (`int`).
+        """
+        return self._nBytes
+
+    @staticmethod
+    def _sizeOf(catalog):
+        """Return the number of bytes of records in a catalog, or 0 for
+        `None`.
+        """
+        if catalog is None:
+            return 0
+        return len(catalog)*catalog.schema.getRecordSize()
+
+    def get(self, key, load):
+        """Get a shard from the cache, loading and caching it if it is not
+        present.
+
+        Parameters
+        ----------
+        key : `tuple`
+            Key identifying the shard, e.g. (dataset name, shard ID).
+        load : callable
+            Function with no arguments that returns the shard, as a
+            `lsst.afw.table.SimpleCatalog`, or `None` if it does not exist.
+
+        Returns
+        -------
+        catalog : `lsst.afw.table.SimpleCatalog` or `None`
+            The shard; it is shared with the cache and must not be modified.
+        """
+        if key in self._shards:
+            self.nHits += 1
+            self._shards.move_to_end(key)
+            return self._shards[key]
+        self.nMisses += 1
+        catalog = load()
+        self.put(key, catalog)
+        return catalog
+
+    def put(self, key, catalog):
+        """Add a shard to the cache, evicting the least recently used shards
+        to stay within the memory budget.
+
+        A shard larger than the whole budget is not cached.
+
+        Parameters
+        ----------
+        key : `tuple`
+            Key identifying the shard.
+        catalog : `lsst.afw.table.SimpleCatalog` or `None`
+            The shard, or `None` if it does not exist.
+        """
+        self.pop(key)
+        nBytes = self._sizeOf(catalog)
+        if self.maxBytes <= 0 or nBytes > self.maxBytes:
+            return
+        self._shards[key] = catalog
+        self._nBytes += nBytes
+        while self._nBytes > self.maxBytes:
+            _, evicted = self._shards.popitem(last=False)
+            self._nBytes -= self._sizeOf(evicted)
+            self.nEvictions += 1
+
+    def pop(self, key):
+        """Remove a shard from the cache, if present.
+
+        Parameters
+        ----------
+        key : `tuple`
+            Key identifying the shard.
+        """
+        if key in self._shards:
+            self._nBytes -= self._sizeOf(self._shards.pop(key))
+
+    def clear(self):
+        """Remove all shards from the cache.
+        """
+        self._shards.clear()
+        self._nBytes = 0
+
+
+class SharedShardCache:
+    """A size-bounded cache of reference catalog shard files in a directory
+    shared by the processes on a node.
+
+    The directory should be node-local and memory-backed, e.g. under
+    ``/dev/shm``, so that the cached files live in POSIX shared memory: a
+    shard is then read from the shared filesystem once per node, however
+    many processes load it. Processes coordinate only through the
+    filesystem, without locks: a file is copied into the cache under a
+    temporary name and atomically renamed, so readers never see a partial
+    file, and a file removed by another process's eviction is simply read
+    from its source instead.
+
+    Cached files are named by a hash of the path, size and modification
+    time of their source file, so a rewritten shard is not read from a
+    stale copy. The least recently used files are evicted when the total
+    size of the cache exceeds its budget.
+
+    It may be used by several threads at once; its hit, miss and eviction
+    counts are updated under a lock.
+
+    Parameters
+    ----------
+    directory : `str`
+        Directory in which to keep cached files; it is created if needed.
+    maxBytes : `int`
+        Approximate maximum total size of the cached files (bytes).
+    """
+    def __init__(self, directory, maxBytes):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.nHits = 0
+        self.nMisses = 0
+        self.nEvictions = 0
+        # guards the counts, which threads reading through the cache update
+        self._countLock = threading.Lock()
+
+    def _count(self, name):
+        """Increment one of the hit, miss and eviction counts.
+        """
+        with self._countLock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _getCachePath(self, sourcePath):
+        """Return the path at which a file is cached.
+        """
+        stat = os.stat(sourcePath)
+        key = "%s:%d:%d" % (os.path.realpath(sourcePath), stat.st_size, stat.st_mtime_ns)
+        extension = os.path.splitext(sourcePath)[1]
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + extension)
+
+    def getPath(self, sourcePath):
+        """Return the path of a cached copy of a file, copying it into the
+        cache first if it is not there.
+
+        Parameters
+        ----------
+        sourcePath : `str`
+            Path of the file.
+
+        Returns
+        -------
+        path : `str`
+            Path of the cached copy. Another process may evict it at any
+            time.
+        """
+        path = self._getCachePath(sourcePath)
+        try:
+            # mark the file as recently used
+            os.utime(path)
+            self._count("nHits")
+            return path
+        except FileNotFoundError:
+            pass
+        self._count("nMisses")
+        fd, tmpPath = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as dst, open(sourcePath, "rb") as src:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmpPath, path)
+        except BaseException:
+            try:
+                os.unlink(tmpPath)
+            except FileNotFoundError:
+                pass
+            raise
+        self._evict(keep=path)
+        return path
+
+    def read(self, sourcePath, reader):
+        """Read a file through the cache.
+
+        Parameters
+        ----------
+        sourcePath : `str`
+            Path of the file.
+        reader : callable
+            Function that reads a file given its path, e.g.
+            `lsst.afw.table.SimpleCatalog.readFits`.
+
+        Returns
+        -------
+        result
+            The value returned by ``reader``.
+        """
+        path = self.getPath(sourcePath)
+        try:
+            return reader(path)
+        except Exception:
+            if os.path.exists(path):
+                raise
+            # another process evicted the copy before it could be read
+            return reader(sourcePath)
+
+    def _evict(self, keep=None):
+        """Remove the least recently used files until the cache is within
+        its budget.
+
+        Parameters
+        ----------
+        keep : `str`, optional
+            Path of a file not to remove, e.g. one that is about to be read.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(".tmp-") or entry.path == keep:
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        nBytes = sum(size for _, size, _ in entries)
+        if keep is not None:
+            try:
+                nBytes += os.stat(keep).st_size
+            except FileNotFoundError:
+                pass
+        for _, size, path in sorted(entries):
+            if nBytes <= self.maxBytes:
+                break
+            try:
+                os.unlink(path)
+                self._count("nEvictions")
+            except FileNotFoundError:
+                # another process evicted it first
+                pass
+            nBytes -= size
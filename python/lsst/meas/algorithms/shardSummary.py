@@ -0,0 +1,240 @@
+# This file is part of meas_algorithms.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["ShardSummary"]
+
+import numpy as np
+
+import lsst.afw.table as afwTable
+import lsst.pipe.base as pipeBase
+from lsst import sphgeom
+
+# Padding (radians) added to the radius of the bounding cap of each shard,
+# so that rounding errors cannot leave a row outside it.
+_CAP_PADDING = 1e-10
+
+
+class ShardSummary:
+    """Summary statistics of the shards of an indexed reference catalog,
+    which let loaders skip shards without reading them.
+
+    For each shard the summary holds the number of rows, a cap on the sky
+    that contains every row, the range of each flux field and the range of
+    epochs. It is persisted as a catalog with one record per shard, whose
+    ``id`` is the shard ID; see `makeCatalog`.
+
+    Parameters
+    ----------
+    entries : `dict`, optional
+        Statistics of each shard, as returned by `summarize`, by shard ID.
+    """
+    def __init__(self, entries=None):
+        self._entries = dict(entries) if entries is not None else {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, shardId):
+        return shardId in self._entries
+
+    @staticmethod
+    def summarize(catalog):
+        """Compute the statistics of one shard.
+
+        Parameters
+        ----------
+        catalog : `lsst.afw.table.SimpleCatalog`
+            The shard.
+
+        Returns
+        -------
+        entry : `dict`
+            The statistics of the shard, by the name of the summary field:
+            ``n_rows``, ``coord_ra`` and ``coord_dec`` (center of the
+            bounding cap, radians), ``cap_radius`` (radians), ``epoch_min``
+            and ``epoch_max`` (MJD, or NaN if there is no ``epoch`` field),
+            and ``<name>_min`` and ``<name>_max`` for each flux field
+            ``<name>``. A flux minimum is NaN if any row has a NaN flux, and
+            a flux maximum is NaN only if all rows do.
+        """
+        if not catalog.isContiguous():
+            catalog = catalog.copy(deep=True)
+        entry = dict(n_rows=len(catalog), coord_ra=0.0, coord_dec=0.0, cap_radius=0.0,
+                     epoch_min=np.nan, epoch_max=np.nan)
+        fluxNames = [name for name in catalog.schema.getNames() if name.endswith("_flux")]
+        for name in fluxNames:
+            entry[name + "_min"] = np.nan
+            entry[name + "_max"] = np.nan
+        if len(catalog) == 0:
+            return entry
+
+        coordKey = afwTable.CoordKey(catalog.schema["coord"])
+        ra = catalog[coordKey.getRa()]
+        dec = catalog[coordKey.getDec()]
+        cosDec = np.cos(dec)
+        vectors = np.column_stack((cosDec*np.cos(ra), cosDec*np.sin(ra), np.sin(dec)))
+        center = vectors.sum(axis=0)
+        norm = np.sqrt(np.dot(center, center))
+        center = center/norm if norm > 0 else vectors[0]
+        # the angle subtended by a chord is precise for small separations
+        chord = np.sqrt(np.max(np.sum((vectors - center)**2, axis=1)))
+        entry["coord_ra"] = np.arctan2(center[1], center[0]) % (2*np.pi)
+        entry["coord_dec"] = np.arctan2(center[2], np.hypot(center[0], center[1]))
+        entry["cap_radius"] = 2*np.arcsin(min(0.5*chord, 1.0)) + _CAP_PADDING
+
+        if "epoch" in catalog.schema:
+            epoch = catalog["epoch"]
+            if np.any(np.isfinite(epoch)):
+                entry["epoch_min"] = np.nanmin(epoch)
+                entry["epoch_max"] = np.nanmax(epoch)
+        for name in fluxNames:
+            flux = catalog[name]
+            entry[name + "_min"] = np.min(flux)
+            if np.any(np.isfinite(flux)):
+                entry[name + "_max"] = np.nanmax(flux)
+        return {key: value if isinstance(value, int) else float(value) for key, value in entry.items()}
+
+    def update(self, shardId, catalog):
+        """Compute and record the statistics of one shard.
+
+        Parameters
+        ----------
+        shardId : `int`
+            ID of the shard.
+        catalog : `lsst.afw.table.SimpleCatalog`
+            The shard.
+        """
+        self._entries[shardId] = self.summarize(catalog)
+
+    def set(self, shardId, entry):
+        """Record the statistics of one shard.
+
+        Parameters
+        ----------
+        shardId : `int`
+            ID of the shard.
+        entry : `dict`
+            The statistics of the shard, as returned by `summarize`.
+        """
+        self._entries[shardId] = entry
+
+    def getNRows(self, shardId):
+        """Return the number of rows of a shard, or `None` if the shard is
+        not in the summary.
+        """
+        entry = self._entries.get(shardId)
+        return None if entry is None else entry["n_rows"]
+
+    def get(self, shardId):
+        """Get the statistics of one shard.
+
+        Parameters
+        ----------
+        shardId : `int`
+            ID of the shard.
+
+        Returns
+        -------
+        summary : `lsst.pipe.base.Struct` or `None`
+            `None` if the shard is not in the summary, else a struct
+            containing:
+
+            - ``nRows`` : number of rows in the shard (`int`).
+            - ``cap`` : cap that contains every row (`lsst.sphgeom.Circle`).
+            - ``fluxMin`` : minimum of each flux field, by field name
+              (`dict` of `float`).
+            - ``fluxMax`` : maximum of each flux field, by field name
+              (`dict` of `float`).
+            - ``epochMin``, ``epochMax`` : range of epochs (MJD) (`float`).
+        """
+        entry = self._entries.get(shardId)
+        if entry is None:
+            return None
+        center = sphgeom.UnitVector3d(sphgeom.LonLat.fromRadians(entry["coord_ra"], entry["coord_dec"]))
+        fluxMin = {}
+        fluxMax = {}
+        for key, value in entry.items():
+            if key.endswith("_flux_min"):
+                fluxMin[key[:-len("_min")]] = value
+            elif key.endswith("_flux_max"):
+                fluxMax[key[:-len("_max")]] = value
+        return pipeBase.Struct(
+            nRows=entry["n_rows"],
+            cap=sphgeom.Circle(center, sphgeom.Angle(entry["cap_radius"])),
+            fluxMin=fluxMin,
+            fluxMax=fluxMax,
+            epochMin=entry["epoch_min"],
+            epochMax=entry["epoch_max"],
+        )
+
+    def makeCatalog(self):
+        """Make a catalog holding the summary, to be persisted.
+
+        Returns
+        -------
+        catalog : `lsst.afw.table.SimpleCatalog`
+            Catalog with one record per shard, sorted by shard ID. Flux
+            ranges are in fields ``<name>_min`` and ``<name>_max``, which
+            deliberately do not look like flux fields.
+        """
+        schema = afwTable.SimpleTable.makeMinimalSchema()
+        schema.addField("n_rows", type=np.int64, doc="number of rows in the shard")
+        schema.addField("cap_radius", type=np.float64, units="rad",
+                        doc="radius of a cap centered on coord that contains every row of the shard")
+        schema.addField("epoch_min", type=np.float64, units="day", doc="minimum epoch (MJD TAI)")
+        schema.addField("epoch_max", type=np.float64, units="day", doc="maximum epoch (MJD TAI)")
+        fluxNames = sorted(set(key[:-len("_min")] for entry in self._entries.values() for key in entry
+                               if key.endswith("_flux_min")))
+        for name in fluxNames:
+            schema.addField(name + "_min", type=np.float64, units="nJy", doc="minimum of %s" % (name,))
+            schema.addField(name + "_max", type=np.float64, units="nJy", doc="maximum of %s" % (name,))
+        catalog = afwTable.SimpleCatalog(schema)
+        shardIds = sorted(self._entries)
+        catalog.resize(len(shardIds))
+        catalog["id"] = np.array(shardIds, dtype=np.int64)
+        for key in schema.getNames():
+            if key != "id":
+                values = [self._entries[shardId].get(key, np.nan) for shardId in shardIds]
+                catalog[key] = np.array(values, dtype=np.int64 if key == "n_rows" else np.float64)
+        return catalog
+
+    @classmethod
+    def fromCatalog(cls, catalog):
+        """Construct a summary from a catalog made by `makeCatalog`.
+
+        Parameters
+        ----------
+        catalog : `lsst.afw.table.SimpleCatalog`
+            The persisted summary.
+
+        Returns
+        -------
+        summary : `ShardSummary`
+            The summary.
+        """
+        if not catalog.isContiguous():
+            catalog = catalog.copy(deep=True)
+        columns = {key: catalog[key] for key in catalog.schema.getNames() if key != "id"}
+        entries = {}
+        for i, shardId in enumerate(catalog["id"].tolist()):
+            entries[shardId] = {key: int(values[i]) if key == "n_rows" else float(values[i])
+                                for key, values in columns.items()}
+        return cls(entries)
@@ -26,7 +26,9 @@ import os
 import tempfile
 import shutil
 import unittest
+import unittest.mock
 import string
+import types
 from collections import Counter
 
 import astropy.time
@@ -37,11 +39,23 @@ import lsst.afw.table as afwTable
 import lsst.afw.geom as afwGeom
 import lsst.daf.persistence as dafPersist
 from lsst.meas.algorithms import (IngestIndexedReferenceTask, LoadIndexedReferenceObjectsTask,
-                                  LoadIndexedReferenceObjectsConfig, getRefFluxField)
+                                  LoadIndexedReferenceObjectsConfig, getRefFluxField,
+                                  LoadReferenceObjectsConfig, ReferenceObjectLoader)
 from lsst.meas.algorithms import IndexerRegistry
-from lsst.meas.algorithms.loadReferenceObjects import hasNanojanskyFluxUnits
+from lsst.meas.algorithms.htmIndexer import HtmIndexer, AdaptiveHtmIndexer
+from lsst.meas.algorithms.shardCache import ShardCache, SharedShardCache
+from lsst.meas.algorithms.idIndex import IdIndex, PartitionedIdIndex
+from lsst.meas.algorithms.columnarShard import getColumnarPath, readColumnarShard, writeColumnarShard
+from lsst.meas.algorithms.loadReferenceObjects import (hasNanojanskyFluxUnits, _FilterCatalog,
+                                                       _getSortFluxName)
+from lsst import sphgeom
 import lsst.utils
 
+try:
+    import healpy
+except ImportError:
+    healpy = None
+
 OBS_TEST_DIR = lsst.utils.getPackageDir('obs_test')
 INPUT_DIR = os.path.join(OBS_TEST_DIR, "data", "input")
 
@@ -149,6 +163,8 @@ class HtmIndexTestCase(lsst.utils.tests.TestCase):
         config.dataset_config.indexer.active.depth = cls.depth
         config.id_name = 'id'
         config.pm_scale = 1000.0  # arcsec/yr --> mas/yr
+        config.write_id_index = True
+        config.id_index_partition_rows = 100
         IngestIndexedReferenceTask.parseAndRun(args=[INPUT_DIR, "--output", cls.testRepoPath,
                                                      cls.skyCatalogFile], config=config)
         cls.defaultDatasetName = config.dataset_config.ref_dataset_name
@@ -387,6 +403,124 @@ class HtmIndexTestCase(lsst.utils.tests.TestCase):
         self.assertTrue(len(cat) > 0)
         self.assertTrue(cat.isContiguous())
 
+    def testIngestBuffered(self):
+        """Test that buffering shards gives the same shards as the default
+        read-modify-write ingest, including when buffers are spilled.
+        """
+        config = self.makeConfig(withRaDecErr=True, withMagErr=True, withPm=True, withPmErr=True)
+        config.dataset_config.indexer.active.depth = self.depth
+        args = [self.skyCatalogFile, self.skyCatalogFile]
+        IngestIndexedReferenceTask.parseAndRun(
+            args=[INPUT_DIR, "--output", self.outPath+"/output_unbuffered"] + args, config=config)
+        config.buffer_shards = True
+        # a tiny budget forces rows to be spilled to disk
+        config.shard_buffer_size = 0.01
+        IngestIndexedReferenceTask.parseAndRun(
+            args=[INPUT_DIR, "--output", self.outPath+"/output_buffered"] + args, config=config)
+
+        self.assertShardsEqual(self.outPath+"/output_buffered", self.outPath+"/output_unbuffered",
+                               config.dataset_config.ref_dataset_name)
+
+    def testIngestParallel(self):
+        """Test that ingesting with several processes gives the same shards,
+        including automatically generated ids, as ingesting with one.
+        """
+        config = self.makeConfig(withRaDecErr=True, withMagErr=True, withPm=True, withPmErr=True)
+        config.dataset_config.indexer.active.depth = self.depth
+        # read the files in several chunks each
+        config.file_reader.chunk_size = 300
+        args = [self.skyCatalogFile]*3
+        IngestIndexedReferenceTask.parseAndRun(
+            args=[INPUT_DIR, "--output", self.outPath+"/output_serial"] + args, config=config)
+        config.n_processes = 2
+        IngestIndexedReferenceTask.parseAndRun(
+            args=[INPUT_DIR, "--output", self.outPath+"/output_parallel"] + args, config=config)
+        self.assertShardsEqual(self.outPath+"/output_parallel", self.outPath+"/output_serial",
+                               config.dataset_config.ref_dataset_name)
+
+    def testIngestResume(self):
+        """Test that rerunning an interrupted ingest resumes it, giving the
+        same shards as an uninterrupted ingest, and that rerunning a
+        completed ingest does not add rows again.
+        """
+        config = self.makeConfig(withRaDecErr=True, withMagErr=True, withPm=True, withPmErr=True)
+        config.dataset_config.indexer.active.depth = self.depth
+        config.file_reader.chunk_size = 300
+        args = [self.skyCatalogFile]*3
+        IngestIndexedReferenceTask.parseAndRun(
+            args=[INPUT_DIR, "--output", self.outPath+"/output_uninterrupted"] + args, config=config)
+
+        ingestChunk = IngestIndexedReferenceTask._ingestChunk
+        nCalls = []
+
+        def interruptedIngestChunk(task, *args, **kwargs):
+            """Ingest a chunk, then fail part way through the second file."""
+            result = ingestChunk(task, *args, **kwargs)
+            nCalls.append(1)
+            if len(nCalls) == 6:
+                raise RuntimeError("Interrupted")
+            return result
+
+        resumedPath = self.outPath+"/output_resumed"
+        with unittest.mock.patch.object(IngestIndexedReferenceTask, "_ingestChunk", interruptedIngestChunk):
+            with self.assertRaises(RuntimeError):
+                IngestIndexedReferenceTask.parseAndRun(
+                    args=[INPUT_DIR, "--output", resumedPath] + args, config=config)
+        IngestIndexedReferenceTask.parseAndRun(args=[INPUT_DIR, "--output", resumedPath] + args,
+                                               config=config)
+        self.assertShardsEqual(resumedPath, self.outPath+"/output_uninterrupted",
+                               config.dataset_config.ref_dataset_name)
+
+        IngestIndexedReferenceTask.parseAndRun(args=[INPUT_DIR, "--output", resumedPath] + args,
+                                               config=config)
+        self.assertShardsEqual(resumedPath, self.outPath+"/output_uninterrupted",
+                               config.dataset_config.ref_dataset_name)
+
+        # the files must start with those already ingested
+        with self.assertRaises(RuntimeError):
+            IngestIndexedReferenceTask.parseAndRun(
+                args=[INPUT_DIR, "--output", resumedPath, self.skyCatalogFileDelim], config=config)
+
+        # files can be added to a catalog that was ingested without a
+        # checkpoint, and are ingested without one
+        noCheckpointPath = self.outPath+"/output_no_checkpoint"
+        for checkpoint in (False, True):
+            config = self.makeConfig(withRaDecErr=True, withMagErr=True, withPm=True, withPmErr=True)
+            config.dataset_config.indexer.active.depth = self.depth
+            config.checkpoint = checkpoint
+            IngestIndexedReferenceTask.parseAndRun(
+                args=[INPUT_DIR, "--output", noCheckpointPath, self.skyCatalogFile], config=config)
+        butler = dafPersist.Butler(noCheckpointPath)
+        datasetName = config.dataset_config.ref_dataset_name
+        self.assertFalse(butler.datasetExists('ref_cat',
+                                              dataId=self.indexer.makeDataId('ingest_manifest', datasetName)))
+        shardId = self.indexer.indexPoints(self.skyCatalog['ra_icrs'][:1], self.skyCatalog['dec_icrs'][:1])[0]
+        expected = self.testButler.get('ref_cat', dataId=self.indexer.makeDataId(shardId,
+                                                                                   self.defaultDatasetName))
+        shard = butler.get('ref_cat', dataId=self.indexer.makeDataId(shardId, datasetName))
+        self.assertEqual(len(shard), 2*len(expected))
+
+    def assertShardsEqual(self, path1, path2, datasetName):
+        """Assert that all shards of the sky catalog in two repositories
+        have the same rows, in the same order.
+        """
+        butler1 = dafPersist.Butler(path1)
+        butler2 = dafPersist.Butler(path2)
+        shardIds = set(self.indexer.indexPoints(self.skyCatalog['ra_icrs'], self.skyCatalog['dec_icrs']))
+        for shardId in shardIds:
+            dataId = self.indexer.makeDataId(shardId, datasetName)
+            cat1 = butler1.get('ref_cat', dataId=dataId)
+            cat2 = butler2.get('ref_cat', dataId=dataId)
+            self.assertEqual(len(cat1), len(cat2))
+            for name in ("id", "coord_ra", "coord_dec", "a_flux", "b_fluxErr", "pm_ra", "epoch"):
+                self.assertFloatsEqual(cat1[name], cat2[name])
+        summaryId = self.indexer.makeDataId('shard_summary', datasetName)
+        summary1 = butler1.get('ref_cat', dataId=summaryId)
+        summary2 = butler2.get('ref_cat', dataId=summaryId)
+        self.assertEqual(summary1.schema.getNames(), summary2.schema.getNames())
+        for name in summary1.schema.getNames():
+            self.assertFloatsEqual(summary1[name], summary2[name], ignoreNaNs=True)
+
     def testLoadIndexedReferenceConfig(self):
         """Make sure LoadIndexedReferenceConfig has needed fields."""
         """
@@ -479,6 +613,724 @@ class HtmIndexTestCase(lsst.utils.tests.TestCase):
         self.assertFloatsAlmostEqual(references["coord_raErr"], predictedRaErr)
         self.assertFloatsAlmostEqual(references["coord_decErr"], predictedDecErr)
 
+    def testShardCache(self):
+        """Test that repeated loads are served from the shard cache, and
+        that applying proper motion does not modify cached shards.
+        """
+        center = make_coord(93.0, -30.1)
+        epoch = self.epoch + 1.0*astropy.units.yr
+        uncachedConfig = LoadIndexedReferenceObjectsConfig()
+        uncachedConfig.shard_cache_size = 0
+        uncachedLoader = LoadIndexedReferenceObjectsTask(butler=self.testButler, config=uncachedConfig)
+        expected = uncachedLoader.loadSkyCircle(center, self.searchRadius, filterName='a', epoch=epoch)
+        self.assertEqual(uncachedLoader.metadata.getScalar("shardCacheHits"), 0)
+
+        # read every overlapping shard
+        config = LoadIndexedReferenceObjectsConfig()
+        config.use_shard_summary = False
+        loader = LoadIndexedReferenceObjectsTask(butler=self.testButler, config=config)
+        for i in range(2):
+            result = loader.loadSkyCircle(center, self.searchRadius, filterName='a', epoch=epoch)
+            self.assertEqual(len(result.refCat), len(expected.refCat))
+            for name in ("id", "coord_ra", "coord_dec", "a_flux"):
+                self.assertFloatsEqual(result.refCat[name], expected.refCat[name])
+        # the master schema is read once, and held by the loader
+        nShards = len(self.indexer.getShardIds(center, self.searchRadius)[0])
+        self.assertEqual(loader.metadata.getScalar("shardCacheMisses"), nShards + 1)
+        self.assertEqual(loader.metadata.getScalar("shardCacheHits"), nShards)
+        self.assertEqual(loader.metadata.getScalar("shardCacheEvictions"), 0)
+
+    def testOutputTemplate(self):
+        """Test that the master schema and the schema of the loaded catalog
+        are made once per loader, and that loaded catalogs do not share
+        their aliases.
+        """
+        center = make_coord(93.0, -30.1)
+        config = LoadIndexedReferenceObjectsConfig()
+        config.shard_cache_size = 0
+        config.use_shard_summary = False
+        config.defaultFilter = "b"
+        loader = LoadIndexedReferenceObjectsTask(butler=self.testButler, config=config)
+        results = [loader.loadSkyCircle(center, self.searchRadius, filterName=filterName)
+                   for filterName in ('a', 'a', None, '')]
+        nShards = len(self.indexer.getShardIds(center, self.searchRadius)[0])
+        self.assertEqual(loader.metadata.getScalar("shardCacheMisses"), 4*nShards + 1)
+        self.assertEqual(len(loader._outputTemplates), 2)
+        self.assertEqual(results[0].fluxField, "a_flux")
+        self.assertEqual(results[2].fluxField, "camFlux")
+        self.assertEqual(results[0].refCat.schema, results[1].refCat.schema)
+        self.assertEqual(list(results[0].refCat["id"]), list(results[1].refCat["id"]))
+
+        results[0].refCat.schema.getAliasMap().set("test_alias", "a_flux")
+        self.assertNotIn("test_alias", results[1].refCat.schema.getAliasMap().keys())
+        result = loader.loadSkyCircle(center, self.searchRadius, filterName='a')
+        self.assertNotIn("test_alias", result.refCat.schema.getAliasMap().keys())
+        self.assertNotIn("camFlux", loader._getMasterSchema()[0].schema.getAliasMap().keys())
+
+    def testSharedCache(self):
+        """Test that loaders sharing a cache directory read each shard from
+        the repository once, and that the cache stays within its budget.
+        """
+        config = LoadIndexedReferenceObjectsConfig()
+        config.shared_cache_dir = os.path.join(self.outPath, "shared_cache")
+        cent = make_coord(93.0, -30.1)
+        expected = LoadIndexedReferenceObjectsTask(butler=self.testButler).loadSkyCircle(
+            cent, self.searchRadius, filterName='a')
+        loaders = [LoadIndexedReferenceObjectsTask(butler=self.testButler, config=config) for _ in range(2)]
+        for loader in loaders:
+            result = loader.loadSkyCircle(cent, self.searchRadius, filterName='a')
+            self.assertEqual(list(result.refCat["id"]), list(expected.refCat["id"]))
+        nMisses = loaders[0].metadata.getScalar("sharedCacheMisses")
+        self.assertGreater(nMisses, 0)
+        self.assertEqual(loaders[0].metadata.getScalar("sharedCacheHits"), 0)
+        self.assertEqual(loaders[1].metadata.getScalar("sharedCacheMisses"), 0)
+        self.assertEqual(loaders[1].metadata.getScalar("sharedCacheHits"), nMisses)
+        self.assertEqual(len(os.listdir(config.shared_cache_dir)), nMisses)
+
+        shardIds = sorted(set(self.indexer.indexPoints(self.skyCatalog['ra_icrs'],
+                                                       self.skyCatalog['dec_icrs'])))[:3]
+        paths = [self.testButler.get('ref_cat_filename',
+                                     dataId=self.indexer.makeDataId(shardId, self.defaultDatasetName))[0]
+                 for shardId in shardIds]
+        cache = SharedShardCache(os.path.join(self.outPath, "small_shared_cache"),
+                                 max(os.stat(path).st_size for path in paths))
+        for path in paths:
+            cachePath = cache.getPath(path)
+            self.assertEqual(os.listdir(cache.directory), [os.path.basename(cachePath)])
+            refCat = cache.read(path, afwTable.SimpleCatalog.readFits)
+            self.assertEqual(list(refCat["id"]), list(afwTable.SimpleCatalog.readFits(path)["id"]))
+        self.assertEqual(cache.nEvictions, len(paths) - 1)
+        self.assertEqual(cache.nHits, len(paths))
+
+    def testPrefetch(self):
+        """Test that prefetching a pixel box gives the same result as
+        loading it.
+        """
+        bbox = lsst.geom.Box2I(lsst.geom.Point2I(30, -5), lsst.geom.Extent2I(1000, 1004))
+        pixelScale = 2*self.searchRadius/max(bbox.getHeight(), bbox.getWidth())
+        cdMatrix = afwGeom.makeCdMatrix(scale=pixelScale)
+        wcsList = [afwGeom.makeSkyWcs(crval=make_coord(*tupl), crpix=lsst.geom.Box2D(bbox).getCenter(),
+                                      cdMatrix=cdMatrix) for tupl in ((93.0, -30.1), (14.5, 27.3))]
+        expected = [LoadIndexedReferenceObjectsTask(butler=self.testButler).loadPixelBox(bbox, wcs,
+                                                                                         filterName='a')
+                    for wcs in wcsList]
+        loader = LoadIndexedReferenceObjectsTask(butler=self.testButler)
+        futures = [loader.prefetchPixelBox(bbox, wcs, filterName='a') for wcs in wcsList]
+        for future, exp in zip(futures, expected):
+            result = future.result()
+            self.assertTrue(future.done())
+            self.assertIs(future.result(), result)
+            self.assertEqual(result.fluxField, exp.fluxField)
+            self.assertGreater(len(result.refCat), 0)
+            self.assertEqual(list(result.refCat["id"]), list(exp.refCat["id"]))
+        self.assertEqual(loader._prefetched, {})
+
+        # the master schema is read before the background reads start, and
+        # the shared cache counts every read made by the fetch threads
+        config = LoadIndexedReferenceObjectsConfig()
+        config.shared_cache_dir = os.path.join(self.outPath, "prefetch_shared_cache")
+        config.nFetchThreads = 4
+        loader = LoadIndexedReferenceObjectsTask(butler=self.testButler, config=config)
+        future = loader.prefetchPixelBox(bbox, wcsList[0], filterName='a')
+        self.assertIsNotNone(loader._masterSchema)
+        result = future.result()
+        self.assertEqual(list(result.refCat["id"]), list(expected[0].refCat["id"]))
+        self.assertEqual(loader.sharedCache.nHits, 0)
+        self.assertEqual(loader.sharedCache.nMisses, len(os.listdir(config.shared_cache_dir)))
+
+    def testConcurrentFetch(self):
+        """Test that reading shards with several threads gives the same
+        catalogs, in the same order, as reading them one at a time.
+        """
+        config = LoadIndexedReferenceObjectsConfig()
+        config.shard_cache_size = 0
+        serialLoader = LoadIndexedReferenceObjectsTask(butler=self.testButler, config=config)
+        config.nFetchThreads = 4
+        loader = LoadIndexedReferenceObjectsTask(butler=self.testButler, config=config)
+        center = make_coord(93.0, -30.1)
+        shardIds = self.indexer.getShardIds(center, self.searchRadius)[0]
+        shards = loader.getShards(shardIds)
+        self.assertEqual(len(shards), len(shardIds))
+        for shard, expected in zip(shards, serialLoader.getShards(shardIds)):
+            if expected is None:
+                self.assertIsNone(shard)
+            else:
+                self.assertEqual(list(shard["id"]), list(expected["id"]))
+        self.assertGreater(loader.metadata.getScalar("shardFetchMaxInFlight"), 0)
+        self.assertLessEqual(loader.metadata.getScalar("shardFetchMaxInFlight"), 4)
+        self.assertGreaterEqual(loader.metadata.getScalar("shardFetchWaitTime"), 0)
+
+        result = loader.loadSkyCircle(center, self.searchRadius, filterName='a')
+        expected = serialLoader.loadSkyCircle(center, self.searchRadius, filterName='a')
+        self.assertEqual(list(result.refCat["id"]), list(expected.refCat["id"]))
+
+    def testLoadColumns(self):
+        """Test loading only the required reference catalog columns."""
+        center = make_coord(93.0, -30.1)
+        loader = LoadIndexedReferenceObjectsTask(butler=self.testButler)
+        full = loader.loadSkyCircle(center, self.searchRadius, filterName='a').refCat
+        self.assertIn("b_flux", full.schema)
+
+        config = LoadIndexedReferenceObjectsConfig()
+        config.onlyRequiredColumns = True
+        loader = LoadIndexedReferenceObjectsTask(butler=self.testButler, config=config)
+        result = loader.loadSkyCircle(center, self.searchRadius, filterName='a')
+        self.assertEqual(result.fluxField, "a_flux")
+        self.assertTrue(result.refCat.isContiguous())
+        self.assertNotIn("b_flux", result.refCat.schema)
+        self.assertNotIn("b_fluxErr", result.refCat.schema)
+        for name in ("id", "coord_ra", "coord_dec", "coord_raErr", "a_flux", "a_fluxErr", "pm_ra", "epoch",
+                     "centroid_x", "hasCentroid"):
+            self.assertIn(name, result.refCat.schema)
+        for name in ("id", "coord_ra", "coord_dec", "a_flux", "pm_ra"):
+            self.assertFloatsEqual(result.refCat[name], full[name])
+
+        # extra columns and the flux fields of the default filter are kept
+        result = loader.loadSkyCircle(center, self.searchRadius, filterName='a', columns=["b_fluxErr"])
+        self.assertIn("b_fluxErr", result.refCat.schema)
+        self.assertNotIn("b_flux", result.refCat.schema)
+
+        with self.assertRaises(RuntimeError):
+            loader.loadSkyCircle(center, self.searchRadius, filterName='a', columns=["not_a_column"])
+
+        config.defaultFilter = "b"
+        loader = LoadIndexedReferenceObjectsTask(butler=self.testButler, config=config)
+        result = loader.loadSkyCircle(center, self.searchRadius, filterName='a')
+        self.assertIn("b_flux", result.refCat.schema)
+
+    def testLoadRegions(self):
+        """Test that loading several regions at once reads each reference
+        catalog once, and gives the same catalogs as loading each region.
+        """
+        testButler = self.testButler
+
+        class CountingButler:
+            """Gen3-like butler that reads from the test repository."""
+            nGets = 0
+
+            def get(self, datasetType, dataId):
+                self.nGets += 1
+                return testButler.get('ref_cat', dataId=dataId.dataId)
+
+        pixelization = sphgeom.HtmPixelization(self.depth)
+        shardIds = set(self.indexer.indexPoints(self.skyCatalog['ra_icrs'], self.skyCatalog['dec_icrs']))
+        dataIds = [types.SimpleNamespace(region=pixelization.triangle(shardId),
+                                         dataId=self.indexer.makeDataId(shardId, self.defaultDatasetName))
+                   for shardId in sorted(shardIds)]
+        butler = CountingButler()
+        loader = ReferenceObjectLoader(dataIds, butler, LoadReferenceObjectsConfig())
+
+        centers = [make_coord(93.0, -30.1), make_coord(94.0, -30.1), make_coord(93.5, -31.0)]
+        regions = [sphgeom.Circle(center.getVector(), sphgeom.Angle(self.searchRadius.asRadians()))
+                   for center in centers]
+        expected = [loader.loadRegion(region, filterName='a') for region in regions]
+        nSeparateGets = butler.nGets
+
+        butler.nGets = 0
+        results = loader.loadRegions(regions, filterName='a')
+        self.assertEqual(len(results), len(regions))
+        self.assertLess(butler.nGets, nSeparateGets)
+        for result, exp in zip(results, expected):
+            self.assertTrue(result.refCat.isContiguous())
+            self.assertEqual(result.fluxField, exp.fluxField)
+            for name in ("id", "coord_ra", "coord_dec", "a_flux"):
+                self.assertFloatsEqual(result.refCat[name], exp.refCat[name])
+
+        # the shard summary lets the loader skip and avoid trimming catalogs
+        shardSummary = LoadIndexedReferenceObjectsTask(butler=self.testButler).getShardSummary()
+        summaryLoader = ReferenceObjectLoader(dataIds, butler, LoadReferenceObjectsConfig(),
+                                              shardSummaries=[shardSummary.get(shardId)
+                                                              for shardId in sorted(shardIds)])
+        for result, exp in zip(summaryLoader.loadRegions(regions, filterName='a'), expected):
+            self.assertEqual(list(result.refCat["id"]), list(exp.refCat["id"]))
+
+        bbox = lsst.geom.Box2I(lsst.geom.Point2I(30, -5), lsst.geom.Extent2I(1000, 1004))
+        pixelScale = 2*self.searchRadius/max(bbox.getHeight(), bbox.getWidth())
+        cdMatrix = afwGeom.makeCdMatrix(scale=pixelScale)
+        boxes = [(bbox, afwGeom.makeSkyWcs(crval=center, crpix=lsst.geom.Box2D(bbox).getCenter(),
+                                           cdMatrix=cdMatrix)) for center in centers]
+        results = loader.loadPixelBoxes(boxes, filterName='a')
+        futures = [loader.prefetchPixelBox(bbox, wcs, filterName='a') for bbox, wcs in boxes]
+        for result, future, (bbox, wcs) in zip(results, futures, boxes):
+            exp = loader.loadPixelBox(bbox, wcs, filterName='a')
+            self.assertGreater(len(result.refCat), 0)
+            self.assertEqual(list(result.refCat["id"]), list(exp.refCat["id"]))
+            self.assertEqual(list(future.result().refCat["id"]), list(exp.refCat["id"]))
+
+    def testShardSummary(self):
+        """Test the shard summary written by the ingest, and that loading
+        with it gives the same objects as loading without it.
+        """
+        loader = LoadIndexedReferenceObjectsTask(butler=self.testButler)
+        shardSummary = loader.getShardSummary()
+        shardIds = set(self.indexer.indexPoints(self.skyCatalog['ra_icrs'], self.skyCatalog['dec_icrs']))
+        self.assertEqual(len(shardSummary), len(shardIds))
+        for shardId in shardIds:
+            shard = self.testButler.get('ref_cat', dataId=self.indexer.makeDataId(shardId,
+                                                                                  self.defaultDatasetName))
+            summary = shardSummary.get(shardId)
+            self.assertEqual(summary.nRows, len(shard))
+            for record in shard:
+                self.assertTrue(summary.cap.contains(record.getCoord().getVector()))
+            self.assertEqual(summary.fluxMin["a_flux"], np.min(shard["a_flux"]))
+            self.assertEqual(summary.fluxMax["b_flux"], np.max(shard["b_flux"]))
+            self.assertEqual(summary.epochMin, np.min(shard["epoch"]))
+            self.assertEqual(summary.epochMax, np.max(shard["epoch"]))
+
+        for magLimit in (None, 16.5):
+            config = LoadIndexedReferenceObjectsConfig()
+            config.magLimit = magLimit
+            loader = LoadIndexedReferenceObjectsTask(butler=self.testButler, config=config)
+            config = LoadIndexedReferenceObjectsConfig()
+            config.magLimit = magLimit
+            config.use_shard_summary = False
+            noSummaryLoader = LoadIndexedReferenceObjectsTask(butler=self.testButler, config=config)
+            for tupl, idList in self.compCats.items():
+                cent = make_coord(*tupl)
+                result = loader.loadSkyCircle(cent, self.searchRadius, filterName='a')
+                expected = noSummaryLoader.loadSkyCircle(cent, self.searchRadius, filterName='a')
+                self.assertEqual(list(result.refCat["id"]), list(expected.refCat["id"]))
+                if magLimit is None:
+                    self.assertEqual(Counter(result.refCat["id"]), Counter(idList))
+                else:
+                    minFlux = (magLimit*astropy.units.ABmag).to_value(astropy.units.nJy)
+                    brightIds = [record["id"] for record in self.skyCatalog
+                                 if record["id"] in idList and record["a"] <= magLimit]
+                    self.assertEqual(Counter(result.refCat["id"]), Counter(brightIds))
+                    self.assertTrue(np.all(result.refCat["a_flux"] >= minFlux))
+            self.assertLessEqual(loader.metadata.getScalar("shardCacheMisses"),
+                                 noSummaryLoader.metadata.getScalar("shardCacheMisses"))
+        # most shards hold no objects this bright, and need not be read
+        self.assertLess(loader.metadata.getScalar("shardCacheMisses"),
+                        noSummaryLoader.metadata.getScalar("shardCacheMisses"))
+
+    def testSortByFlux(self):
+        """Test ingesting shards sorted by flux, and that loading only the
+        brightest objects gives the same objects from sorted and unsorted
+        shards.
+        """
+        config = self.makeConfig(withMagErr=True, withRaDecErr=True, withPm=True, withPmErr=True)
+        config.dataset_config.indexer.active.depth = self.depth
+        config.id_name = 'id'
+        config.pm_scale = 1000.0
+        config.sort_by_flux = 'a'
+        config.is_photometric_name = 'is_phot'
+        config.extra_col_names = ['val1', 'val3']
+        sortedRepoPath = self.outPath + "/output_sorted"
+        IngestIndexedReferenceTask.parseAndRun(args=[INPUT_DIR, "--output", sortedRepoPath,
+                                                     self.skyCatalogFile], config=config)
+        sortedButler = dafPersist.Butler(sortedRepoPath)
+        fileReader = IngestIndexedReferenceTask(butler=None, config=config).file_reader
+        inputRows = fileReader.run(self.skyCatalogFile)
+        shardIds = set(self.indexer.indexPoints(self.skyCatalog['ra_icrs'], self.skyCatalog['dec_icrs']))
+        for shardId in shardIds:
+            dataId = self.indexer.makeDataId(shardId, self.defaultDatasetName)
+            shard = sortedButler.get('ref_cat', dataId=dataId)
+            self.assertEqual(_getSortFluxName(shard), "a_flux")
+            self.assertTrue(np.all(np.diff(shard["a_flux"]) <= 0))
+            unsortedShard = self.testButler.get('ref_cat', dataId=dataId)
+            self.assertIsNone(_getSortFluxName(unsortedShard))
+            self.assertEqual(sorted(shard["id"]), sorted(unsortedShard["id"]))
+            # every column, including flags and strings, is sorted with the rows
+            rows = inputRows[np.searchsorted(inputRows['id'], shard["id"])]
+            self.assertFloatsEqual(shard["val1"], rows['val1'])
+            self.assertEqual(list(shard["photometric"]), list(rows['is_phot'].astype(bool)))
+            self.assertEqual([record.get("val3") for record in shard], [str(value) for value in rows['val3']])
+
+        maxRefObjects = 5
+        for magLimit in (None, 16.5):
+            config = LoadIndexedReferenceObjectsConfig()
+            config.magLimit = magLimit
+            config.maxRefObjects = maxRefObjects
+            sortedLoader = LoadIndexedReferenceObjectsTask(butler=sortedButler, config=config)
+            unsortedLoader = LoadIndexedReferenceObjectsTask(butler=self.testButler, config=config)
+            config = LoadIndexedReferenceObjectsConfig()
+            config.magLimit = magLimit
+            fullLoader = LoadIndexedReferenceObjectsTask(butler=self.testButler, config=config)
+            config = LoadIndexedReferenceObjectsConfig()
+            config.magLimit = magLimit
+            config.use_shard_summary = False
+            sortedFullLoader = LoadIndexedReferenceObjectsTask(butler=sortedButler, config=config)
+            for tupl in self.compCats:
+                cent = make_coord(*tupl)
+                full = fullLoader.loadSkyCircle(cent, self.searchRadius, filterName='a').refCat
+                brightest = full["id"][np.argsort(-full["a_flux"], kind="stable")[:maxRefObjects]]
+                for loader in (sortedLoader, unsortedLoader):
+                    result = loader.loadSkyCircle(cent, self.searchRadius, filterName='a')
+                    self.assertEqual(Counter(result.refCat["id"]), Counter(brightest))
+                result = sortedFullLoader.loadSkyCircle(cent, self.searchRadius, filterName='a')
+                self.assertEqual(Counter(result.refCat["id"]), Counter(full["id"]))
+
+    def testIdIndex(self):
+        """Test the id index written by the ingest, loading reference
+        objects by id, and using it to reconstitute a match list.
+        """
+        loader = LoadIndexedReferenceObjectsTask(butler=self.testButler)
+        idIndex = loader.getIdIndex()
+        shardIds = self.indexer.indexPoints(self.skyCatalog['ra_icrs'], self.skyCatalog['dec_icrs'])
+        # the index is partitioned by id range, and only the partitions
+        # covering the requested ids need be read
+        self.assertEqual(len(idIndex), len(self.skyCatalog)//100)
+        sortedIds = np.sort(self.skyCatalog['id'])
+        self.assertEqual(idIndex.getPartitions(sortedIds[:100]).tolist(), [0])
+        self.assertEqual(idIndex.getPartitions([sortedIds[99], sortedIds[100], -1]).tolist(), [0, 1])
+        ids = self.skyCatalog['id'][::50]
+        idsByShard = idIndex.lookup(list(ids) + [-1])
+        self.assertEqual(sorted(np.concatenate(list(idsByShard.values()))), sorted(ids))
+        for shardId, shardIdList in idsByShard.items():
+            for id in shardIdList:
+                self.assertEqual(shardIds[list(self.skyCatalog['id']).index(id)], shardId)
+
+        tupl = (93., -30.1)
+        expected = loader.loadSkyCircle(make_coord(*tupl), self.searchRadius, filterName='a')
+        nCircleReads = loader.metadata.getScalar("shardCacheMisses")
+        # the objects in one of the shards overlapping the circle
+        circle = expected.refCat
+        circleShardIds = self.indexer.indexPoints(np.degrees(circle["coord_ra"]),
+                                                  np.degrees(circle["coord_dec"]))
+        self.assertGreater(len(set(circleShardIds)), 1)
+        refCat = circle[circleShardIds == circleShardIds[0]].copy(deep=True)
+        loader = LoadIndexedReferenceObjectsTask(butler=self.testButler)
+        result = loader.loadIds(np.append(refCat["id"], -1), filterName='a')
+        self.assertEqual(result.fluxField, expected.fluxField)
+        self.assertTrue(result.refCat.isContiguous())
+        self.assertEqual(result.refCat.schema, circle.schema)
+        result.refCat.sort()
+        refCat.sort()
+        for name in ("id", "coord_ra", "coord_dec", "a_flux"):
+            self.assertFloatsEqual(result.refCat[name], refCat[name])
+
+        # partitions round-trip, keeping objects with the same id together
+        idIndexBuilder = IdIndex({3: np.array([5, 1, 2]), 7: np.array([2, 9]), 8: np.array([4])})
+        directory, partitions = idIndexBuilder.makePartitions(2)
+        self.assertEqual([list(partition["id"]) for partition in partitions], [[1, 2, 2], [4, 5], [9]])
+        self.assertEqual(list(directory["id_min"]), [1, 4, 9])
+        self.assertEqual(list(directory["id_max"]), [2, 5, 9])
+        self.assertEqual(IdIndex.fromPartitions(partitions).lookup([2, 9, 3]).keys(), {3, 7})
+        partitionedIndex = PartitionedIdIndex(directory, lambda number: partitions[number], ShardCache(0))
+        idsByShard = partitionedIndex.lookup([2, 9, 3])
+        self.assertEqual({shardId: sorted(ids) for shardId, ids in idsByShard.items()},
+                         {3: [2], 7: [2, 9]})
+
+        # reconstitute a match list from the ids of matched objects
+        sourceCat = afwTable.SourceCatalog(afwTable.SourceTable.makeMinimalSchema())
+        matches = []
+        for refRecord in refCat:
+            source = sourceCat.addNew()
+            source.setId(refRecord.getId() + 1)
+            matches.append(afwTable.ReferenceMatch(refRecord, source, 0.0))
+        matchCat = afwTable.packMatches(matches)
+        matchCat.table.setMetadata(loader.getMetadataCircle(make_coord(*tupl), self.searchRadius, 'a'))
+        loader = LoadIndexedReferenceObjectsTask(butler=self.testButler)
+        matchList = loader.joinMatchListWithCatalog(matchCat, sourceCat)
+        self.assertEqual(len(matchList), len(refCat))
+        for match in matchList:
+            self.assertEqual(match.second.getId(), match.first.getId() + 1)
+        self.assertLess(loader.metadata.getScalar("shardCacheMisses"), nCircleReads)
+
+    def testColumnarShards(self):
+        """Test ingesting shards with columnar copies, and that loading them
+        gives the same objects as loading the FITS shards.
+        """
+        config = self.makeConfig(withMagErr=True, withRaDecErr=True, withPm=True, withPmErr=True)
+        config.dataset_config.indexer.active.depth = self.depth
+        config.dataset_config.shard_format = 'columnar'
+        config.id_name = 'id'
+        config.pm_scale = 1000.0
+        config.sort_by_flux = 'a'
+        columnarRepoPath = self.outPath + "/output_columnar"
+        IngestIndexedReferenceTask.parseAndRun(args=[INPUT_DIR, "--output", columnarRepoPath,
+                                                     self.skyCatalogFile], config=config)
+        columnarButler = dafPersist.Butler(columnarRepoPath)
+        loader = LoadIndexedReferenceObjectsTask(butler=columnarButler)
+        schema = loader._getMasterSchema()[0].schema
+        shardIds = set(self.indexer.indexPoints(self.skyCatalog['ra_icrs'], self.skyCatalog['dec_icrs']))
+        for shardId in shardIds:
+            dataId = self.indexer.makeDataId(shardId, self.defaultDatasetName)
+            shard = columnarButler.get('ref_cat', dataId=dataId)
+            path = getColumnarPath(columnarButler.get('ref_cat_filename', dataId=dataId)[0])
+            columnarShard = readColumnarShard(path, schema)
+            self.assertTrue(columnarShard.isContiguous())
+            self.assertEqual(_getSortFluxName(columnarShard), "a_flux")
+            self.assertEqual(len(columnarShard), len(shard))
+            for name in schema.getNames():
+                np.testing.assert_array_equal(columnarShard[name], shard[name])
+
+        fitsLoader = LoadIndexedReferenceObjectsTask(butler=self.testButler)
+        for tupl in ((93.0, -30.1), (14.5, 27.3), (180.0, 0.0)):
+            cent = make_coord(*tupl)
+            expected = fitsLoader.loadSkyCircle(cent, self.searchRadius, filterName='a', epoch=self.epoch)
+            result = loader.loadSkyCircle(cent, self.searchRadius, filterName='a', epoch=self.epoch)
+            self.assertEqual(result.refCat.schema, expected.refCat.schema)
+            self.assertEqual(len(result.refCat), len(expected.refCat))
+            result.refCat.sort()
+            expected.refCat.sort()
+            for name in ("id", "coord_ra", "coord_dec", "a_flux", "a_fluxErr", "pm_ra"):
+                self.assertFloatsEqual(result.refCat[name], expected.refCat[name])
+
+        # string and flag fields, and a catalog with no rows
+        schema = afwTable.SimpleTable.makeMinimalSchema()
+        flagKey = schema.addField("is_flagged", type="Flag", doc="a flag")
+        nameKey = schema.addField("name", type=str, size=8, doc="a name")
+        catalog = afwTable.SimpleCatalog(schema)
+        catalog.resize(3)
+        catalog["id"] = np.array([3, 1, 2])
+        catalog[flagKey] = np.array([True, False, True])
+        catalog[1].set(nameKey, "b")
+        path = os.path.join(self.outPath, "strings.cols")
+        writeColumnarShard(catalog, path)
+        result = readColumnarShard(path, schema)
+        self.assertEqual(list(result["id"]), [3, 1, 2])
+        self.assertEqual(list(result[flagKey]), [True, False, True])
+        self.assertEqual([record.get(nameKey) for record in result], ["", "b", ""])
+        with self.assertRaises(RuntimeError):
+            readColumnarShard(path, loader._getMasterSchema()[0].schema)
+        writeColumnarShard(catalog[:0], path)
+        self.assertEqual(len(readColumnarShard(path, schema)), 0)
+
+    def testColumnStorage(self):
+        """Test ingesting fluxes stored as float32, and that loaders widen
+        them to float64.
+        """
+        config = self.makeConfig(withMagErr=True, withRaDecErr=True, withPm=True, withPmErr=True)
+        config.column_storage = {"flux": "float64"}
+        config.validate()
+        config.column_storage = {"flux": "float16"}
+        with self.assertRaises(ValueError):
+            config.validate()
+        config.column_storage = {"flux": "float32", "fluxErr": "float32", "b_flux": "float64"}
+        config.dataset_config.indexer.active.depth = self.depth
+        config.dataset_config.shard_format = 'columnar'
+        config.id_name = 'id'
+        config.pm_scale = 1000.0
+        narrowRepoPath = self.outPath + "/output_narrow"
+        IngestIndexedReferenceTask.parseAndRun(args=[INPUT_DIR, "--output", narrowRepoPath,
+                                                     self.skyCatalogFile], config=config)
+        narrowButler = dafPersist.Butler(narrowRepoPath)
+        shardId = self.indexer.indexPoints(self.skyCatalog['ra_icrs'][:1], self.skyCatalog['dec_icrs'][:1])[0]
+        shard = narrowButler.get('ref_cat', dataId=self.indexer.makeDataId(shardId, self.defaultDatasetName))
+        for name in ("a_flux", "a_fluxErr", "b_fluxErr"):
+            self.assertEqual(shard.schema[name].asField().getTypeString(), "F")
+        self.assertEqual(shard.schema["b_flux"].asField().getTypeString(), "D")
+        self.assertEqual(shard.getMetadata().getScalar("REFCAT_WIDEN"), "a_flux,a_fluxErr,b_fluxErr")
+
+        loader = LoadIndexedReferenceObjectsTask(butler=narrowButler)
+        fullLoader = LoadIndexedReferenceObjectsTask(butler=self.testButler)
+        for tupl in ((93.0, -30.1), (14.5, 27.3)):
+            cent = make_coord(*tupl)
+            expected = fullLoader.loadSkyCircle(cent, self.searchRadius, filterName='a').refCat
+            result = loader.loadSkyCircle(cent, self.searchRadius, filterName='a').refCat
+            self.assertEqual(result.schema, expected.schema)
+            self.assertFloatsEqual(result["id"], expected["id"])
+            self.assertFloatsEqual(result["b_flux"], expected["b_flux"])
+            for name in ("a_flux", "a_fluxErr", "b_fluxErr"):
+                self.assertFloatsAlmostEqual(result[name], expected[name], rtol=1e-7)
+                self.assertFloatsEqual(result[name], expected[name].astype(np.float32))
+
+        # only float64 columns can be narrowed
+        config = self.makeConfig(withRaDecErr=True)
+        config.column_storage = {"coord_raErr": "float32"}
+        with self.assertRaises(ValueError):
+            IngestIndexedReferenceTask(butler=None, config=config).makeSchema(np.dtype([]))
+
+    def testPlanIngest(self):
+        """Test that planning an ingest predicts its shards without writing
+        anything to the butler.
+        """
+        config = self.makeConfig(withMagErr=True, withRaDecErr=True, withPm=True, withPmErr=True)
+        config.dataset_config.indexer.active.depth = self.depth
+        config.id_name = 'id'
+        config.pm_scale = 1000.0
+        config.plan_only = True
+        config.plan_max_rows = 50
+        config.plan_max_depth = 6
+        planRepoPath = self.outPath + "/output_plan"
+        result = IngestIndexedReferenceTask.parseAndRun(args=[INPUT_DIR, "--output", planRepoPath,
+                                                              self.skyCatalogFile],
+                                                        config=config, doReturnResults=True)
+        plan = result.resultList[0].plan
+        self.assertFalse(os.path.exists(os.path.join(planRepoPath, "ref_cats")))
+
+        shardIds = self.indexer.indexPoints(self.skyCatalog['ra_icrs'], self.skyCatalog['dec_icrs'])
+        expected = Counter(shardIds)
+        self.assertEqual(plan.nRows, len(self.skyCatalog))
+        self.assertEqual(plan.shardRows, dict(expected))
+        self.assertEqual(sum(n for _, _, n in plan.histogram), len(expected))
+        for low, high, n in plan.histogram:
+            self.assertEqual(n, sum(1 for count in expected.values() if low <= count < high))
+        self.assertEqual([n for _, n in plan.largestShards], [n for _, n in expected.most_common(10)])
+
+        # the predicted size of each shard is close to its size on disk
+        shardDir = os.path.join(self.testRepoPath, 'ref_cats', self.defaultDatasetName)
+        nBytes = sum(os.path.getsize(os.path.join(shardDir, "%d.fits" % (shardId,))) for shardId in expected)
+        self.assertFloatsAlmostEqual(plan.nBytes, nBytes, rtol=0.1)
+
+        self.assertEqual(plan.depthMaxRows[self.depth], max(expected.values()))
+        coarseIds = HtmIndexer(depth=0).indexPoints(self.skyCatalog['ra_icrs'], self.skyCatalog['dec_icrs'])
+        self.assertEqual(plan.depthMaxRows[0], max(Counter(coarseIds).values()))
+        depths = [depth for depth, n in plan.depthMaxRows.items() if n <= config.plan_max_rows]
+        self.assertEqual(plan.recommendedDepth, min(depths, default=config.plan_max_depth))
+
+    def testGetShardIds(self):
+        """Test that getShardIds finds every shard touching a circle,
+        reports only enclosed shards as not on the boundary, and remembers
+        recent queries.
+        """
+        shardIds = self.indexer.indexPoints(self.skyCatalog['ra_icrs'], self.skyCatalog['dec_icrs'])
+        coords = [make_coord(record['ra_icrs'], record['dec_icrs']) for record in self.skyCatalog]
+        for radius in (self.searchRadius, 30*lsst.geom.degrees):
+            for tupl in self.compCats:
+                cent = make_coord(*tupl)
+                shardIdList, isOnBoundaryList = self.indexer.getShardIds(cent, radius)
+                self.assertEqual(len(set(shardIdList)), len(shardIdList))
+                self.assertEqual(len(shardIdList), len(isOnBoundaryList))
+                inclusive = self.indexer.htm.intersect(tupl[0], tupl[1], radius.asDegrees(), inclusive=True)
+                self.assertLessEqual(set(inclusive), set(shardIdList))
+                isOnBoundary = dict(zip(shardIdList, isOnBoundaryList))
+                for shardId, coord in zip(shardIds, coords):
+                    inCircle = coord.separation(cent) < radius
+                    if inCircle:
+                        self.assertIn(shardId, isOnBoundary)
+                    if not isOnBoundary.get(shardId, True):
+                        self.assertTrue(inCircle)
+            if radius > self.searchRadius:
+                self.assertIn(False, isOnBoundaryList)
+
+        indexer = IndexerRegistry['HTM'](IndexerRegistry['HTM'].ConfigClass())
+        cent = make_coord(93.0, -30.1)
+        shardIdList, isOnBoundaryList = indexer.getShardIds(cent, self.searchRadius)
+        shardIdList.append(-1)
+        nearby = make_coord(93.0 + 1e-9, -30.1)
+        self.assertEqual(indexer.getShardIds(nearby, self.searchRadius)[0], shardIdList[:-1])
+        self.assertEqual(len(indexer._queryCache), 1)
+        indexer.getShardIds(cent, 2*self.searchRadius)
+        self.assertEqual(len(indexer._queryCache), 2)
+
+    def testAdaptiveIndexer(self):
+        """Test that the adaptive HTM indexer limits the rows per shard, and
+        that a catalog ingested with it loads the same objects.
+        """
+        ra = self.skyCatalog['ra_icrs']
+        dec = self.skyCatalog['dec_icrs']
+        minDepth, maxDepth, maxRows = 2, 6, 8
+        counts = AdaptiveHtmIndexer(minDepth, maxDepth).countPoints(ra, dec)
+        self.assertEqual(sum(counts.values()), len(self.skyCatalog))
+        subdivided = AdaptiveHtmIndexer.planSubdivision(counts, minDepth, maxDepth, maxRows)
+        indexer = AdaptiveHtmIndexer(minDepth, maxDepth, subdivided)
+        shardIds = indexer.indexPoints(ra, dec)
+        depths = {indexer.getDepth(shardId) for shardId in shardIds}
+        self.assertGreater(len(depths), 1)
+        for shardId, nRows in Counter(shardIds).items():
+            self.assertNotIn(shardId, subdivided)
+            if indexer.getDepth(shardId) < maxDepth:
+                self.assertLessEqual(nRows, maxRows)
+        for shardId, record in zip(shardIds, self.skyCatalog):
+            coord = make_coord(record['ra_icrs'], record['dec_icrs'])
+            self.assertTrue(indexer.getShardRegion(shardId).contains(coord.getVector()))
+
+        for tupl, idList in self.compCats.items():
+            cent = make_coord(*tupl)
+            shardIdList, isOnBoundaryList = indexer.getShardIds(cent, self.searchRadius)
+            self.assertEqual(len(set(shardIdList)), len(shardIdList))
+            isOnBoundary = dict(zip(shardIdList, isOnBoundaryList))
+            for shardId, record in zip(shardIds, self.skyCatalog):
+                inCircle = record['id'] in idList
+                if inCircle:
+                    self.assertIn(shardId, isOnBoundary)
+                if not isOnBoundary.get(shardId, True):
+                    self.assertTrue(inCircle)
+
+        with self.assertRaises(ValueError):
+            # trixels of the finest depth cannot be subdivided
+            AdaptiveHtmIndexer(minDepth, maxDepth, [8 << 2*maxDepth])
+
+        config = self.makeConfig(withMagErr=True, withRaDecErr=True, withPm=True, withPmErr=True)
+        config.dataset_config.indexer.name = "ADAPTIVE_HTM"
+        config.dataset_config.indexer.active.min_depth = minDepth
+        config.dataset_config.indexer.active.max_depth = maxDepth
+        config.dataset_config.indexer.active.max_rows = maxRows
+        config.id_name = 'id'
+        repoPath = self.outPath + "/output_adaptive"
+        IngestIndexedReferenceTask.parseAndRun(args=[INPUT_DIR, "--output", repoPath, self.skyCatalogFile],
+                                               config=config)
+        butler = dafPersist.Butler(repoPath)
+        loader = LoadIndexedReferenceObjectsTask(butler=butler)
+        self.assertEqual(list(loader.dataset_config.indexer.active.subdivided), subdivided)
+        for shardId in set(shardIds):
+            shard = butler.get('ref_cat', dataId=loader.indexer.makeDataId(shardId, self.defaultDatasetName))
+            self.assertEqual(sorted(shard["id"]), sorted(self.skyCatalog['id'][shardIds == shardId]))
+        for tupl, idList in self.compCats.items():
+            cent = make_coord(*tupl)
+            result = loader.loadSkyCircle(cent, self.searchRadius, filterName='a')
+            self.assertEqual(Counter(result.refCat["id"]), Counter(idList))
+
+    @unittest.skipIf(healpy is None, "healpy is not available")
+    def testHealpixIndexer(self):
+        """Test the HEALPix indexer, and that a catalog ingested with it
+        loads the same objects.
+        """
+        config = IndexerRegistry['HEALPIX'].ConfigClass()
+        config.order = 3
+        indexer = IndexerRegistry['HEALPIX'](config)
+        shardIds = indexer.indexPoints(self.skyCatalog['ra_icrs'], self.skyCatalog['dec_icrs'])
+        for shardId, record in zip(shardIds, self.skyCatalog):
+            self.assertEqual(shardId, healpy.ang2pix(2**config.order, record['ra_icrs'], record['dec_icrs'],
+                                                     nest=True, lonlat=True))
+        for tupl, idList in self.compCats.items():
+            cent = make_coord(*tupl)
+            shardIdList, isOnBoundaryList = indexer.getShardIds(cent, self.searchRadius)
+            isOnBoundary = dict(zip(shardIdList, isOnBoundaryList))
+            for shardId, record in zip(shardIds, self.skyCatalog):
+                inCircle = record['id'] in idList
+                if inCircle:
+                    self.assertIn(shardId, isOnBoundary)
+                if not isOnBoundary.get(shardId, True):
+                    self.assertTrue(inCircle)
+        # a large circle entirely covers some pixels
+        shardIdList, isOnBoundaryList = indexer.getShardIds(make_coord(0, 0), 20*lsst.geom.degrees)
+        self.assertIn(False, isOnBoundaryList)
+
+        ingestConfig = self.makeConfig(withMagErr=True, withRaDecErr=True, withPm=True, withPmErr=True)
+        ingestConfig.dataset_config.indexer.name = "HEALPIX"
+        ingestConfig.dataset_config.indexer.active.order = config.order
+        ingestConfig.id_name = 'id'
+        repoPath = self.outPath + "/output_healpix"
+        IngestIndexedReferenceTask.parseAndRun(args=[INPUT_DIR, "--output", repoPath, self.skyCatalogFile],
+                                               config=ingestConfig)
+        butler = dafPersist.Butler(repoPath)
+        loader = LoadIndexedReferenceObjectsTask(butler=butler)
+        for shardId in set(shardIds):
+            shard = butler.get('ref_cat', dataId=indexer.makeDataId(shardId, self.defaultDatasetName))
+            self.assertEqual(sorted(shard["id"]), sorted(self.skyCatalog['id'][shardIds == shardId]))
+        for tupl, idList in self.compCats.items():
+            cent = make_coord(*tupl)
+            result = loader.loadSkyCircle(cent, self.searchRadius, filterName='a')
+            self.assertEqual(Counter(result.refCat["id"]), Counter(idList))
+
+    def testFilterCatalog(self):
+        """Test that the vectorized region filters agree with testing each
+        record's coordinates.
+        """
+        refCat = self.testButler.get('ref_cat', dataId=self.indexer.makeDataId(
+            self.indexer.indexPoints([93.0], [-30.1])[0], self.defaultDatasetName))
+        self.assertGreater(len(refCat), 0)
+        center = refCat[0].getCoord()
+        radius = 2*lsst.geom.degrees
+        loader = LoadIndexedReferenceObjectsTask(butler=self.testButler)
+        trimmed = loader._trimToCircle(refCat, center, radius)
+        expected = [record.getId() for record in refCat if record.getCoord().separation(center) < radius]
+        self.assertEqual(list(trimmed["id"]), expected)
+
+        corners = [make_coord(center.getRa().asDegrees() + dRa, center.getDec().asDegrees() + dDec)
+                   for dRa, dDec in ((-3, -2), (3, -2), (3, 2), (-3, 2))]
+        polygon = sphgeom.ConvexPolygon([corner.getVector() for corner in corners])
+        circle = sphgeom.Circle(center.getVector(), sphgeom.Angle(radius.asRadians()))
+        for region in (circle, polygon, polygon.getBoundingBox()):
+            filtered = _FilterCatalog(region)(refCat, sphgeom.Box.full())
+            expected = [record.getId() for record in refCat
+                        if region.contains(record.getCoord().getVector())]
+            self.assertEqual(list(filtered["id"]), expected)
+
     def testLoadVersion0(self):
         """Test reading a pre-written format_version=0 (Jy flux) catalog.
         It should be converted to have nJy fluxes.
@@ -22,12 +22,16 @@
 #
 
 import itertools
+import os
+import tempfile
 import unittest
 
 import lsst.afw.table as afwTable
 import lsst.log
 from lsst.meas.algorithms import LoadReferenceObjectsTask, getRefFluxField, getRefFluxKeys
 from lsst.meas.algorithms.loadReferenceObjects import hasNanojanskyFluxUnits, convertToNanojansky
+from lsst.meas.algorithms.loadReferenceObjects import getFormatVersionFromRefCat
+from lsst.meas.algorithms.ingestIndexReferenceTask import convertRefCatFileToNanojansky, LATEST_FORMAT_VERSION
 import lsst.utils.tests
 
 
@@ -213,6 +217,45 @@ class TestLoadReferenceObjects(lsst.utils.tests.TestCase):
         newRefCat = convertToNanojansky(oldRefCat, log, doConvert=False)
         self.assertIsNone(newRefCat)
 
+    def testConvertOldFluxFile(self):
+        """Check that we can convert old style fluxes in a catalog file, and
+        that converted files are left alone.
+        """
+        log = lsst.log.Log()
+        schema = LoadReferenceObjectsTask.makeMinimalSchema(['r'])
+        schema.addField('bad_flux', doc='old flux units', type=float, units='')
+        schema.addField('bad_fluxSigma', doc='old flux units', type=float, units='Jy')
+        refCat = afwTable.SimpleCatalog(schema)
+        refCat.resize(3)
+        refCat["id"] = [1, 2, 3]
+        refCat["r_flux"] = [10.0, 20.0, 30.0]
+        refCat["bad_flux"] = [1.5, 2.5, 3.5]
+        refCat["bad_fluxSigma"] = [0.25, 0.5, 0.75]
+
+        with tempfile.TemporaryDirectory() as tempDir:
+            path = os.path.join(tempDir, "1234.fits")
+            refCat.writeFits(path)
+            fluxNames = convertRefCatFileToNanojansky(path, log, doConvert=False)
+            self.assertEqual(fluxNames, ["bad_flux", "bad_fluxSigma"])
+            self.assertFalse(hasNanojanskyFluxUnits(afwTable.SimpleCatalog.readFits(path).schema))
+
+            self.assertEqual(convertRefCatFileToNanojansky(path, log), fluxNames)
+            self.assertEqual(os.listdir(tempDir), ["1234.fits"])
+            newRefCat = afwTable.SimpleCatalog.readFits(path)
+            self.assertTrue(hasNanojanskyFluxUnits(newRefCat.schema))
+            self.assertNotIn("bad_fluxSigma", newRefCat.schema)
+            self.assertEqual(newRefCat.schema['bad_fluxErr'].asField().getUnits(), 'nJy')
+            self.assertEqual(getFormatVersionFromRefCat(newRefCat), LATEST_FORMAT_VERSION)
+            self.assertFloatsAlmostEqual(newRefCat["bad_flux"], refCat["bad_flux"]*1e9)
+            self.assertFloatsAlmostEqual(newRefCat["bad_fluxErr"], refCat["bad_fluxSigma"]*1e9)
+            self.assertFloatsEqual(newRefCat["r_flux"], refCat["r_flux"])
+            self.assertFloatsEqual(newRefCat["id"], refCat["id"])
+
+            # a converted file is recognized and not rewritten
+            mtime = os.stat(path).st_mtime_ns
+            self.assertEqual(convertRefCatFileToNanojansky(path, log), [])
+            self.assertEqual(os.stat(path).st_mtime_ns, mtime)
+
 
 class TestMemory(lsst.utils.tests.MemoryTestCase):
     pass
@@ -128,6 +128,25 @@ class ReadFitsCatalogTaskTestCase(lsst.utils.tests.TestCase):
         arr = task.run(FitsPath)
         self.assertTrue(np.array_equal(arr, self.arr2))
 
+    def testReadChunks(self):
+        """Test reading HDU 1 in chunks, with some column renaming"""
+        for chunk_size in (0, 1, 2, 3):
+            with self.subTest(chunk_size=chunk_size):
+                config = ReadFitsCatalogTask.ConfigClass()
+                config.chunk_size = chunk_size
+                config.column_map = {"ra": "ra_deg"}
+                task = ReadFitsCatalogTask(config=config)
+                chunks = list(task.readChunks(FitsPath))
+                self.assertEqual(len(chunks), 2 if chunk_size == 1 else 1)
+                self.assertEqual(sum(len(chunk) for chunk in chunks), len(self.arr1))
+                row = 0
+                for chunk in chunks:
+                    self.assertIn("ra_deg", chunk.dtype.names)
+                    for inname, outname in zip(self.arr1.dtype.names, chunk.dtype.names):
+                        self.assertTrue(np.array_equal(self.arr1[inname][row:row + len(chunk)],
+                                                       chunk[outname]))
+                    row += len(chunk)
+
     def testBadPath(self):
         """Test that an invalid path causes an error"""
         task = ReadFitsCatalogTask()
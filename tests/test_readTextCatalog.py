@@ -22,6 +22,7 @@
 #
 
 import os
+import tempfile
 import unittest
 
 import numpy as np
@@ -94,6 +95,129 @@ class ReadTextCatalogTaskTestCase(lsst.utils.tests.TestCase):
         for inname, outname in zip(self.arr.dtype.names, colnames):
             self.assertTrue(np.array_equal(self.arr[inname], arr[outname]))
 
+    def testReadChunks(self):
+        """Test reading in chunks, with and without column names in the config
+        """
+        for colnames in ((), ("id", "ra_deg", "dec_deg", "total_counts", "total_flux", "is_resolved")):
+            for chunk_size in (0, 1, 2, 3):
+                with self.subTest(colnames=colnames, chunk_size=chunk_size):
+                    config = ReadTextCatalogTask.ConfigClass()
+                    config.chunk_size = chunk_size
+                    if colnames:
+                        config.colnames = colnames
+                        config.header_lines = 1
+                    task = ReadTextCatalogTask(config=config)
+                    chunks = list(task.readChunks(TextPath))
+                    self.assertEqual(len(chunks), 2 if chunk_size == 1 else 1)
+                    arr = np.concatenate(chunks)
+                    self.assertTrue(np.array_equal(arr, task.run(TextPath)))
+                    self.assertEqual(arr.dtype.names, colnames or self.arr.dtype.names)
+
+    def testReadChunksTypes(self):
+        """Test that all chunks have the column types of the first
+        """
+        with tempfile.TemporaryDirectory() as tmpDir:
+            path = os.path.join(tmpDir, "chunks.csv")
+            with open(path, "w") as f:
+                f.write("name, ra, counts\nobject1, 1.5, 10\nobj2, 2, 20\n")
+            for parser in ("genfromtxt", "loadtxt"):
+                with self.subTest(parser=parser):
+                    config = ReadTextCatalogTask.ConfigClass()
+                    config.parser = parser
+                    config.chunk_size = 1
+                    chunks = list(ReadTextCatalogTask(config=config).readChunks(path))
+                    self.assertEqual(len(chunks), 2)
+                    self.assertEqual(chunks[1].dtype, chunks[0].dtype)
+                    self.assertEqual(chunks[1]["name"][0], "obj2")
+                    self.assertEqual(chunks[1]["ra"][0], 2.0)
+
+            # a later chunk with a longer string or a float in an integer
+            # column does not fit the types of the first
+            for lines in ("obj1, 1.5, 10\nobject2, 2.5, 20\n", "obj1, 1.5, 10\nobj2, 2.5, 20.5\n"):
+                with open(path, "w") as f:
+                    f.write("name, ra, counts\n" + lines)
+                for parser in ("genfromtxt", "loadtxt"):
+                    with self.subTest(lines=lines, parser=parser):
+                        config = ReadTextCatalogTask.ConfigClass()
+                        config.parser = parser
+                        config.chunk_size = 1
+                        with self.assertRaises(ValueError):
+                            list(ReadTextCatalogTask(config=config).readChunks(path))
+
+            config = ReadTextCatalogTask.ConfigClass()
+            config.parser = "loadtxt"
+            config.chunk_size = 1
+            config.dtypes = {"name": "U10", "counts": "f8"}
+            chunks = list(ReadTextCatalogTask(config=config).readChunks(path))
+            self.assertEqual(chunks[1].dtype, chunks[0].dtype)
+            self.assertEqual(chunks[1]["counts"][0], 20.5)
+
+    def testReadChunksCommentsAndBlankLines(self):
+        """Test reading in chunks with comments and blank lines on chunk boundaries
+        """
+        contents = [
+            # a comment between chunks
+            "a,b\n1,2\n#x\n3,4\n",
+            # a comment at the start of a chunk
+            "a,b\n1,2\n3,4\n# c\n5,6\n",
+            # a chunk that is entirely comments
+            "a,b\n1,2\n3,4\n# c1\n# c2\n5,6\n",
+            # blank lines between chunks
+            "a,b\n1,2\n\n\n3,4\n",
+            # trailing blank lines
+            "a,b\n1,2\n3,4\n\n\n\n",
+        ]
+        with tempfile.TemporaryDirectory() as tmpDir:
+            path = os.path.join(tmpDir, "comments.csv")
+            for content in contents:
+                with open(path, "w") as f:
+                    f.write(content)
+                for parser in ("genfromtxt", "loadtxt"):
+                    config = ReadTextCatalogTask.ConfigClass()
+                    config.parser = parser
+                    expected = ReadTextCatalogTask(config=config).run(path)
+                    for chunk_size in (1, 2, 3):
+                        with self.subTest(content=content, parser=parser, chunk_size=chunk_size):
+                            config = ReadTextCatalogTask.ConfigClass()
+                            config.parser = parser
+                            config.chunk_size = chunk_size
+                            chunks = list(ReadTextCatalogTask(config=config).readChunks(path))
+                            arr = np.concatenate(chunks)
+                            self.assertEqual(arr.dtype, expected.dtype)
+                            self.assertTrue(np.array_equal(arr, expected))
+
+    def testLoadtxtParser(self):
+        """Test that the loadtxt parser matches the genfromtxt parser, and applies config.dtypes
+        """
+        expected = ReadTextCatalogTask().run(TextPath)
+        for sample_lines in (1, 1000):
+            for chunk_size in (0, 1):
+                with self.subTest(sample_lines=sample_lines, chunk_size=chunk_size):
+                    config = ReadTextCatalogTask.ConfigClass()
+                    config.parser = "loadtxt"
+                    config.sample_lines = sample_lines
+                    config.chunk_size = chunk_size
+                    task = ReadTextCatalogTask(config=config)
+                    arr = task.run(TextPath)
+                    self.assertEqual(arr.dtype, expected.dtype)
+                    self.assertTrue(np.array_equal(arr, expected))
+                    self.assertTrue(np.array_equal(np.concatenate(list(task.readChunks(TextPath))), expected))
+
+        config = ReadTextCatalogTask.ConfigClass()
+        config.parser = "loadtxt"
+        config.dtypes = {"ra": "f4", "counts": "f8", "name": "U20"}
+        arr = ReadTextCatalogTask(config=config).run(TextPath)
+        self.assertEqual(arr.dtype["ra"], np.dtype("f4"))
+        self.assertEqual(arr.dtype["counts"], np.dtype("f8"))
+        self.assertEqual(arr.dtype["name"], np.dtype("U20"))
+        self.assertEqual(arr.dtype["dec"], expected.dtype["dec"])
+        self.assertTrue(np.array_equal(arr["name"], expected["name"]))
+        self.assertFloatsAlmostEqual(arr["ra"], expected["ra"])
+
+        config.dtypes = {"name": "f8"}
+        with self.assertRaises(ValueError):
+            ReadTextCatalogTask(config=config).run(TextPath)
+
     def testBadPath(self):
         """Test that an invalid path causes an error"""
         task = ReadTextCatalogTask()